@@ -1,5 +1,7 @@
 import argparse
+import json
 import logging
+import os
 import sys
 from pathlib import Path
 
@@ -11,7 +13,18 @@ from sklearn.metrics import (classification_report, PrecisionRecallDisplay,
 
 from pipelines.train import train_pipeline_lbp
 from pipelines.infer import InferencePipelineLBP  
-from pipelines.utils import setup_logging
+from pipelines.governor import LatencyGovernor
+from pipelines.manifest import DatasetManifest
+from pipelines.dedup import run_dedup
+from pipelines.sources import open_source, record_session
+from pipelines.bench import run_detection_benchmark, run_allocation_check, DEFAULT_SCORE_THRESHOLDS
+from pipelines.quantized import run_quantization_check
+from pipelines.hat_assets import compile_hats_dir
+from pipelines.sweep import run_lbp_sweep
+from pipelines.tiling import run_tiling_benchmark
+from pipelines.shards import pack_dataset, run_io_comparison
+from pipelines.features import get_lbp_params, LBP_IMAGE_SIZE
+from pipelines.utils import setup_logging, load_hat_data, test_data_path
 
 logger = logging.getLogger(__name__)
 
@@ -25,14 +38,37 @@ def main():
     p_train.add_argument("--neg_dir", type=Path, required=True, help="Directory of negative non-face images.")
     p_train.add_argument("--test_size", type=float, default=0.2, help="Fraction of data to use for testing.")
     p_train.add_argument("--augment", action='store_true', help="Enable image augmentation for training.")
+    p_train.add_argument("--augmentations", type=str, nargs='+', default=None,
+                         help="Augmentation set, e.g. flip rot-10 rot5 rot10 (default).")
+    p_train.add_argument("--aug_per_sample", type=int, default=None,
+                         help="Augmented copies per sample, drawn from the set (default: all).")
     p_train.add_argument("--classifier", type=str, choices=['svm'], 
                          default='svm', help="Tipe classifier SVM.")
     p_train.add_argument("--model_dir", type=Path, default=Path("models"), help="Directory to save models.")
+    p_train.add_argument("--manifest", type=Path, default=None,
+                         help="Dataset manifest file (e.g. data/manifest.pkl); enables incremental scanning and stable splits.")
+    p_train.add_argument("--search", type=str, choices=['grid', 'halving'], default='grid',
+                         help="'grid' = GridSearchCV over C, 'halving' = warm-started successive halving.")
+    p_train.add_argument("--lbp_radii", type=int, nargs='+', default=None,
+                         help="Extra LBP radii to search over (halving search only).")
+    p_train.add_argument("--feature_map", type=str, choices=['none', 'chi2'], default='none',
+                         help="Explicit feature map before the linear SVM ('chi2' = additive chi-squared sampler).")
+    p_train.add_argument("--chi2_steps", type=int, default=2,
+                         help="Sample steps of the chi2 map (features = bins * (2 * steps - 1)).")
+    p_train.add_argument("--feature_map_report", type=Path, default=Path("reports/feature_map.json"),
+                         help="JSON report of accuracy gain and added per-ROI latency vs the raw histogram SVM.")
+    p_train.add_argument("--packed", type=Path, default=None,
+                         help="Packed crop shards from 'app.py pack' (read instead of the JPEGs).")
+    p_train.add_argument("--rejection_chain", action='store_true',
+                         help="Also calibrate the cheap rejection chain run before the LBP verifier.")
+    p_train.add_argument("--recall_margin", type=float, default=0.01,
+                         help="Max fraction of held-out faces the rejection chain may reject.")
     
     # 2. Perintah Eval
     p_eval = subparsers.add_parser("eval", help="Evaluate the trained model on the test set.")
     p_eval.add_argument("--model_dir", type=Path, default=Path("models"), help="Directory to load models from.")
     p_eval.add_argument("--model_name", type=str, default="svm_lbp.pkl", help="Name of the model file.")
+    p_eval.add_argument("--no_show", action='store_true', help="Only save the plots, do not open a window.")
     
     # 3. Perintah Infer
     p_infer = subparsers.add_parser("infer", help="Run inference on a single image.")
@@ -42,14 +78,153 @@ def main():
     p_infer.add_argument("--model_name", type=str, default="svm_lbp.pkl", help="Name of the model file.")
     # Default hat path sekarang menunjuk ke folder baru
     p_infer.add_argument("--hat", type=Path, default=Path("assets/hats/top_hat.png"), help="Path to hat PNG.")
+    p_infer.add_argument("--tile_workers", type=int, default=0,
+                         help="Run the face cascade on overlapping tiles with this many threads (0 = single pass).")
+    p_infer.add_argument("--max_face", type=int, default=400, help="Largest face (px) searched for in tiled mode.")
     
     # 4. Perintah Webcam
     p_webcam = subparsers.add_parser("webcam", help="Run real-time inference with webcam.")
     p_webcam.add_argument("--camera", type=int, default=0, help="Camera ID to use.")
+    p_webcam.add_argument("--source", type=str, default=None,
+                          help="Frame source instead of --camera: camera id, video file, image dir or recorded .session.")
+    p_webcam.add_argument("--pace", type=str, choices=['realtime', 'fast'], default='realtime',
+                          help="Replay file sources at their recorded speed or as fast as possible.")
+    p_webcam.add_argument("--loop", action='store_true', help="Restart file sources when they end.")
     p_webcam.add_argument("--model_dir", type=Path, default=Path("models"), help="Directory to load models from.")
     p_webcam.add_argument("--model_name", type=str, default="svm_lbp.pkl", help="Name of the model file.")
     # Default hat path sekarang menunjuk ke folder baru
     p_webcam.add_argument("--hat", type=Path, default=Path("assets/hats/top_hat.png"), help="Path to hat PNG.")
+    p_webcam.add_argument("--eye_mode", type=str, choices=['full', 'tracked'], default='tracked',
+                          help="'full' = eye cascade on the whole face every frame (old), 'tracked' = upper band every K frames.")
+    p_webcam.add_argument("--eye_every", type=int, default=5, help="Run the eye cascade at most every K frames per face.")
+    p_webcam.add_argument("--target_fps", type=float, default=None,
+                          help="Enable the latency governor with this target FPS (detection cost is tuned at runtime).")
+    p_webcam.add_argument("--governor_log", type=Path, default=None, help="JSON Lines file for governor decisions.")
+    p_webcam.add_argument("--quantized", action='store_true', help="Score ROIs with the integer-quantized verifier.")
+    p_webcam.add_argument("--tile_workers", type=int, default=0,
+                          help="Run the face cascade on overlapping tiles with this many threads (0 = single pass).")
+    p_webcam.add_argument("--max_face", type=int, default=400, help="Largest face (px) searched for in tiled mode.")
+
+    # 5. Perintah Index (manifest dataset)
+    p_index = subparsers.add_parser("index", help="Build or update the dataset manifest.")
+    p_index.add_argument("--pos_dir", type=Path, required=True, help="Directory of positive face crops.")
+    p_index.add_argument("--neg_dir", type=Path, required=True, help="Directory of negative non-face images.")
+    p_index.add_argument("--manifest", type=Path, default=Path("data/manifest.pkl"), help="Manifest file.")
+    p_index.add_argument("--test_size", type=float, default=0.2, help="Fraction of data assigned to the test split.")
+
+    # 6. Perintah Dedup (near-duplicate)
+    p_dedup = subparsers.add_parser("dedup", help="Find near-duplicate images with perceptual hashing.")
+    p_dedup.add_argument("--pos_dir", type=Path, required=True, help="Directory of positive face crops.")
+    p_dedup.add_argument("--neg_dir", type=Path, required=True, help="Directory of negative non-face images.")
+    p_dedup.add_argument("--manifest", type=Path, default=Path("data/manifest.pkl"), help="Manifest file.")
+    p_dedup.add_argument("--action", type=str, choices=['report', 'group', 'quarantine'], default='report',
+                         help="'report' only, 'group' = keep duplicates on one split side, 'quarantine' = move extras away.")
+    p_dedup.add_argument("--max_distance", type=int, default=4, help="Max Hamming distance between 64-bit pHashes.")
+    p_dedup.add_argument("--quarantine_dir", type=Path, default=Path("data/quarantine"), help="Where to move duplicates.")
+    p_dedup.add_argument("--report", type=Path, default=Path("reports/duplicates.json"), help="JSON report path.")
+    p_dedup.add_argument("--workers", type=int, default=8, help="Threads used for hashing.")
+
+    # 7. Perintah Bench (deteksi end-to-end pada gambar penuh)
+    p_bench = subparsers.add_parser("bench", help="Headless detection benchmark on annotated full images.")
+    p_bench.add_argument("--images", type=Path, required=True, help="Directory of full images.")
+    p_bench.add_argument("--annotations", type=Path, required=True,
+                         help='JSON file {"relative/path.jpg": [[x, y, w, h], ...]}.')
+    p_bench.add_argument("--model_dir", type=Path, default=Path("models"), help="Directory to load models from.")
+    p_bench.add_argument("--model_name", type=str, default="svm_lbp.pkl", help="Name of the model file.")
+    p_bench.add_argument("--hat", type=Path, default=None, help="Also time eye estimation and hat overlay with this hat.")
+    p_bench.add_argument("--eye_mode", type=str, choices=['full', 'tracked'], default='tracked', help="Eye angle mode.")
+    p_bench.add_argument("--thresholds", type=float, nargs='+', default=list(DEFAULT_SCORE_THRESHOLDS),
+                         help="Verifier score thresholds to report precision/recall at.")
+    p_bench.add_argument("--iou", type=float, default=0.5, help="IoU needed to match a detection to a face.")
+    p_bench.add_argument("--no_rejection_chain", action='store_true', help="Disable the rejection chain.")
+    p_bench.add_argument("--quantized", action='store_true', help="Score ROIs with the integer-quantized verifier.")
+    p_bench.add_argument("--tile_workers", type=int, default=0,
+                         help="Run the face cascade on overlapping tiles with this many threads (0 = single pass).")
+    p_bench.add_argument("--max_face", type=int, default=400, help="Largest face (px) searched for in tiled mode.")
+    p_bench.add_argument("--report", type=Path, default=Path("reports/detection_bench.json"), help="JSON report path.")
+
+    # 8. Perintah Record (sesi rekaman untuk replay deterministik)
+    p_record = subparsers.add_parser("record", help="Record raw frames + timestamps to a .session file.")
+    p_record.add_argument("--source", type=str, default="0", help="Frame source to record (default: camera 0).")
+    p_record.add_argument("--out", type=Path, required=True, help="Output .session file.")
+    p_record.add_argument("--frames", type=int, default=None, help="Stop after this many frames.")
+    p_record.add_argument("--duration", type=float, default=None, help="Stop after this many seconds.")
+    p_record.add_argument("--width", type=int, default=640, help="Camera capture width.")
+    p_record.add_argument("--height", type=int, default=480, help="Camera capture height.")
+
+    # 9. Perintah Quantcheck (verifier integer vs float)
+    p_quant = subparsers.add_parser("quantcheck", help="Check the integer-quantized verifier against the float model.")
+    p_quant.add_argument("--model_dir", type=Path, default=Path("models"), help="Directory to load models from.")
+    p_quant.add_argument("--model_name", type=str, default="svm_lbp.pkl", help="Name of the model file.")
+    p_quant.add_argument("--batch_sizes", type=int, nargs='+', default=[1, 8, 64, 512],
+                         help="ROI batch sizes to time scoring at.")
+    p_quant.add_argument("--repeats", type=int, default=200, help="Timing repetitions per batch size.")
+    p_quant.add_argument("--report", type=Path, default=Path("reports/quantization.json"), help="JSON report path.")
+
+    # 10. Perintah Compilehats (aset topi dipangkas + premultiplied + mip)
+    p_hats = subparsers.add_parser("compilehats", help="Trim hat sprites, rewrite offsets and build mip pyramids.")
+    p_hats.add_argument("--src", type=Path, default=Path("assets/hats"), help="Directory of source hat PNG + JSON.")
+    p_hats.add_argument("--out", type=Path, default=Path("assets/hats_compiled"), help="Output directory.")
+    p_hats.add_argument("--alpha_threshold", type=int, default=0, help="Pixels with alpha <= this are trimmed.")
+    p_hats.add_argument("--min_width", type=int, default=16, help="Smallest mip level width.")
+    p_hats.add_argument("--report", type=Path, default=Path("reports/hat_compile.json"), help="Overlay timing report.")
+
+    # 11. Perintah Allocs (verifikasi jalur frame tanpa alokasi)
+    p_allocs = subparsers.add_parser("allocs", help="Measure per-frame allocations of the served frame path (tracemalloc).")
+    p_allocs.add_argument("--source", type=str, required=True, help="Frame source, e.g. a recorded .session file.")
+    p_allocs.add_argument("--model_dir", type=Path, default=Path("models"), help="Directory to load models from.")
+    p_allocs.add_argument("--model_name", type=str, default="svm_lbp.pkl", help="Name of the model file.")
+    p_allocs.add_argument("--hat", type=Path, default=Path("assets/hats/top_hat.png"), help="Path to hat PNG.")
+    p_allocs.add_argument("--frames", type=int, default=100, help="Measured frames per mode.")
+    p_allocs.add_argument("--warmup", type=int, default=10, help="Unmeasured warm-up frames per mode.")
+    p_allocs.add_argument("--report", type=Path, default=Path("reports/allocations.json"), help="JSON report path.")
+    p_allocs.add_argument("--max_live_growth", type=float, default=1024, help="Fail if pooled live memory grows more than this many bytes per frame.")
+    p_allocs.add_argument("--max_pool_allocations", type=int, default=0, help="Fail if the pool allocates more buffers than this after warm-up.")
+
+    # 12. Perintah Sweep (akurasi vs latensi parameter LBP)
+    p_sweep = subparsers.add_parser("sweep", help="Accuracy-vs-latency sweep over LBP parameters; saves the chosen model as --model_name.")
+    p_sweep.add_argument("--pos_dir", type=Path, required=True, help="Directory of positive face crops.")
+    p_sweep.add_argument("--neg_dir", type=Path, required=True, help="Directory of negative non-face images.")
+    p_sweep.add_argument("--test_size", type=float, default=0.2, help="Fraction of data to use for testing.")
+    p_sweep.add_argument("--val_size", type=float, default=0.25, help="Fraction of the training data held out to score each setting.")
+    p_sweep.add_argument("--manifest", type=Path, default=None, help="Dataset manifest file (stable splits).")
+    p_sweep.add_argument("--augment", action='store_true', help="Enable image augmentation for training.")
+    p_sweep.add_argument("--packed", type=Path, default=None,
+                         help="Packed crop shards from 'app.py pack' (read instead of the JPEGs).")
+    p_sweep.add_argument("--image_sizes", type=int, nargs='+', default=[32, 48, 64], help="Square LBP window sizes.")
+    p_sweep.add_argument("--radii", type=int, nargs='+', default=[1, 2, 3], help="LBP radii.")
+    p_sweep.add_argument("--n_points", type=int, nargs='+', default=[8, 16, 24], help="LBP sampling point counts.")
+    p_sweep.add_argument("--methods", type=str, nargs='+', choices=['uniform', 'nri_uniform'],
+                         default=['uniform', 'nri_uniform'], help="LBP methods.")
+    p_sweep.add_argument("--max_roi_ms", type=float, default=None, help="Latency budget for feature extraction per ROI.")
+    p_sweep.add_argument("--tolerance", type=float, default=0.0,
+                         help="Accept a faster frontier setting if its accuracy is within this of the best.")
+    p_sweep.add_argument("--latency_rois", type=int, default=32, help="ROIs used to time extraction.")
+    p_sweep.add_argument("--n_jobs", type=int, default=-1, help="Parallel training jobs (-1 = all cores).")
+    p_sweep.add_argument("--model_dir", type=Path, default=Path("models"), help="Directory to save the chosen model.")
+    p_sweep.add_argument("--model_name", type=str, default="svm_lbp_sweep.pkl",
+                         help="File name of the chosen model (its test data is saved next to it). "
+                              "Pass svm_lbp.pkl to replace the trained model.")
+    p_sweep.add_argument("--report", type=Path, default=Path("reports/lbp_sweep.json"), help="JSON report path.")
+
+    # 13. Perintah Tilebench (deteksi ber-tile paralel vs satu kali jalan)
+    p_tiles = subparsers.add_parser("tilebench", help="Compare tiled parallel cascade detection with single-pass detection.")
+    p_tiles.add_argument("--images", type=Path, required=True, help="Directory of (high-resolution) images.")
+    p_tiles.add_argument("--workers", type=int, nargs='+', default=[1, 2, 4], help="Thread counts to test.")
+    p_tiles.add_argument("--max_face", type=int, default=400, help="Largest face (px); also the tile overlap.")
+    p_tiles.add_argument("--tile_size", type=int, default=None, help="Square tile side in px (default: one tile per worker).")
+    p_tiles.add_argument("--repeats", type=int, default=3, help="Timed runs per image (median).")
+    p_tiles.add_argument("--report", type=Path, default=Path("reports/tiling.json"), help="JSON report path.")
+
+    # 14. Perintah Pack (crop grayscale ter-dekode dalam shard memmap)
+    p_pack = subparsers.add_parser("pack", help="Decode, grayscale and resize the dataset once into memory-mapped shards.")
+    p_pack.add_argument("--pos_dir", type=Path, required=True, help="Directory of positive face crops.")
+    p_pack.add_argument("--neg_dir", type=Path, required=True, help="Directory of negative non-face images.")
+    p_pack.add_argument("--out", type=Path, default=Path("data/packed"), help="Output directory for shards + index.json.")
+    p_pack.add_argument("--size", type=int, default=LBP_IMAGE_SIZE[0], help="Square crop size stored in the shards (use the largest LBP window you train with).")
+    p_pack.add_argument("--shard_size", type=int, default=16384, help="Crops per shard file.")
+    p_pack.add_argument("--workers", type=int, default=None, help="Decode threads (default: all cores).")
+    p_pack.add_argument("--report", type=Path, default=Path("reports/pack_io.json"), help="JSON I/O comparison report.")
 
     args = parser.parse_args()
     setup_logging()
@@ -73,12 +248,12 @@ def main():
             logger.info(f"Starting evaluation on {args.model_name}...")
             
             # Muat model dan data tes
-            test_data_path = args.model_dir / "test_data.pkl"
-            if not test_data_path.exists():
-                logger.error("test_data.pkl not found. Run training first.")
+            data_path = test_data_path(args.model_dir, args.model_name)
+            if not data_path.exists():
+                logger.error(f"{data_path.name} not found. Run training first.")
                 sys.exit(1)
                 
-            test_data = joblib.load(test_data_path)
+            test_data = joblib.load(data_path)
             X_test, y_test = test_data['X'], test_data['y']
             
             # Muat model untuk memprediksi
@@ -118,21 +293,123 @@ def main():
             plt.savefig(save_path)
             logger.info(f"Plot evaluasi disimpan ke: {save_path}")
             
-            plt.show()
+            if not args.no_show:
+                plt.show()
 
         elif args.command == "infer":
             logger.info(f"Running LBP inference on {args.image} using {args.model_name}...")
-            pipeline = InferencePipelineLBP(args.model_dir, args.model_name)
+            pipeline = InferencePipelineLBP(args.model_dir, args.model_name,
+                                            tile_workers=args.tile_workers, max_face=args.max_face)
             
             pipeline.process_image(args.image, args.out, args.hat)
             
             logger.info(f"Output saved to {args.out}")
 
+        elif args.command == "bench":
+            logger.info(f"Running detection benchmark on {args.images} with {args.model_name}...")
+            pipeline = InferencePipelineLBP(args.model_dir, args.model_name, eye_mode=args.eye_mode,
+                                            use_rejection_chain=not args.no_rejection_chain,
+                                            quantized=args.quantized, tile_workers=args.tile_workers,
+                                            max_face=args.max_face)
+            hat_data = load_hat_data(args.hat) if args.hat else None
+            run_detection_benchmark(pipeline, args.images, args.annotations, hat_data=hat_data,
+                                    thresholds=sorted(args.thresholds), iou_threshold=args.iou,
+                                    report_path=args.report)
+
+        elif args.command == "quantcheck":
+            data_path = test_data_path(args.model_dir, args.model_name)
+            if not data_path.exists():
+                logger.error(f"{data_path.name} not found. Run training first.")
+                sys.exit(1)
+            test_data = joblib.load(data_path)
+            model = joblib.load(args.model_dir / args.model_name)
+            image_size = get_lbp_params(model).get("image_size", LBP_IMAGE_SIZE)
+            run_quantization_check(model, test_data['X'], test_data['y'], image_size=image_size,
+                                   batch_sizes=args.batch_sizes, repeats=args.repeats, report_path=args.report)
+
+        elif args.command == "compilehats":
+            report = compile_hats_dir(args.src, args.out, args.alpha_threshold, args.min_width)
+            args.report.parent.mkdir(parents=True, exist_ok=True)
+            with open(args.report, "w") as f:
+                json.dump(report, f, indent=2)
+            logger.info(f"Compiled hats saved to {args.out}, timing report: {args.report}")
+            failed = [name for name, hat in report.items() if not hat["overlay_check"]["passed"]]
+            if failed:
+                logger.error(f"Compiled overlay differs from the source for: {', '.join(failed)}")
+                sys.exit(1)
+
+        elif args.command == "allocs":
+            pipeline = InferencePipelineLBP(args.model_dir, args.model_name)
+            source = open_source(args.source, realtime=False, loop=True)
+            try:
+                report = run_allocation_check(pipeline, source, load_hat_data(args.hat), frames=args.frames,
+                                              warmup=args.warmup, report_path=args.report,
+                                              max_live_growth=args.max_live_growth,
+                                              max_pool_allocations=args.max_pool_allocations)
+            finally:
+                source.release()
+            if not report["passed"]:
+                sys.exit(1)
+
+        elif args.command == "sweep":
+            run_lbp_sweep(args)
+
+        elif args.command == "tilebench":
+            logger.info(f"Tiled detection benchmark on {args.images} ({os.cpu_count()} cores)...")
+            run_tiling_benchmark(Path("assets/cascades/haarcascade_frontalface_default.xml"), args.images,
+                                 args.workers, max_face=args.max_face, tile_size=args.tile_size,
+                                 repeats=args.repeats, report_path=args.report)
+
+        elif args.command == "pack":
+            pack_dataset(args.pos_dir, args.neg_dir, args.out, size=(args.size, args.size),
+                         shard_size=args.shard_size, workers=args.workers)
+            run_io_comparison(args.out, report_path=args.report)
+
+        elif args.command == "index":
+            manifest = DatasetManifest.load(args.manifest)
+            manifest.update(args.pos_dir, label=1)
+            manifest.update(args.neg_dir, label=0)
+            manifest.assign_splits(args.test_size)
+            manifest.save()
+            logger.info(f"Manifest saved to {args.manifest} ({len(manifest.records)} records).")
+
+        elif args.command == "dedup":
+            manifest = DatasetManifest.load(args.manifest)
+            manifest.update(args.pos_dir, label=1)
+            manifest.update(args.neg_dir, label=0)
+            if manifest.test_size is None:
+                manifest.assign_splits(0.2)
+            keys = [key for d in (args.pos_dir, args.neg_dir) for key, _ in manifest.entries(d)]
+            run_dedup(manifest, keys, action=args.action, max_distance=args.max_distance,
+                      quarantine_dir=args.quarantine_dir, report_path=args.report, n_workers=args.workers)
+
         elif args.command == "webcam":
             logger.info(f"Starting webcam inference with {args.model_name}...")
-            pipeline = InferencePipelineLBP(args.model_dir, args.model_name)
+            governor = None
+            if args.target_fps:
+                governor = LatencyGovernor(args.target_fps, audit_path=args.governor_log)
+            pipeline = InferencePipelineLBP(args.model_dir, args.model_name,
+                                            eye_mode=args.eye_mode, eye_every=args.eye_every,
+                                            governor=governor, quantized=args.quantized,
+                                            tile_workers=args.tile_workers, max_face=args.max_face)
             
-            pipeline.process_webcam(args.camera, args.hat)
+            source = args.camera
+            if args.source is not None:
+                source = open_source(args.source, realtime=args.pace == 'realtime', loop=args.loop)
+            pipeline.process_webcam(source, args.hat)
+
+        elif args.command == "record":
+            if args.frames is None and args.duration is None:
+                logger.error("Give --frames and/or --duration to bound the recording.")
+                sys.exit(1)
+            source = open_source(args.source, realtime=False, width=args.width, height=args.height)
+            if not source.isOpened():
+                logger.error(f"Cannot open frame source {args.source}.")
+                sys.exit(1)
+            try:
+                record_session(source, args.out, max_frames=args.frames, duration=args.duration)
+            finally:
+                source.release()
 
     except FileNotFoundError as e:
         logger.error(f"Error: {e}. Did you forget to train or provide assets?")
@@ -0,0 +1,421 @@
+import argparse
+import heapq
+import json
+import logging
+import os
+import random
+import shlex
+import signal
+import socket
+import struct
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from pipelines.protocol import unpack_detections
+from pipelines.utils import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("!III")   # sequence_number, total_packets, packet_index
+SEQ_MOD = 65536                    # server: sequence_number = (sequence_number + 1) % 65536
+
+
+def seq_delta(seq, ref):
+    """Selisih bertanda seq - ref modulo 2^16, di rentang [-32768, 32767]."""
+    return ((seq - ref + SEQ_MOD // 2) % SEQ_MOD) - SEQ_MOD // 2
+
+
+class SimulatedClient(threading.Thread):
+    """
+    Klien UDP tiruan yang berperilaku seperti webcam_client_udp.gd:
+    REGISTER -> tunggu REGISTERED -> (opsional) HAT_CATEGORY -> terima dan
+    susun ulang potongan frame berdasarkan header !III.
+    Packet loss dan jitter disimulasikan di sisi penerima. Dengan meta=True
+    klien mendaftar lewat REGISTER_META dan menerima pesan metadata
+    (satu datagram per frame) alih-alih potongan JPEG.
+    """
+
+    def __init__(self, server_addr, client_id, duration, loss=0.0, jitter_ms=0.0,
+                 hat_category=None, frame_timeout=0.5, decode=False, seed=0, meta=False):
+        super().__init__(daemon=True)
+        self.server_addr = server_addr
+        self.client_id = client_id
+        self.duration = duration
+        self.loss = loss
+        self.jitter_ms = jitter_ms
+        self.hat_category = hat_category
+        self.frame_timeout = frame_timeout
+        self.decode = decode
+        self.meta = meta
+        self.rng = random.Random(seed)
+
+        self.registered = False
+        self.packets_received = 0
+        self.packets_lost = 0
+        self.bytes_received = 0
+        self.frames_completed = 0
+        self.frames_dropped = 0
+        self.decode_errors = 0
+        # Sequence yang sudah di-unwrap (tidak kembali ke 0 setelah 65535)
+        self.min_seq = None
+        self.max_seq = None
+        self.first_frame_time = None
+        self.last_frame_time = None
+        self.frame_intervals = []
+
+    def _register(self, sock):
+        for _ in range(10):
+            sock.sendto(b"REGISTER_META" if self.meta else b"REGISTER", self.server_addr)
+            deadline = time.perf_counter() + 1.0
+            while time.perf_counter() < deadline:
+                try:
+                    data, _ = sock.recvfrom(65536)
+                except socket.timeout:
+                    continue
+                if data == b"REGISTERED":
+                    return True
+        return False
+
+    def run(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        sock.bind(("127.0.0.1", 0))
+        sock.settimeout(0.05)
+        try:
+            self.registered = self._register(sock)
+            if not self.registered:
+                logger.warning(f"⚠️  Client {self.client_id}: registration timeout")
+                return
+            if self.hat_category:
+                sock.sendto(f"HAT_CATEGORY:{self.hat_category}".encode("utf-8"), self.server_addr)
+            self._receive_loop(sock)
+        finally:
+            try:
+                sock.sendto(b"UNREGISTER", self.server_addr)
+            except OSError:
+                pass
+            sock.close()
+
+    def _receive_loop(self, sock):
+        buffers = {}
+        delayed = []   # heap (waktu_kirim, urutan, paket) untuk simulasi jitter
+        counter = 0
+        last_completed = None
+        end_time = time.perf_counter() + self.duration
+
+        while time.perf_counter() < end_time:
+            try:
+                packet, _ = sock.recvfrom(65536)
+                if len(packet) >= HEADER.size:
+                    if self.rng.random() < self.loss:
+                        self.packets_lost += 1
+                    else:
+                        delay = self.rng.uniform(0, self.jitter_ms) / 1000.0 if self.jitter_ms else 0.0
+                        heapq.heappush(delayed, (time.perf_counter() + delay, counter, packet))
+                        counter += 1
+            except socket.timeout:
+                pass
+
+            now = time.perf_counter()
+            while delayed and delayed[0][0] <= now:
+                _, _, packet = heapq.heappop(delayed)
+                last_completed = self._handle_packet(packet, buffers, last_completed, now)
+
+            # Frame yang tidak lengkap setelah frame_timeout dianggap hilang
+            for seq in [s for s, b in buffers.items() if now - b["timestamp"] > self.frame_timeout]:
+                del buffers[seq]
+                self.frames_dropped += 1
+
+    def _handle_packet(self, packet, buffers, last_completed, now):
+        self.packets_received += 1
+        self.bytes_received += len(packet)
+        if self.meta:
+            message = unpack_detections(packet)
+            if message is None:
+                return last_completed
+            seq, total, index = message["sequence"], 1, 0
+        else:
+            seq, total, index = HEADER.unpack_from(packet)
+        if total <= 0 or index >= total or seq >= SEQ_MOD:
+            return last_completed
+        # Unwrap relatif terhadap sequence terbesar yang pernah dilihat
+        if self.max_seq is not None:
+            seq = self.max_seq + seq_delta(seq, self.max_seq % SEQ_MOD)
+        if last_completed is not None and seq < last_completed - 2:
+            return last_completed
+        self.min_seq = seq if self.min_seq is None else min(self.min_seq, seq)
+        self.max_seq = seq if self.max_seq is None else max(self.max_seq, seq)
+
+        frame_buffer = buffers.setdefault(seq, {"total": total, "parts": {}, "timestamp": now})
+        frame_buffer["parts"][index] = packet[HEADER.size:]
+        if len(frame_buffer["parts"]) < frame_buffer["total"]:
+            return last_completed
+
+        del buffers[seq]
+        if self.decode and not self.meta:
+            data = b"".join(frame_buffer["parts"][i] for i in range(frame_buffer["total"]))
+            if cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) is None:
+                self.decode_errors += 1
+        self.frames_completed += 1
+        if self.last_frame_time is not None:
+            self.frame_intervals.append(now - self.last_frame_time)
+        else:
+            self.first_frame_time = now
+        self.last_frame_time = now
+        return seq
+
+    def stats(self):
+        active = (self.last_frame_time - self.first_frame_time) if self.frames_completed > 1 else 0.0
+        intervals = np.array(self.frame_intervals) * 1000.0 if self.frame_intervals else np.zeros(1)
+        # Frame yang semua paketnya hilang tidak pernah muncul di buffer: hitung dari celah sequence
+        span = (self.max_seq - self.min_seq + 1) if self.max_seq is not None else 0
+        missing = max(0, span - self.frames_completed - self.frames_dropped)
+        total_frames = self.frames_completed + self.frames_dropped + missing
+        return {
+            "client_id": self.client_id,
+            "registered": self.registered,
+            "hat_category": self.hat_category,
+            "packets_received": self.packets_received,
+            "packets_lost_simulated": self.packets_lost,
+            "bytes_received": self.bytes_received,
+            "frames_completed": self.frames_completed,
+            "frames_dropped": self.frames_dropped + missing,
+            "frames_incomplete": self.frames_dropped,
+            "frames_missing": missing,
+            "drop_rate": (self.frames_dropped + missing) / total_frames if total_frames else 0.0,
+            "decode_errors": self.decode_errors,
+            "fps": (self.frames_completed - 1) / active if active > 0 else 0.0,
+            "frame_interval_ms_p50": float(np.percentile(intervals, 50)),
+            "frame_interval_ms_p95": float(np.percentile(intervals, 95)),
+        }
+
+
+class ProcessCpuSampler(threading.Thread):
+    """
+    Sampling CPU% sebuah proses beserta proses anaknya (misal worker
+    run_server.py --workers), via psutil jika ada, selain itu /proc.
+    """
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.max_processes = 1
+        self.stopped = threading.Event()
+        try:
+            import psutil
+            self._proc = psutil.Process(pid)
+        except ImportError:
+            self._proc = None
+        self._ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    def _proc_stat(self, pid):
+        with open(f"/proc/{pid}/stat") as f:
+            # Nama proses bisa berisi spasi; ambil field setelah ')'
+            return f.read().rsplit(")", 1)[1].split()
+
+    def _cpu_by_pid(self):
+        """{pid: detik CPU} untuk proses utama dan semua turunannya."""
+        if self._proc is not None:
+            procs = [self._proc] + self._proc.children(recursive=True)
+            result = {}
+            for proc in procs:
+                try:
+                    times = proc.cpu_times()
+                    result[proc.pid] = times.user + times.system
+                except Exception:
+                    continue
+            return result
+
+        parents = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    parents[int(entry)] = int(self._proc_stat(entry)[1])
+                except (OSError, IndexError, ValueError):
+                    continue
+        tree, frontier = {self.pid}, [self.pid]
+        while frontier:
+            parent = frontier.pop()
+            children = [p for p, pp in parents.items() if pp == parent and p not in tree]
+            tree.update(children)
+            frontier.extend(children)
+        result = {}
+        for pid in tree:
+            try:
+                fields = self._proc_stat(pid)
+                result[pid] = (int(fields[11]) + int(fields[12])) / self._ticks
+            except (OSError, IndexError, ValueError):
+                continue
+        return result
+
+    def run(self):
+        try:
+            last, last_wall = self._cpu_by_pid(), time.perf_counter()
+            if self.pid not in last:
+                raise OSError(f"process {self.pid} not found")
+            while not self.stopped.wait(self.interval):
+                current, wall = self._cpu_by_pid(), time.perf_counter()
+                if self.pid not in current:
+                    break
+                # Proses baru (worker yang baru start) dihitung dari nol
+                delta = sum(cpu - last.get(pid, 0.0) for pid, cpu in current.items())
+                self.samples.append(100.0 * delta / (wall - last_wall))
+                self.max_processes = max(self.max_processes, len(current))
+                last, last_wall = current, wall
+        except Exception as e:  # proses selesai (OSError, psutil.NoSuchProcess, ...)
+            logger.warning(f"⚠️  CPU sampling for pid {self.pid} stopped: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        self.join(timeout=2)
+
+    def stats(self):
+        if not self.samples:
+            return None
+        samples = np.array(self.samples)
+        return {"pid": self.pid, "processes": self.max_processes,
+                "cpu_percent_mean": float(samples.mean()),
+                "cpu_percent_p95": float(np.percentile(samples, 95)),
+                "cpu_percent_max": float(samples.max()), "n_samples": len(samples)}
+
+
+def run_load_test(host, port, n_clients, duration, loss=0.0, jitter_ms=0.0, hats=None,
+                  ramp=0.0, frame_timeout=0.5, decode=False, server_pid=None, seed=42, meta=False):
+    """Jalankan N klien tiruan dan kembalikan hasil (dict siap JSON)."""
+    sampler = ProcessCpuSampler(server_pid) if server_pid else None
+    if sampler:
+        sampler.start()
+
+    clients = []
+    for i in range(n_clients):
+        hat = hats[i % len(hats)] if hats else None
+        client = SimulatedClient((host, port), i, duration, loss, jitter_ms, hat,
+                                 frame_timeout, decode, seed + i, meta)
+        clients.append(client)
+        client.start()
+        if ramp and i < n_clients - 1:
+            time.sleep(ramp / max(1, n_clients - 1))
+    for client in clients:
+        client.join(duration + 15)
+
+    if sampler:
+        sampler.stop()
+
+    per_client = [c.stats() for c in clients]
+    active = [c for c in per_client if c["registered"]]
+    completed = sum(c["frames_completed"] for c in per_client)
+    dropped = sum(c["frames_dropped"] for c in per_client)
+    return {
+        "config": {"host": host, "port": port, "clients": n_clients, "duration": duration,
+                   "loss": loss, "jitter_ms": jitter_ms, "hats": hats, "ramp": ramp,
+                   "frame_timeout": frame_timeout, "decode": decode, "seed": seed,
+                   "meta": meta},
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "summary": {
+            "clients_registered": len(active),
+            "frames_completed": completed,
+            "frames_dropped": dropped,
+            "drop_rate": dropped / (completed + dropped) if completed + dropped else 0.0,
+            "fps_mean": float(np.mean([c["fps"] for c in active])) if active else 0.0,
+            "fps_min": float(min((c["fps"] for c in active), default=0.0)),
+            "mbytes_received": sum(c["bytes_received"] for c in per_client) / 1e6,
+            "kbytes_per_frame": (sum(c["bytes_received"] for c in per_client) / completed / 1024.0
+                                 if completed else 0.0),
+        },
+        "server_cpu": sampler.stats() if sampler else None,
+        "clients": per_client,
+    }
+
+def print_report(result, baseline=None):
+    summary = result["summary"]
+    print("=" * 60)
+    print(f"📊 LOAD TEST: {result['config']['clients']} clients, {result['config']['duration']}s, "
+          f"loss={result['config']['loss']:.1%}, jitter={result['config']['jitter_ms']}ms")
+    print("=" * 60)
+    for c in result["clients"]:
+        print(f"  Client {c['client_id']:>3}: {c['frames_completed']:>5} ok, {c['frames_dropped']:>4} dropped "
+              f"({c['drop_rate']:.1%}), {c['fps']:.1f} FPS, interval p95 {c['frame_interval_ms_p95']:.0f} ms")
+    if "kbytes_per_frame" in summary:
+        print(f"  Bandwidth: {summary['mbytes_received']:.2f} MB total, "
+              f"{summary['kbytes_per_frame']:.2f} KB/frame per client")
+    print(f"  Total: {summary['frames_completed']} ok, {summary['frames_dropped']} dropped "
+          f"({summary['drop_rate']:.1%}), mean FPS {summary['fps_mean']:.1f}, min FPS {summary['fps_min']:.1f}")
+    if result["server_cpu"]:
+        cpu = result["server_cpu"]
+        print(f"  Server CPU: mean {cpu['cpu_percent_mean']:.0f}%, p95 {cpu['cpu_percent_p95']:.0f}%, "
+              f"max {cpu['cpu_percent_max']:.0f}%")
+
+    if baseline is not None:
+        print("-" * 60)
+        print("📈 Dibandingkan baseline:")
+        rows = [(k, baseline["summary"].get(k), v) for k, v in summary.items()]
+        if result["server_cpu"] and baseline.get("server_cpu"):
+            rows.append(("server_cpu_mean", baseline["server_cpu"]["cpu_percent_mean"],
+                         result["server_cpu"]["cpu_percent_mean"]))
+        for key, old, new in rows:
+            if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+                print(f"  {key:<20}: {old:>10.3f} -> {new:>10.3f} ({new - old:+.3f})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test UDP server dengan banyak klien Godot tiruan.")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Alamat server.")
+    parser.add_argument("--port", type=int, default=8888, help="Port UDP server.")
+    parser.add_argument("--clients", type=int, default=4, help="Jumlah klien tiruan.")
+    parser.add_argument("--duration", type=float, default=20.0, help="Lama pengukuran per klien (detik).")
+    parser.add_argument("--loss", type=float, default=0.0, help="Probabilitas paket hilang (0-1).")
+    parser.add_argument("--jitter_ms", type=float, default=0.0, help="Jitter maksimum per paket (ms).")
+    parser.add_argument("--hats", type=str, nargs='+', default=None,
+                        help="Kategori topi (HAT_CATEGORY) dibagikan bergiliran ke klien.")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Sebar start klien selama N detik.")
+    parser.add_argument("--frame_timeout", type=float, default=0.5, help="Frame tidak lengkap dibuang setelah N detik.")
+    parser.add_argument("--decode", action='store_true', help="Decode JPEG setiap frame (seperti client asli).")
+    parser.add_argument("--meta", action='store_true',
+                        help="Klien mode metadata (REGISTER_META), untuk dibandingkan dengan mode JPEG.")
+    parser.add_argument("--server_pid", type=int, default=None, help="PID server untuk sampling CPU.")
+    parser.add_argument("--server_cmd", type=str, default=None,
+                        help="Jalankan server sendiri, misal \"python run_server.py --source rec.session --loop\".")
+    parser.add_argument("--startup", type=float, default=5.0, help="Waktu tunggu server start (dengan --server_cmd).")
+    parser.add_argument("--out", type=Path, default=None, help="File JSON hasil (default reports/loadtest_<waktu>.json).")
+    parser.add_argument("--compare", type=Path, default=None, help="JSON hasil run sebelumnya untuk dibandingkan.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed simulasi loss/jitter.")
+    args = parser.parse_args()
+
+    server = None
+    server_pid = args.server_pid
+    if args.server_cmd:
+        server = subprocess.Popen(shlex.split(args.server_cmd))
+        server_pid = server.pid
+        logger.info(f"🚀 Server dijalankan (pid {server_pid}), menunggu {args.startup}s...")
+        time.sleep(args.startup)
+
+    try:
+        result = run_load_test(args.host, args.port, args.clients, args.duration, args.loss,
+                               args.jitter_ms, args.hats, args.ramp, args.frame_timeout,
+                               args.decode, server_pid, args.seed, args.meta)
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGINT)
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    out_path = args.out or Path("reports") / f"loadtest_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w") as f:
+        json.dump(result, f, indent=2)
+    logger.info(f"💾 Hasil disimpan ke {out_path}")
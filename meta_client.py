@@ -0,0 +1,160 @@
+import argparse
+import json
+import logging
+import socket
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from pipelines.overlay import draw_hat
+from pipelines.protocol import unpack_detections
+from pipelines.sources import open_source
+from pipelines.utils import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+def request(sock, server_addr, message, prefix, attempts=10):
+    """Kirim pesan kontrol dan tunggu balasan berawalan 'prefix'."""
+    for _ in range(attempts):
+        sock.sendto(message.encode("utf-8"), server_addr)
+        deadline = time.monotonic() + 1.0
+        while time.monotonic() < deadline:
+            try:
+                data, _ = sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            if data.startswith(prefix.encode("utf-8")):
+                return data.decode("utf-8")
+    return None
+
+def load_sprites(hats, hats_dir):
+    """Muat sprite topi (BGRA) sesuai daftar HAT_LIST dari server; kunci = id topi."""
+    sprites = {}
+    for hat in hats:
+        path = hats_dir / (hat.get("file") or "")
+        image = cv2.imread(str(path), cv2.IMREAD_UNCHANGED) if path.is_file() else None
+        if image is None or image.ndim != 3 or image.shape[2] != 4:
+            logger.warning(f"⚠️  Sprite {path} tidak ada atau tanpa alpha, topi '{hat['name']}' dilewati")
+            continue
+        sprites[hat["id"]] = image
+    return sprites
+
+def render_metadata(frame, message, sprites, show_box=True):
+    """
+    Render di sisi klien: posisi topi sudah dihitung server untuk ukuran
+    frame server, jadi cukup diskalakan jika frame lokal berbeda ukuran.
+    """
+    frame_w, frame_h = message["frame_size"]
+    sx, sy = frame.shape[1] / frame_w, frame.shape[0] / frame_h
+    hat_img = sprites.get(message["hat_id"])
+    for face in message["faces"]:
+        if hat_img is not None and face["hat"] is not None:
+            hx, hy, hw, hh, angle = face["hat"]
+            placement = (int(hx * sx), int(hy * sy), max(1, int(hw * sx)), max(1, int(hh * sy)), angle)
+            frame = draw_hat(frame, hat_img, placement)
+        if show_box:
+            x, y, w, h = face["box"]
+            cv2.rectangle(frame, (int(x * sx), int(y * sy)), (int((x + w) * sx), int((y + h) * sy)), (0, 255, 0), 2)
+    return frame
+
+def run_client(host, port, hat=None, hats_dir=Path("assets/hats"), source_spec=None, duration=None,
+               show=False, out_path=None):
+    """
+    Klien referensi mode metadata: daftar dengan REGISTER_META, ambil daftar
+    topi (HAT_LIST), lalu render topi sendiri di atas frame lokal ('source')
+    atau kanvas hitam seukuran frame server.
+    """
+    server_addr = (host, port)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("0.0.0.0", 0))
+    sock.settimeout(0.2)
+
+    if request(sock, server_addr, "REGISTER_META", "REGISTERED") is None:
+        sock.close()
+        raise RuntimeError(f"Server {host}:{port} tidak membalas REGISTER_META")
+    reply = request(sock, server_addr, "HAT_LIST", "HATS:")
+    hats = json.loads(reply[len("HATS:"):]) if reply else []
+    sprites = load_sprites(hats, hats_dir)
+    logger.info(f"✅ Terdaftar (metadata), {len(sprites)}/{len(hats)} sprite topi dimuat")
+    if hat:
+        sock.sendto(f"HAT_CATEGORY:{hat}".encode("utf-8"), server_addr)
+
+    source = open_source(source_spec) if source_spec else None
+    frame = None
+    stats = {"messages": 0, "bytes": 0, "faces": 0, "render_ms": []}
+    start = time.monotonic()
+    try:
+        while duration is None or time.monotonic() - start < duration:
+            try:
+                data, _ = sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            message = unpack_detections(data)
+            if message is None:
+                continue
+            stats["messages"] += 1
+            stats["bytes"] += len(data)
+            stats["faces"] += len(message["faces"])
+
+            if source is not None:
+                ret, local = source.read()
+                if ret:
+                    frame = local
+            if frame is None or source is None:
+                frame_w, frame_h = message["frame_size"]
+                frame = np.zeros((frame_h, frame_w, 3), dtype=np.uint8)
+
+            t0 = time.perf_counter()
+            rendered = render_metadata(frame.copy(), message, sprites)
+            stats["render_ms"].append((time.perf_counter() - t0) * 1000.0)
+            if show:
+                cv2.imshow("Meta client (q untuk keluar)", rendered)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.sendto(b"UNREGISTER", server_addr)
+        sock.close()
+        if source is not None:
+            source.release()
+        if show:
+            cv2.destroyAllWindows()
+
+    elapsed = time.monotonic() - start
+    render_ms = np.array(stats["render_ms"]) if stats["render_ms"] else np.zeros(1)
+    result = {
+        "messages": stats["messages"],
+        "fps": stats["messages"] / elapsed if elapsed > 0 else 0.0,
+        "bytes_per_frame": stats["bytes"] / stats["messages"] if stats["messages"] else 0.0,
+        "faces_per_frame": stats["faces"] / stats["messages"] if stats["messages"] else 0.0,
+        "render_ms_mean": float(render_ms.mean()),
+        "render_ms_p95": float(np.percentile(render_ms, 95)),
+    }
+    logger.info(f"📊 {result['messages']} pesan ({result['fps']:.1f} FPS), {result['bytes_per_frame']:.0f} "
+                f"byte/frame, {result['faces_per_frame']:.2f} wajah/frame, render klien "
+                f"{result['render_ms_mean']:.2f} ms (p95 {result['render_ms_p95']:.2f} ms)")
+    if out_path:
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(out_path, "w") as f:
+            json.dump(result, f, indent=2)
+        logger.info(f"💾 Hasil disimpan ke {out_path}")
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Klien referensi mode metadata (render topi di klien).")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Alamat server.")
+    parser.add_argument("--port", type=int, default=8888, help="Port UDP server.")
+    parser.add_argument("--hat", type=str, default=None, help="Nama topi (HAT_CATEGORY), misal FEDORA.")
+    parser.add_argument("--hats_dir", type=Path, default=Path("assets/hats"), help="Direktori sprite topi lokal.")
+    parser.add_argument("--source", type=str, default=None,
+                        help="Sumber frame lokal untuk latar (default: kanvas hitam).")
+    parser.add_argument("--duration", type=float, default=None, help="Berhenti setelah N detik.")
+    parser.add_argument("--show", action='store_true', help="Tampilkan hasil render di jendela.")
+    parser.add_argument("--out", type=Path, default=None, help="File JSON statistik.")
+    args = parser.parse_args()
+
+    run_client(args.host, args.port, args.hat, args.hats_dir, args.source, args.duration, args.show, args.out)
@@ -0,0 +1,112 @@
+import logging
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Set augmentasi default (sama dengan augment_image lama): flip + 3 rotasi
+DEFAULT_AUGMENTATIONS = ("flip", "rot-10", "rot5", "rot10")
+
+def parse_augmentation(name):
+    """Ubah nama augmentasi ('flip', 'rot<derajat>') menjadi (jenis, nilai)."""
+    if name == "flip":
+        return ("flip", None)
+    if name.startswith("rot"):
+        try:
+            return ("rot", float(name[3:]))
+        except ValueError:
+            pass
+    raise ValueError(f"Unknown augmentation: {name} (use 'flip' or 'rot<angle>', e.g. rot-10)")
+
+
+class BatchAugmenter:
+    """
+    Augmentasi batch crop grayscale berukuran tetap (misal 64x64).
+    Peta remap untuk setiap rotasi dihitung sekali di awal, sehingga tiap
+    warp hanya berupa cv2.remap kecil, bukan rotasi gambar resolusi penuh.
+    """
+
+    def __init__(self, size, augmentations=DEFAULT_AUGMENTATIONS, per_sample=None, random_state=42):
+        self.size = tuple(size)
+        self.names = list(augmentations)
+        self.specs = [parse_augmentation(name) for name in self.names]
+        self.per_sample = len(self.specs) if per_sample is None else min(per_sample, len(self.specs))
+        self.rng = np.random.RandomState(random_state)
+        self.maps = {}
+
+        w, h = self.size
+        center = (w // 2, h // 2)
+        grid_x, grid_y = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+        for kind, value in self.specs:
+            if kind != "rot" or value in self.maps:
+                continue
+            # Invers affine: untuk tiap piksel tujuan, cari posisi sumbernya
+            M = cv2.getRotationMatrix2D(center, value, 1.0)
+            M_inv = cv2.invertAffineTransform(M)
+            map_x = M_inv[0, 0] * grid_x + M_inv[0, 1] * grid_y + M_inv[0, 2]
+            map_y = M_inv[1, 0] * grid_x + M_inv[1, 1] * grid_y + M_inv[1, 2]
+            self.maps[value] = cv2.convertMaps(map_x.astype(np.float32), map_y.astype(np.float32),
+                                               cv2.CV_16SC2)
+
+    @property
+    def copies_per_sample(self):
+        """Jumlah gambar yang dihasilkan per sampel (asli + augmentasi)."""
+        return 1 + self.per_sample
+
+    def _apply(self, batch, spec):
+        kind, value = spec
+        if kind == "flip":
+            return np.ascontiguousarray(batch[:, :, ::-1])
+        map1, map2 = self.maps[value]
+        out = np.empty_like(batch)
+        for i in range(len(batch)):
+            cv2.remap(batch[i], map1, map2, cv2.INTER_LINEAR, dst=out[i],
+                      borderMode=cv2.BORDER_REPLICATE)
+        return out
+
+    def augment(self, batch, labels):
+        """
+        Generator: hasilkan (batch_gambar, label) untuk batch asli lalu tiap
+        augmentasi. Jika per_sample < jumlah augmentasi, setiap sampel
+        mendapat subset acak augmentasi (tetap per_sample buah).
+        """
+        yield batch, labels
+        if self.per_sample == 0 or len(batch) == 0:
+            return
+        if self.per_sample == len(self.specs):
+            for spec in self.specs:
+                yield self._apply(batch, spec), labels
+            return
+
+        # Pilih augmentasi per sampel, lalu kelompokkan per jenis augmentasi
+        choices = np.array([self.rng.choice(len(self.specs), self.per_sample, replace=False)
+                            for _ in range(len(batch))])
+        for spec_idx, spec in enumerate(self.specs):
+            rows = np.nonzero((choices == spec_idx).any(axis=1))[0]
+            if len(rows):
+                yield self._apply(batch[rows], spec), labels[rows]
+
+
+def iter_crop_batches(paths, labels, size, batch_size=256):
+    """
+    Generator batch crop grayscale yang sudah di-resize ke 'size'.
+    Gambar yang gagal dibaca dilewati.
+    """
+    size = tuple(size)
+    w, h = size
+    batch = np.empty((batch_size, h, w), dtype=np.uint8)
+    batch_labels = np.empty(batch_size, dtype=int)
+    n = 0
+    for path, label in zip(paths, labels):
+        img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            logger.warning(f"Could not read image {path}, skipping.")
+            continue
+        cv2.resize(img, size, dst=batch[n], interpolation=cv2.INTER_AREA)
+        batch_labels[n] = label
+        n += 1
+        if n == batch_size:
+            yield batch[:n].copy(), batch_labels[:n].copy()
+            n = 0
+    if n:
+        yield batch[:n].copy(), batch_labels[:n].copy()
@@ -0,0 +1,217 @@
+import json
+import logging
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .buffers import FrameBufferPool, measure_frame_allocations
+from .eyes import box_iou
+from .manifest import scan_image_paths
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCORE_THRESHOLDS = (-0.5, -0.25, 0.0, 0.25, 0.5, 1.0)
+
+def load_annotations(path):
+    """
+    Muat anotasi kotak wajah dari JSON:
+        {"nama_gambar.jpg": [[x, y, w, h], ...], ...}
+    Kunci adalah path relatif terhadap folder gambar. Gambar tanpa wajah
+    ditulis dengan list kosong.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    return {Path(name).as_posix(): [tuple(int(v) for v in box) for box in boxes]
+            for name, boxes in data.items()}
+
+def match_detections(detections, ground_truth, iou_threshold=0.5):
+    """
+    Pencocokan greedy (skor tertinggi dulu): setiap kotak ground-truth hanya
+    boleh dicocokkan dengan satu deteksi. Mengembalikan (tp, fp, fn).
+    """
+    matched = set()
+    tp = 0
+    for box, _ in sorted(detections, key=lambda d: d[1], reverse=True):
+        best_iou, best_idx = 0.0, None
+        for idx, gt in enumerate(ground_truth):
+            if idx in matched:
+                continue
+            iou = box_iou(box, gt)
+            if iou > best_iou:
+                best_iou, best_idx = iou, idx
+        if best_idx is not None and best_iou >= iou_threshold:
+            matched.add(best_idx)
+            tp += 1
+    return tp, len(detections) - tp, len(ground_truth) - tp
+
+def run_detection_benchmark(pipeline, image_dir, annotations_path, hat_data=None,
+                            thresholds=DEFAULT_SCORE_THRESHOLDS, iou_threshold=0.5,
+                            warmup=3, report_path=None):
+    """
+    Jalankan pipeline end-to-end pada gambar penuh beranotasi (headless) dan
+    laporkan precision/recall per threshold skor verifier bersama FPS dan
+    waktu per tahap, sehingga optimasi kecepatan bisa dinilai terhadap akurasi.
+    """
+    image_dir = Path(image_dir)
+    annotations = load_annotations(annotations_path)
+    paths = [p for p in sorted(scan_image_paths(image_dir))
+             if p.relative_to(image_dir).as_posix() in annotations]
+    if not paths:
+        raise FileNotFoundError(f"No annotated images found in {image_dir}")
+    unannotated = len(scan_image_paths(image_dir)) - len(paths)
+    if unannotated:
+        logger.warning(f"{unannotated} images in {image_dir} have no annotation and are skipped.")
+
+    frames = []
+    for path in paths:
+        frame = cv2.imread(str(path))
+        if frame is None:
+            logger.warning(f"Could not read image {path}, skipping.")
+            continue
+        frames.append((path.relative_to(image_dir).as_posix(), frame))
+
+    show_hat = hat_data is not None
+    # Warm-up: cache cascade/alokasi pertama tidak ikut diukur
+    for _, frame in frames[:warmup]:
+        pipeline.process_frame(frame, hat_data, show_hat=show_hat, show_box=False)
+    pipeline.timer.reset()
+    if pipeline.rejection_chain is not None:
+        pipeline.rejection_chain.reset_stats()
+    pipeline.rois_verified = 0
+
+    counts = {t: np.zeros(3, dtype=int) for t in thresholds}
+    n_faces = 0
+    start = time.perf_counter()
+    for name, frame in frames:
+        pipeline.process_frame(frame, hat_data, show_hat=show_hat, show_box=False)
+        candidates = pipeline.last_candidates
+        ground_truth = annotations[name]
+        n_faces += len(ground_truth)
+        for t in thresholds:
+            detections = [(box, score) for box, score in candidates if score >= t]
+            counts[t] += match_detections(detections, ground_truth, iou_threshold)
+    elapsed = time.perf_counter() - start
+
+    results = []
+    for t in thresholds:
+        tp, fp, fn = (int(v) for v in counts[t])
+        results.append({
+            "threshold": t, "tp": tp, "fp": fp, "fn": fn,
+            "precision": tp / (tp + fp) if tp + fp else 1.0,
+            "recall": tp / (tp + fn) if tp + fn else 1.0,
+        })
+    report = {
+        "n_images": len(frames),
+        "n_faces": n_faces,
+        "iou_threshold": iou_threshold,
+        "fps": len(frames) / elapsed if elapsed > 0 else 0.0,
+        "ms_per_frame": 1000.0 * elapsed / max(1, len(frames)),
+        "stage_ms": pipeline.timer.summary(),
+        "rois_verified": pipeline.rois_verified,
+        "thresholds": results,
+    }
+
+    logger.info(f"Detection benchmark: {len(frames)} images, {n_faces} faces, "
+                f"{report['fps']:.1f} FPS ({report['ms_per_frame']:.1f} ms/frame)")
+    logger.info("Stage times: " + ", ".join(f"{k}={v:.2f}ms" for k, v in report["stage_ms"].items()))
+    for r in results:
+        logger.info(f"  score >= {r['threshold']:+.2f}: precision={r['precision']:.3f} "
+                    f"recall={r['recall']:.3f} (tp={r['tp']}, fp={r['fp']}, fn={r['fn']})")
+
+    if report_path is not None:
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Benchmark report written to {report_path}")
+    return report
+
+def run_allocation_check(pipeline, source, hat_data, frames=100, warmup=10, report_path=None,
+                         max_live_growth=1024, max_pool_allocations=0):
+    """
+    Verifikasi jalur frame server (capture -> mirror -> deteksi -> render ->
+    encode JPEG -> handoff ke pengirim) dengan tracemalloc, dua kali:
+      - 'unpooled' : setiap frame dialokasi baru (pool kosong tiap frame,
+                     flip/copy biasa, tobytes()),
+      - 'pooled'   : buffer dipakai ulang dan hasil encode diserahkan
+                     sebagai memoryview.
+    Hasil encode cv2.imencode selalu array baru; ukurannya ikut terlihat.
+
+    Jalur 'pooled' lolos jika setelah warm-up pertumbuhan memori hidup
+    <= max_live_growth byte/frame dan pool mengalokasi paling banyak
+    max_pool_allocations buffer baru ('passed' di laporan). Gunakan sumber
+    berukuran tetap (rekaman .session); folder gambar dengan ukuran berbeda
+    memaksa pool mengalokasi ulang.
+    """
+    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 50]
+    show_hat = hat_data is not None
+    state = {"capture": None, "warm_allocations": None}
+    pools = {"pooled": FrameBufferPool()}
+
+    def read_frame(out=None):
+        ret, frame = source.read(out)
+        if not ret:
+            raise RuntimeError("Frame source ended during the allocation check (use a looping source)")
+        return frame
+
+    def unpooled_step(_):
+        pipeline.buffers = FrameBufferPool()
+        frame = cv2.flip(read_frame(), 1)
+        detections = pipeline.detect(frame, need_angles=show_hat)
+        rendered = pipeline.render(frame, detections, hat_data, show_hat, True)
+        ok, encoded = cv2.imencode('.jpg', rendered, encode_param)
+        return encoded.tobytes()
+
+    def pooled_step(i):
+        pool = pools["pooled"]
+        if i == warmup:
+            state["warm_allocations"] = pool.allocations
+        pipeline.buffers = pool
+        state["capture"] = read_frame(state["capture"])
+        frame = cv2.flip(state["capture"], 1, dst=pool.get("mirror", state["capture"].shape))
+        detections = pipeline.detect(frame, need_angles=show_hat)
+        rendered = pipeline.render(frame, detections, hat_data, show_hat, True,
+                                   out=pool.get("render", frame.shape))
+        ok, encoded = cv2.imencode('.jpg', rendered, encode_param)
+        return memoryview(encoded).cast("B")
+
+    report = {}
+    for name, step in (("unpooled", unpooled_step), ("pooled", pooled_step)):
+        report[name] = measure_frame_allocations(step, frames, warmup)
+    pool = pools["pooled"]
+    report["pooled"]["pool_bytes"] = pool.nbytes
+    report["pooled"]["pool_allocations"] = pool.allocations
+    report["pooled"]["pool_allocations_after_warmup"] = pool.allocations - (state["warm_allocations"] or 0)
+    pipeline.buffers = FrameBufferPool()
+
+    for name in ("unpooled", "pooled"):
+        r = report[name]
+        logger.info(f"{name:<8}: peak transient {r['peak_transient_bytes_mean'] / 1024:.1f} KiB/frame "
+                    f"(max {r['peak_transient_bytes_max'] / 1024:.1f} KiB), live growth "
+                    f"{r['live_growth_bytes_per_frame']:.0f} B/frame")
+    logger.info(f"Pool: {pool.allocations} buffers allocated in total ({pool.nbytes / 1e6:.1f} MB) "
+                f"over {warmup + frames} frames")
+
+    pooled = report["pooled"]
+    failures = []
+    if pooled["live_growth_bytes_per_frame"] > max_live_growth:
+        failures.append(f"live growth {pooled['live_growth_bytes_per_frame']:.0f} B/frame > {max_live_growth}")
+    if pooled["pool_allocations_after_warmup"] > max_pool_allocations:
+        failures.append(f"{pooled['pool_allocations_after_warmup']} pool allocations after warm-up "
+                        f"> {max_pool_allocations}")
+    report["limits"] = {"max_live_growth": max_live_growth, "max_pool_allocations": max_pool_allocations}
+    report["passed"] = not failures
+    if failures:
+        logger.error(f"Pooled frame path is not allocation-free: {'; '.join(failures)}")
+    else:
+        logger.info("Pooled frame path is within the allocation limits")
+
+    if report_path is not None:
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Allocation report written to {report_path}")
+    return report
@@ -3,22 +3,51 @@ from pathlib import Path
 import numpy as np
 from sklearn.model_selection import train_test_split
 
+from .manifest import DatasetManifest, scan_image_paths
+
 logger = logging.getLogger(__name__)
 
-def load_dataset_from_dirs(pos_dir: Path, neg_dir: Path, test_size: float):
+def load_dataset_from_manifest(pos_dir: Path, neg_dir: Path, test_size: float, manifest_path: Path):
+    """
+    Memuat dataset lewat manifest persisten. Manifest diperbarui secara
+    inkremental, dan split train/test diambil dari hash isi file sehingga
+    stabil antar run.
+    """
+    manifest = DatasetManifest.load(manifest_path)
+    manifest.update(pos_dir, label=1)
+    manifest.update(neg_dir, label=0)
+    manifest.assign_splits(test_size)
+    manifest.save()
+
+    splits = {"train": ([], []), "test": ([], [])}
+    for directory, label in ((pos_dir, 1), (neg_dir, 0)):
+        count = 0
+        for key, record in manifest.entries(directory, label=label):
+            paths, labels = splits[record["split"]]
+            paths.append(key)
+            labels.append(label)
+            count += 1
+        logger.info(f"Manifest: {count} samples with label {label} in {directory}")
+
+    (train_paths, train_labels), (test_paths, test_labels) = splits["train"], splits["test"]
+    if not train_paths or not test_paths or len(set(train_labels)) < 2:
+        raise FileNotFoundError("Dataset images not found (or a split is empty).")
+
+    logger.info(f"Dataset split: {len(train_paths)} train/val samples, {len(test_paths)} test samples.")
+    return np.array(train_paths), np.array(test_paths), np.array(train_labels), np.array(test_labels)
+
+def load_dataset_from_dirs(pos_dir: Path, neg_dir: Path, test_size: float, manifest_path: Path = None):
     """
     Memuat path gambar dan label dari direktori positif dan negatif.
     Mencari secara rekursif dan menghapus duplikat.
+    Jika 'manifest_path' diberikan, pemindaian & split memakai manifest.
     """
+    if manifest_path is not None:
+        return load_dataset_from_manifest(pos_dir, neg_dir, test_size, manifest_path)
 
     def get_image_paths(directory: Path):
-        """Helper untuk mengambil semua ekstensi gambar umum secara rekursif."""
-        paths_with_duplicates = []
-        extensions = ["*.jpg", "*.jpeg", "*.png", "*.JPG", "*.JPEG", "*.PNG"]
-        for ext in extensions:
-            paths_with_duplicates.extend(directory.rglob(ext))
-        # Hapus duplikat yang mungkin muncul karena case-insensitivity (misal .jpg dan .JPG)
-        return list(set(paths_with_duplicates))
+        """Helper untuk mengambil semua ekstensi gambar umum secara rekursif (satu kali scan)."""
+        return scan_image_paths(directory)
 
     logger.info(f"Loading positive samples from: {pos_dir}")
     pos_paths = get_image_paths(pos_dir)
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# File besar didekode pada 1/4 resolusi (cukup untuk hash 32x32)
+REDUCED_DECODE_BYTES = 100_000
+# Bucket dengan anggota lebih dari ini dipecah lagi pada bit sisanya; yang
+# tetap terlalu besar dipotong (dan dilaporkan) agar memori tetap O(MAX_BUCKET^2)
+MAX_BUCKET = 2048
+# Kedalaman pemecahan ulang dibatasi: tiap tingkat mengalikan jumlah band
+MAX_REHASH_DEPTH = 2
+
+def perceptual_hash(path, size_bytes=None):
+    """
+    pHash 64-bit: DCT dari gambar grayscale 32x32, ambil blok 8x8 frekuensi
+    rendah dan bandingkan dengan mediannya. Mengembalikan int atau None.
+    """
+    if size_bytes is None:
+        try:
+            size_bytes = os.path.getsize(path)
+        except OSError:
+            return None
+    flag = cv2.IMREAD_REDUCED_GRAYSCALE_4 if size_bytes > REDUCED_DECODE_BYTES else cv2.IMREAD_GRAYSCALE
+    img = cv2.imread(str(path), flag)
+    if img is None:
+        return None
+    small = cv2.resize(img, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    block = cv2.dct(small)[:8, :8].ravel()
+    bits = block > np.median(block[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def _popcount(x):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    # Fallback numpy < 2.0: hitung bit per byte
+    as_bytes = x.view(np.uint8).reshape(x.shape + (8,))
+    return np.unpackbits(as_bytes, axis=-1).sum(axis=-1)
+
+def _band_masks(bits, n_bands):
+    """Bagi posisi bit menjadi n_bands mask uint64 yang saling lepas."""
+    masks = []
+    for chunk in np.array_split(np.asarray(bits), n_bands):
+        mask = 0
+        for bit in chunk:
+            mask |= 1 << int(bit)
+        masks.append(np.uint64(mask))
+    return masks
+
+def _bucket_pairs(hashes, members, bits, max_distance, max_bucket, pairs, truncated, depth=0):
+    """
+    Pigeonhole pada 'bits': anggota yang jaraknya <= max_distance pasti
+    identik pada minimal satu dari max_distance+1 band. Bucket yang terlalu
+    besar sudah identik pada band tersebut, jadi cukup dipecah lagi pada
+    bit sisanya (rekursif) dan dibandingkan hanya di dalam sub-bucket.
+    """
+    n_bands = max_distance + 1
+    for mask in _band_masks(bits, n_bands):
+        band = hashes[members] & mask
+        order = np.argsort(band, kind="stable")
+        sorted_band = band[order]
+        boundaries = np.nonzero(np.diff(sorted_band))[0] + 1
+        for bucket in np.split(members[order], boundaries):
+            if len(bucket) < 2:
+                continue
+            if len(bucket) > max_bucket:
+                rest = [bit for bit in bits if not (int(mask) >> int(bit)) & 1]
+                if len(rest) >= n_bands and depth < MAX_REHASH_DEPTH:
+                    _bucket_pairs(hashes, bucket, rest, max_distance, max_bucket, pairs, truncated, depth + 1)
+                    continue
+                truncated.append({"mask": f"{int(mask):016x}", "value": f"{int(hashes[bucket[0]] & mask):016x}",
+                                  "size": int(len(bucket)), "compared": int(max_bucket)})
+                bucket = bucket[:max_bucket]
+            bucket_hashes = hashes[bucket]
+            dist = _popcount(bucket_hashes[:, None] ^ bucket_hashes[None, :])
+            ii, jj = np.nonzero(dist <= max_distance)
+            upper = ii < jj
+            pairs.update(zip(bucket[ii[upper]].tolist(), bucket[jj[upper]].tolist()))
+
+def find_near_duplicate_pairs(hashes, max_distance=4, max_bucket=MAX_BUCKET):
+    """
+    Cari pasangan dengan jarak Hamming <= max_distance tanpa perbandingan
+    semua-pasangan. Hash 64-bit dibagi menjadi max_distance+1 band; menurut
+    prinsip pigeonhole, pasangan dengan jarak <= max_distance pasti identik
+    pada minimal satu band, sehingga cukup membandingkan anggota bucket yang
+    sama (LSH). Bucket yang timpang dipecah lagi pada bit lain (lihat
+    _bucket_pairs) sehingga memori dan waktu per bucket terbatas.
+
+    Hash identik digabung dulu: tiap salinan dihubungkan ke salinan
+    pertamanya saja (cukup untuk komponen di group_pairs), bukan semua
+    pasangan. Mengembalikan (pairs, truncated) dengan 'truncated' daftar
+    bucket yang hanya dibandingkan sebagian (ukuran > max_bucket).
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    unique, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    pairs = {(int(first[u]), int(i)) for i, u in enumerate(inverse) if first[u] != i}
+
+    unique_pairs, truncated = set(), []
+    _bucket_pairs(unique, np.arange(len(unique)), list(range(64)), max_distance, max_bucket,
+                  unique_pairs, truncated)
+    for u, v in unique_pairs:
+        i, j = sorted((int(first[u]), int(first[v])))
+        pairs.add((i, j))
+    return pairs, truncated
+
+def group_pairs(n, pairs):
+    """Union-find: kembalikan id grup (komponen terhubung) untuk setiap indeks."""
+    parent = np.arange(n)
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    for i, j in pairs:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    return np.array([find(i) for i in range(n)])
+
+def update_phashes(manifest, keys, n_workers=8):
+    """Hitung pHash (paralel) hanya untuk record yang belum punya."""
+    missing = [key for key in keys if "phash" not in manifest.records[key]]
+    if not missing:
+        return 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        results = list(pool.map(
+            lambda key: perceptual_hash(key, manifest.records[key].get("size")), missing))
+    for key, phash in zip(missing, results):
+        manifest.records[key]["phash"] = phash
+    logger.info(f"Computed {len(missing)} perceptual hashes in {time.perf_counter() - start:.1f}s")
+    return len(missing)
+
+def find_duplicate_groups(manifest, keys, max_distance=4, n_workers=8):
+    """
+    Kelompokkan path di 'keys' menjadi grup near-duplicate (ukuran >= 2).
+    Mengembalikan (groups, truncated), lihat find_near_duplicate_pairs.
+    """
+    update_phashes(manifest, keys, n_workers)
+    valid = [key for key in keys if manifest.records[key].get("phash") is not None]
+    hashes = np.array([manifest.records[key]["phash"] for key in valid], dtype=np.uint64)
+
+    start = time.perf_counter()
+    pairs, truncated = find_near_duplicate_pairs(hashes, max_distance)
+    group_ids = group_pairs(len(valid), pairs)
+    logger.info(f"Found {len(pairs)} near-duplicate pairs among {len(valid)} images "
+                f"in {time.perf_counter() - start:.1f}s")
+    if truncated:
+        largest = max(truncated, key=lambda b: b["size"])
+        logger.warning(f"{len(truncated)} LSH buckets were only partly compared (largest: {largest['size']} "
+                       f"hashes, mask {largest['mask']}); near-duplicates inside them may be missed")
+
+    groups = {}
+    for key, gid in zip(valid, group_ids):
+        groups.setdefault(int(gid), []).append(key)
+    return [sorted(members) for members in groups.values() if len(members) > 1], truncated
+
+def run_dedup(manifest, keys, action="report", max_distance=4, quarantine_dir=None,
+              report_path=None, n_workers=8):
+    """
+    Jalankan deteksi near-duplicate lalu:
+      - 'report'    : tulis laporan JSON grup duplikat,
+      - 'group'     : simpan id grup di manifest (split grouped),
+      - 'quarantine': pindahkan semua kecuali satu anggota tiap grup.
+    """
+    groups, truncated = find_duplicate_groups(manifest, keys, max_distance, n_workers)
+    n_extra = sum(len(g) - 1 for g in groups)
+    cross_label = sum(1 for g in groups if len({manifest.records[k].get("label") for k in g}) > 1)
+    cross_split = sum(1 for g in groups if len({manifest.records[k].get("split") for k in g}) > 1)
+    logger.info(f"{len(groups)} duplicate groups ({n_extra} redundant images); "
+                f"{cross_label} groups span both labels, {cross_split} span train/test.")
+
+    if report_path is not None:
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, "w") as f:
+            json.dump({
+                "max_distance": max_distance,
+                "n_images": len(keys),
+                "n_groups": len(groups),
+                "n_redundant": n_extra,
+                "cross_label_groups": cross_label,
+                "cross_split_groups": cross_split,
+                "truncated_buckets": truncated,
+                "groups": groups,
+            }, f, indent=2)
+        logger.info(f"Duplicate report written to {report_path}")
+
+    if action == "group":
+        for key in keys:
+            manifest.records[key].pop("group", None)
+        for members in groups:
+            # Kunci grup = hash isi terkecil, deterministik
+            group_key = min(manifest.records[k]["hash"] for k in members)
+            for key in members:
+                manifest.records[key]["group"] = group_key
+        manifest.assign_splits(manifest.test_size or 0.2)
+        logger.info("Duplicate groups stored in the manifest; splits re-assigned per group.")
+
+    elif action == "quarantine":
+        if quarantine_dir is None:
+            raise ValueError("quarantine_dir is required for action 'quarantine'")
+        quarantine_dir = Path(quarantine_dir)
+        moved = []
+        for members in groups:
+            for key in members[1:]:
+                rel = os.path.relpath(key, os.path.commonpath(members))
+                dest = quarantine_dir / Path(members[0]).stem / rel
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(key, dest)
+                moved.append(key)
+        manifest.remove(moved)
+        logger.info(f"Moved {len(moved)} near-duplicates to {quarantine_dir}")
+
+    elif action != "report":
+        raise ValueError(f"Unknown dedup action: {action}")
+
+    manifest.save()
+    return groups
@@ -0,0 +1,144 @@
+import logging
+import cv2
+import numpy as np
+
+from .overlay import angle_from_eye_coords, MAX_HAT_ANGLE
+
+logger = logging.getLogger(__name__)
+
+def box_iou(box_a, box_b):
+    """Intersection-over-Union dari dua kotak (x, y, w, h)."""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    ix1, iy1 = max(ax, bx), max(ay, by)
+    ix2, iy2 = min(ax + aw, bx + bw), min(ay + ah, by + bh)
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+def detect_eye_coords(eye_cascade, gray, face_box, band=1.0):
+    """
+    Deteksi dua mata di dalam kotak wajah dan kembalikan titik tengahnya
+    (koordinat frame). Pencarian dibatasi pada 'band' bagian atas wajah.
+    """
+    (x, y, w, h) = face_box
+    band_h = max(1, int(h * band))
+    face_roi_gray = gray[y:y+band_h, x:x+w]
+    eyes = eye_cascade.detectMultiScale(
+        face_roi_gray,
+        scaleFactor=1.1,
+        minNeighbors=4,
+        minSize=(int(w*0.15), int(h*0.15))
+    )
+
+    if len(eyes) < 2:
+        return []
+    sorted_eyes = sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2]
+    return [((ex + ew // 2) + x, (ey + eh // 2) + y) for (ex, ey, ew, eh) in sorted_eyes]
+
+def symmetry_angle(gray, face_box, band=0.6, size=24, max_angle=MAX_HAT_ANGLE, step=5):
+    """
+    Estimator sudut murah berbasis simetri: putar patch kecil bagian atas wajah
+    dan cari sudut yang membuat patch paling simetris kiri-kanan.
+    Konvensi sudut sama dengan garis mata pada angle_from_eye_coords.
+    """
+    (x, y, w, h) = face_box
+    band_h = max(1, int(h * band))
+    roi = gray[y:y+band_h, x:x+w]
+    if roi.size == 0:
+        return 0.0
+
+    patch = cv2.resize(roi, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    center = (size / 2.0, size / 2.0)
+    # Abaikan tepi patch karena terpengaruh border saat rotasi
+    margin = size // 6
+
+    best_angle, best_score = 0.0, None
+    for angle in np.arange(-max_angle, max_angle + 1e-6, step):
+        M = cv2.getRotationMatrix2D(center, float(angle), 1.0)
+        rotated = cv2.warpAffine(patch, M, (size, size), flags=cv2.INTER_LINEAR,
+                                 borderMode=cv2.BORDER_REPLICATE)
+        core = rotated[margin:size-margin, margin:size-margin]
+        score = float(np.mean(np.abs(core - core[:, ::-1])))
+        if best_score is None or score < best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+class EyeAngleEstimator:
+    """
+    Estimasi sudut topi per wajah yang lebih hemat daripada menjalankan
+    eye cascade di seluruh ROI wajah setiap frame:
+      - eye cascade hanya dijalankan pada pita atas kotak wajah,
+      - maksimal sekali setiap 'detect_every' frame per wajah yang di-track,
+      - di antara deteksi, sudut dipakai ulang dengan smoothing (EMA),
+      - jika mata tidak ditemukan, estimator simetri dipakai sebagai fallback.
+    """
+
+    def __init__(self, eye_cascade, detect_every=5, smoothing=0.6, upper_band=0.6,
+                 match_iou=0.3, max_missed=10):
+        self.eye_cascade = eye_cascade
+        self.detect_every = max(1, int(detect_every))
+        self.smoothing = smoothing
+        self.upper_band = upper_band
+        self.match_iou = match_iou
+        self.max_missed = max_missed
+        self.tracks = []
+        self.eye_runs = 0
+
+    def reset(self):
+        self.tracks = []
+
+    def _match_track(self, box, used):
+        best, best_iou = None, self.match_iou
+        for i, track in enumerate(self.tracks):
+            if i in used:
+                continue
+            iou = box_iou(box, track["box"])
+            if iou >= best_iou:
+                best, best_iou = i, iou
+        return best
+
+    def _measure(self, gray, box):
+        """Ukur sudut baru: eye cascade pada pita atas, fallback simetri."""
+        self.eye_runs += 1
+        eye_coords = detect_eye_coords(self.eye_cascade, gray, box, band=self.upper_band)
+        if len(eye_coords) == 2:
+            return float(angle_from_eye_coords(eye_coords))
+        return symmetry_angle(gray, box, band=self.upper_band)
+
+    def update(self, gray, boxes):
+        """
+        Kembalikan daftar sudut (derajat) untuk setiap kotak di 'boxes'
+        dan perbarui state tracking antar frame.
+        """
+        angles = []
+        used = set()
+
+        for box in boxes:
+            idx = self._match_track(box, used)
+            if idx is None:
+                # Wajah baru: langsung ukur tanpa smoothing
+                angle = self._measure(gray, box)
+                self.tracks.append({"box": box, "angle": angle, "age": 0, "missed": 0})
+                used.add(len(self.tracks) - 1)
+            else:
+                track = self.tracks[idx]
+                used.add(idx)
+                track["box"] = box
+                track["age"] += 1
+                track["missed"] = 0
+                if track["age"] % self.detect_every == 0:
+                    measured = self._measure(gray, box)
+                    track["angle"] = (self.smoothing * track["angle"]
+                                      + (1.0 - self.smoothing) * measured)
+                angle = track["angle"]
+            angles.append(float(np.clip(angle, -MAX_HAT_ANGLE, MAX_HAT_ANGLE)))
+
+        # Buang track yang sudah lama tidak terlihat
+        for i, track in enumerate(self.tracks):
+            if i not in used:
+                track["missed"] += 1
+        self.tracks = [t for t in self.tracks if t["missed"] <= self.max_missed]
+
+        return angles
@@ -0,0 +1,89 @@
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+from sklearn.kernel_approximation import AdditiveChi2Sampler
+from sklearn.pipeline import Pipeline
+
+logger = logging.getLogger(__name__)
+
+FEATURE_MAPS = ("none", "chi2")
+
+def build_feature_map(name="none", sample_steps=2):
+    """
+    Peta fitur eksplisit sebelum SVM linear. 'chi2' = AdditiveChi2Sampler
+    (aproksimasi kernel chi-kuadrat aditif, cocok untuk histogram LBP):
+    fit hanya mencatat jumlah bin, jumlah fitur menjadi
+    n_bins * (2 * sample_steps - 1), dan skor tetap satu perkalian titik
+    per ROI setelah transformasi.
+    """
+    if name in (None, "none"):
+        return None
+    if name == "chi2":
+        return AdditiveChi2Sampler(sample_steps=sample_steps)
+    raise ValueError(f"Unknown feature map: {name} (choose from {FEATURE_MAPS})")
+
+def with_feature_map(model, feature_map):
+    """Gabungkan peta fitur dan model linear menjadi satu Pipeline (input tetap histogram LBP)."""
+    if feature_map is None:
+        return model
+    return Pipeline([("feature_map", feature_map), ("svm", model)])
+
+def has_feature_map(model):
+    return isinstance(model, Pipeline) and "feature_map" in model.named_steps
+
+def _per_roi_us(fn, features, batch, repeats):
+    rng = np.random.RandomState(0)
+    rows = features[rng.randint(0, len(features), batch)]
+    fn(rows)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(rows)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1e6 / batch
+
+def run_feature_map_report(model, baseline, X_test, y_test, batch_sizes=(1, 8, 64), repeats=200,
+                           report_path=None):
+    """
+    Bandingkan model dengan peta fitur terhadap baseline linear pada
+    histogram mentah (C sama, data latih sama): akurasi uji dan latensi
+    skoring per ROI (transformasi + decision_function) per ukuran batch.
+    Ekstraksi LBP sama untuk keduanya sehingga tidak ikut diukur.
+    """
+    y_test = np.asarray(y_test)
+    acc_map = float(np.mean(model.predict(X_test) == y_test))
+    acc_raw = float(np.mean(baseline.predict(X_test) == y_test))
+    feature_map = model.named_steps["feature_map"]
+    report = {
+        "feature_map": type(feature_map).__name__,
+        "params": feature_map.get_params(),
+        "n_features_raw": int(X_test.shape[1]),
+        "n_features_mapped": int(feature_map.transform(X_test[:1]).shape[1]),
+        "accuracy_raw": acc_raw,
+        "accuracy_mapped": acc_map,
+        "accuracy_gain": acc_map - acc_raw,
+        "latency": [],
+    }
+    for batch in batch_sizes:
+        raw_us = _per_roi_us(baseline.decision_function, X_test, batch, repeats)
+        map_us = _per_roi_us(model.decision_function, X_test, batch, repeats)
+        report["latency"].append({"batch": batch, "raw_us_per_roi": raw_us, "mapped_us_per_roi": map_us,
+                                  "added_us_per_roi": map_us - raw_us})
+
+    logger.info(f"Feature map {report['feature_map']} ({report['n_features_raw']} -> "
+                f"{report['n_features_mapped']} features): accuracy {acc_raw:.4f} -> {acc_map:.4f} "
+                f"({report['accuracy_gain']:+.4f})")
+    for row in report["latency"]:
+        logger.info(f"  batch {row['batch']:>3}: {row['raw_us_per_roi']:.1f} -> {row['mapped_us_per_roi']:.1f} us/ROI "
+                    f"({row['added_us_per_roi']:+.1f} us)")
+
+    if report_path:
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Feature map report saved to {report_path}")
+    return report
@@ -8,12 +8,34 @@ LBP_RADIUS = 3
 LBP_N_POINTS = 8 * LBP_RADIUS
 LBP_METHOD = 'uniform'
 
-def extract_lbp_features(image):
+def lbp_n_bins(n_points, method=LBP_METHOD):
+    """Jumlah bin histogram untuk kombinasi n_points/method LBP."""
+    if method == 'uniform':
+        return n_points + 2
+    if method == 'nri_uniform':
+        return n_points * (n_points - 1) + 3
+    return 2 ** n_points
+
+def get_lbp_params(model):
     """
-    Ekstrak fitur LBP dari satu gambar (ROI).
+    Parameter LBP yang dipakai saat model dilatih (disimpan sebagai atribut
+    'lbp_params_'). Model lama tanpa atribut ini memakai nilai default.
+    """
+    return dict(getattr(model, "lbp_params_", {}))
+
+def extract_lbp_counts(image, image_size=LBP_IMAGE_SIZE, radius=LBP_RADIUS,
+                       n_points=None, method=LBP_METHOD):
+    """
+    Histogram LBP mentah (jumlah piksel per bin, uint16) dari satu ROI.
+    Untuk window tetap jumlahnya selalu lebar*tinggi, sehingga normalisasi
+    bisa dilipat ke bobot model (lihat pipelines/quantized.py).
     """
+    if n_points is None:
+        n_points = 8 * radius
+    image_size = tuple(image_size)
+
     # Resize
-    image_resized = cv2.resize(image, LBP_IMAGE_SIZE, interpolation=cv2.INTER_AREA)
+    image_resized = cv2.resize(image, image_size, interpolation=cv2.INTER_AREA)
     
     # Convert to grayscale
     if len(image_resized.shape) == 3:
@@ -25,15 +47,25 @@ def extract_lbp_features(image):
     image_gray = cv2.equalizeHist(image_gray)
     
     # Extract LBP
-    lbp = local_binary_pattern(image_gray, LBP_N_POINTS, 
-                               LBP_RADIUS, method=LBP_METHOD)
+    lbp = local_binary_pattern(image_gray, n_points, 
+                               radius, method=method)
     
     # Calculate histogram
-    n_bins = LBP_N_POINTS + 2
+    n_bins = lbp_n_bins(n_points, method)
     hist, _ = np.histogram(lbp.ravel(), bins=n_bins, range=(0, n_bins))
+    # uint16 cukup sampai window 256x256
+    return hist.astype(np.uint16 if lbp.size <= np.iinfo(np.uint16).max else np.uint32)
+
+def extract_lbp_features(image, image_size=LBP_IMAGE_SIZE, radius=LBP_RADIUS,
+                         n_points=None, method=LBP_METHOD):
+    """
+    Ekstrak fitur LBP dari satu gambar (ROI).
+    Jika 'n_points' tidak diberikan, dipakai 8 * radius.
+    """
+    hist = extract_lbp_counts(image, image_size, radius, n_points, method)
     
     # Normalize histogram
     hist = hist.astype("float")
     hist /= (hist.sum() + 1e-7)
     
-    return hist
\ No newline at end of file
+    return hist
@@ -0,0 +1,114 @@
+import json
+import logging
+import time
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class LatencyGovernor:
+    """
+    Mengatur biaya deteksi agar latensi per frame mendekati target FPS.
+
+    Governor memiliki beberapa 'level': level 0 = kualitas tertinggi
+    (resolusi deteksi terbesar, scaleFactor terkecil, minSize terkecil, mata
+    dideteksi paling sering), level terakhir = paling murah. Setiap batas
+    (bounds) berupa tuple (kualitas_terbaik, termurah) dan diinterpolasi
+    linear di antara level.
+
+    Setiap keputusan dicatat ke logger dan (opsional) ke file JSON Lines
+    'audit_path' agar bisa diaudit.
+    """
+
+    def __init__(self, target_fps, det_height=(720, 240), scale_factor=(1.1, 1.3),
+                 min_face=(50, 90), eye_every=(3, 15), levels=8, window=15,
+                 tolerance=0.1, headroom=0.3, cooldown=15, audit_path=None):
+        if target_fps <= 0:
+            raise ValueError("target_fps must be positive")
+        self.target_ms = 1000.0 / target_fps
+        self.bounds = {
+            "det_height": det_height,
+            "scale_factor": scale_factor,
+            "min_face": min_face,
+            "eye_every": eye_every,
+        }
+        self.levels = max(2, int(levels))
+        self.tolerance = tolerance
+        self.headroom = headroom
+        self.cooldown = cooldown
+        self.latencies = deque(maxlen=window)
+        self.level = 0
+        self.frames = 0
+        self.frames_since_change = 0
+
+        self.audit_path = Path(audit_path) if audit_path else None
+        if self.audit_path:
+            self.audit_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.params = self._params_for_level(self.level)
+        logger.info(f"Latency governor: target {self.target_ms:.1f} ms/frame, start params {self.params}")
+
+    def _params_for_level(self, level):
+        t = level / (self.levels - 1)
+
+        def lerp(key):
+            best, cheapest = self.bounds[key]
+            return best + (cheapest - best) * t
+
+        min_face = int(round(lerp("min_face")))
+        return {
+            "det_height": int(round(lerp("det_height"))),
+            "scale_factor": round(float(lerp("scale_factor")), 3),
+            "min_face": (min_face, min_face),
+            "eye_every": max(1, int(round(lerp("eye_every")))),
+        }
+
+    def observe(self, latency_ms):
+        """Catat latensi satu frame dan sesuaikan level jika perlu."""
+        self.frames += 1
+        self.frames_since_change += 1
+        self.latencies.append(latency_ms)
+
+        if self.frames_since_change < self.cooldown or len(self.latencies) < self.latencies.maxlen:
+            return self.params
+
+        avg_ms = float(np.mean(self.latencies))
+        new_level = self.level
+        if avg_ms > self.target_ms * (1.0 + self.tolerance):
+            # Terlalu lambat: lompat lebih jauh jika jauh di atas target
+            step = 2 if avg_ms > 2.0 * self.target_ms else 1
+            new_level = min(self.level + step, self.levels - 1)
+        elif avg_ms < self.target_ms * (1.0 - self.headroom):
+            # Banyak sisa waktu: naikkan kualitas satu level
+            new_level = max(self.level - 1, 0)
+
+        if new_level != self.level:
+            self._apply(new_level, avg_ms)
+        return self.params
+
+    def _apply(self, new_level, avg_ms):
+        old_level = self.level
+        self.level = new_level
+        self.params = self._params_for_level(new_level)
+        self.frames_since_change = 0
+        self.latencies.clear()
+
+        action = "degrade" if new_level > old_level else "upgrade"
+        logger.info(f"Governor {action}: level {old_level}->{new_level} "
+                    f"(avg {avg_ms:.1f} ms, target {self.target_ms:.1f} ms) -> {self.params}")
+
+        if self.audit_path:
+            record = {
+                "time": time.time(),
+                "frame": self.frames,
+                "action": action,
+                "avg_ms": round(avg_ms, 3),
+                "target_ms": round(self.target_ms, 3),
+                "old_level": old_level,
+                "new_level": new_level,
+                "params": self.params,
+            }
+            with open(self.audit_path, "a") as f:
+                f.write(json.dumps(record) + "\n")
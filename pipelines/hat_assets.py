@@ -0,0 +1,183 @@
+import json
+import logging
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .overlay import overlay_hat, DEFAULT_HAT_SETTINGS, MAX_HAT_ANGLE
+from .utils import load_hat_image, load_hat_data, MIP_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+def alpha_bbox(hat_img, alpha_threshold=0):
+    """Kotak (x1, y1, x2, y2) piksel dengan alpha > threshold, atau None jika kosong."""
+    ys, xs = np.nonzero(hat_img[..., 3] > alpha_threshold)
+    if len(xs) == 0:
+        return None
+    return int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1
+
+def rotation_safe_bbox(bbox, orig_size, max_angle=MAX_HAT_ANGLE, step=1.0):
+    """
+    Perluas kotak alpha agar tetap memuat sprite yang diputar hingga
+    ±max_angle di sekitar tengah sprite asli (poros rotasi draw_hat), dan
+    buat simetris terhadap tengah itu agar porosnya tidak bergeser.
+    Dibatasi ke kanvas asli, yang juga memotong hasil warpAffine sprite asli.
+    """
+    orig_w, orig_h = orig_size
+    cx, cy = orig_w / 2.0, orig_h / 2.0
+    x1, y1, x2, y2 = bbox
+    corners = np.array([[x1, y1], [x2, y1], [x1, y2], [x2, y2]], dtype=np.float64) - (cx, cy)
+    angles = np.radians(np.append(np.arange(-max_angle, max_angle, step), max_angle))[:, None]
+    xs = corners[:, 0] * np.cos(angles) + corners[:, 1] * np.sin(angles)
+    ys = corners[:, 1] * np.cos(angles) - corners[:, 0] * np.sin(angles)
+    pad_x1 = max(0, int(np.floor(cx - np.abs(xs).max())))
+    pad_y1 = max(0, int(np.floor(cy - np.abs(ys).max())))
+    return pad_x1, pad_y1, orig_w - pad_x1, orig_h - pad_y1
+
+def rewrite_settings(settings, orig_size, bbox):
+    """
+    Sesuaikan scale/offset .json agar sprite yang dipangkas jatuh di piksel
+    yang sama dengan sprite asli (lihat compute_hat_placement):
+      scale' = scale * W' / W
+      x_off' = (x_off * W - W / 2 + x1 + W' / 2) / W'
+      y_off' = (y_off * H - y1) / H'
+    Kotak dari rotation_safe_bbox simetris terhadap tengah sprite asli,
+    sehingga poros rotasi juga tetap sama.
+    """
+    orig_w, orig_h = orig_size
+    x1, y1, x2, y2 = bbox
+    trim_w, trim_h = x2 - x1, y2 - y1
+    scale = settings.get("scale_factor", DEFAULT_HAT_SETTINGS["scale_factor"])
+    y_off = settings.get("y_offset_factor", DEFAULT_HAT_SETTINGS["y_offset_factor"])
+    x_off = settings.get("x_offset_factor", DEFAULT_HAT_SETTINGS["x_offset_factor"])
+
+    # Dibulatkan agar int(w * scale) di runtime tidak jatuh ke 423.999... -> 423
+    new_settings = dict(settings)
+    new_settings["scale_factor"] = round(scale * trim_w / orig_w, 6)
+    new_settings["x_offset_factor"] = round((x_off * orig_w - orig_w / 2 + x1 + trim_w / 2) / trim_w, 6)
+    new_settings["y_offset_factor"] = round((y_off * orig_h - y1) / trim_h, 6)
+    new_settings["compiled"] = {"source_size": [orig_w, orig_h], "trim_box": [x1, y1, x2, y2]}
+    return new_settings
+
+def premultiply(hat_img):
+    """BGRA straight alpha -> BGRA premultiplied (uint8)."""
+    alpha = hat_img[..., 3:4].astype(np.float32) / 255.0
+    out = hat_img.copy()
+    out[..., :3] = np.round(hat_img[..., :3].astype(np.float32) * alpha).astype(np.uint8)
+    return out
+
+def build_mip_pyramid(premultiplied, min_width=16):
+    """Level 0 = ukuran penuh; tiap level berikutnya setengahnya (INTER_AREA)."""
+    levels = [premultiplied]
+    while levels[-1].shape[1] // 2 >= min_width and levels[-1].shape[0] // 2 >= 1:
+        prev = levels[-1]
+        levels.append(cv2.resize(prev, (prev.shape[1] // 2, prev.shape[0] // 2), interpolation=cv2.INTER_AREA))
+    return levels
+
+def compile_hat(hat_path: Path, out_dir: Path, alpha_threshold=0, min_width=16):
+    """
+    Kompilasi satu topi ke 'out_dir':
+      <nama>.png      : sprite dipangkas ke kotak alpha yang diperluas untuk
+                        rotasi ±MAX_HAT_ANGLE (straight alpha)
+      <nama>.json     : pengaturan dengan offset/scale yang disesuaikan
+      <nama>.mips.npz : piramida mip premultiplied (level_0 .. level_n)
+    """
+    hat_img = load_hat_image(hat_path)
+    if hat_img is None:
+        return None
+    meta_path = hat_path.with_suffix('.json')
+    settings = json.loads(meta_path.read_text()) if meta_path.exists() else dict(DEFAULT_HAT_SETTINGS)
+    if "compiled" in settings:
+        logger.warning(f"{hat_path} is already compiled, skipping")
+        return None
+
+    orig_h, orig_w = hat_img.shape[:2]
+    bbox = alpha_bbox(hat_img, alpha_threshold) or (0, 0, orig_w, orig_h)
+    bbox = rotation_safe_bbox(bbox, (orig_w, orig_h))
+    x1, y1, x2, y2 = bbox
+    trimmed = np.ascontiguousarray(hat_img[y1:y2, x1:x2])
+    levels = build_mip_pyramid(premultiply(trimmed), min_width)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_png = out_dir / f"{hat_path.stem}.png"
+    cv2.imwrite(str(out_png), trimmed)
+    with open(out_png.with_suffix('.json'), "w") as f:
+        json.dump(rewrite_settings(settings, (orig_w, orig_h), bbox), f, indent=2)
+    np.savez(out_dir / f"{hat_path.stem}{MIP_SUFFIX}", **{f"level_{i}": lvl for i, lvl in enumerate(levels)})
+
+    kept = (x2 - x1) * (y2 - y1) / float(orig_w * orig_h)
+    logger.info(f"  {hat_path.name}: {orig_w}x{orig_h} -> {x2 - x1}x{y2 - y1} ({kept:.0%} of pixels), "
+                f"{len(levels)} mip levels")
+    return out_png
+
+def time_overlay(hat_data, face_w=160, frame_size=(640, 480), repeats=200):
+    """Rata-rata ms overlay_hat untuk satu wajah selebar 'face_w' (tanpa rotasi dan dengan rotasi)."""
+    frame = np.full((frame_size[1], frame_size[0], 3), 127, dtype=np.uint8)
+    box = (frame_size[0] // 2 - face_w // 2, frame_size[1] // 2, face_w, face_w)
+    result = {}
+    for angle in (0.0, 10.0):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            overlay_hat(frame.copy(), box, hat_data, angle=angle)
+        result[f"angle_{angle:g}"] = (time.perf_counter() - start) * 1000.0 / repeats
+    return result
+
+def overlay_coverage(hat_data, face_w=200, angle=0.0, frame_size=(640, 640), background=(255, 0, 255)):
+    """Mask piksel yang tertutup topi setelah overlay_hat di atas latar polos."""
+    frame = np.full((frame_size[1], frame_size[0], 3), background, dtype=np.uint8)
+    box = (frame_size[0] // 2 - face_w // 2, frame_size[1] // 2, face_w, face_w)
+    overlay_hat(frame, box, hat_data, angle=angle)
+    return np.any(frame != background, axis=2).astype(np.uint8)
+
+def check_compiled_overlay(source, compiled, face_w=200, angles=(-MAX_HAT_ANGLE, 0.0, MAX_HAT_ANGLE),
+                           max_mismatch=0.01):
+    """
+    Bandingkan cakupan overlay topi asli dan hasil kompilasi pada beberapa
+    sudut. Piksel dihitung berbeda jika tertutup di satu versi tetapi tidak
+    ada piksel tertutup dalam jarak 1 px di versi lain (pergeseran sub-piksel
+    akibat pembulatan posisi diabaikan, brim yang terpotong tidak). Lolos
+    jika piksel berbeda <= max_mismatch dari cakupan topi asli di setiap sudut.
+    """
+    kernel = np.ones((3, 3), dtype=np.uint8)
+    result = {"passed": True, "angles": {}}
+    for angle in angles:
+        mask_src = overlay_coverage(source, face_w, angle)
+        mask_cmp = overlay_coverage(compiled, face_w, angle)
+        lost = int((mask_src & (1 - cv2.dilate(mask_cmp, kernel))).sum())
+        extra = int((mask_cmp & (1 - cv2.dilate(mask_src, kernel))).sum())
+        covered = int(mask_src.sum())
+        ratio = (lost + extra) / float(max(covered, 1))
+        result["angles"][f"{angle:g}"] = {"source_px": covered, "compiled_px": int(mask_cmp.sum()),
+                                          "lost_px": lost, "extra_px": extra, "mismatch_ratio": ratio}
+        result["passed"] &= ratio <= max_mismatch
+    return result
+
+def compile_hats_dir(src_dir: Path, out_dir: Path, alpha_threshold=0, min_width=16, face_widths=(80, 160, 320)):
+    """
+    Kompilasi semua topi di 'src_dir', cek bahwa overlay hasil kompilasi sama
+    dengan aslinya (termasuk saat diputar), lalu bandingkan waktu overlay.
+    """
+    hat_paths = sorted(p for ext in ("*.png", "*.jpg", "*.jpeg") for p in src_dir.glob(ext))
+    logger.info(f"Compiling {len(hat_paths)} hats from {src_dir} to {out_dir}...")
+    report = {}
+    for hat_path in hat_paths:
+        out_png = compile_hat(hat_path, out_dir, alpha_threshold, min_width)
+        if out_png is None:
+            continue
+        before, after = load_hat_data(hat_path), load_hat_data(out_png)
+        check = check_compiled_overlay(before, after)
+        coverage = ", ".join(f"{a}deg {c['source_px']}->{c['compiled_px']}px ({c['mismatch_ratio']:.1%} differ)"
+                             for a, c in check["angles"].items())
+        if check["passed"]:
+            logger.info(f"    overlay match: {coverage}")
+        else:
+            logger.warning(f"    overlay MISMATCH: {coverage}")
+        timings = {w: (time_overlay(before, w), time_overlay(after, w)) for w in face_widths}
+        report[hat_path.name] = {str(w): {"source_ms": b, "compiled_ms": a} for w, (b, a) in timings.items()}
+        report[hat_path.name]["overlay_check"] = check
+        for w, (b, a) in timings.items():
+            logger.info(f"    face {w:>3}px: overlay {b['angle_0']:.3f} -> {a['angle_0']:.3f} ms, "
+                        f"rotated {b['angle_10']:.3f} -> {a['angle_10']:.3f} ms")
+    return report
@@ -1,17 +1,27 @@
 import logging
+import time
 import cv2
 import joblib
 import numpy as np
 from pathlib import Path
 
-from .features import extract_lbp_features 
-from .overlay import overlay_hat
-from .utils import resize_to_fixed, setup_logging, load_hat_data # <-- Impor helper baru
+from .features import extract_lbp_features, extract_lbp_counts, get_lbp_params, LBP_IMAGE_SIZE
+from .overlay import overlay_hat, angle_from_eye_coords
+from .eyes import EyeAngleEstimator, detect_eye_coords
+from .governor import LatencyGovernor
+from .quantized import QuantizedLinearVerifier
+from .rejection import RejectionChain
+from .buffers import FrameBufferPool
+from .tiling import TiledCascadeDetector
+from .sources import CameraSource
+from .utils import resize_to_fixed, setup_logging, load_hat_data, StageTimer # <-- Impor helper baru
 
 logger = logging.getLogger(__name__)
 
 class InferencePipelineLBP:
-    def __init__(self, model_dir: Path, model_name: str):
+    def __init__(self, model_dir: Path, model_name: str, eye_mode: str = "tracked", eye_every: int = 5,
+                 governor: LatencyGovernor = None, use_rejection_chain: bool = True,
+                 quantized: bool = False, tile_workers: int = 0, max_face: int = 400):
         logger.info(f"Loading LBP inference pipeline...")
         
         # 1. Muat Model LBP+SVM/RF Anda
@@ -21,6 +31,32 @@ class InferencePipelineLBP:
             raise FileNotFoundError(f"Model file not found at {model_path}")
         self.model = joblib.load(model_path)
         logger.info(f"Loaded model: {model_path}")
+        # Parameter LBP yang dipakai saat training (default jika model lama)
+        self.lbp_params = get_lbp_params(self.model)
+        if self.lbp_params:
+            logger.info(f"Model LBP params: {self.lbp_params}")
+
+        # Verifier integer opsional: counts uint16 + bobot int16 (lihat quantized.py)
+        self.quantized = None
+        if quantized:
+            image_size = self.lbp_params.get("image_size", LBP_IMAGE_SIZE)
+            try:
+                self.quantized = QuantizedLinearVerifier.from_model(self.model, image_size)
+                logger.info(f"Using quantized integer verifier (scale {self.quantized.scale:.1f})")
+            except ValueError as e:
+                logger.warning(f"{e}; using the float verifier")
+
+        # Rantai penolakan murah sebelum verifikasi (opsional, hasil kalibrasi training)
+        self.rejection_chain = None
+        chain_path = model_dir / "rejection_chain.pkl"
+        if use_rejection_chain and chain_path.exists():
+            chain = RejectionChain.load(chain_path)
+            # Threshold hanya valid untuk model yang dipakai saat kalibrasi
+            if chain.matches_model(model_path):
+                self.rejection_chain = chain
+                logger.info(f"Loaded rejection chain: {chain_path}")
+            else:
+                logger.warning(f"Ignoring {chain_path}: it was not calibrated for {model_path.name}")
 
         # 2. Muat Haar Cascade (untuk Proposal)
         cascade_dir = Path("assets/cascades/")
@@ -36,58 +72,200 @@ class InferencePipelineLBP:
         if self.eye_cascade.empty():
             logger.warning(f"Could not load eye cascade from {eye_cascade_path}. Hat rotation disabled.")
             self.eye_cascade = None
+
+        # Deteksi ber-tile paralel untuk input resolusi tinggi (opsional)
+        self.tiler = None
+        if tile_workers:
+            self.tiler = TiledCascadeDetector(face_cascade_path, tile_workers, max_face)
+            logger.info(f"Tiled detection: {tile_workers} workers, faces up to {max_face}px")
             
         # 3. Logika pemuatan topi DIHAPUS dari __init__
 
-    def process_frame(self, frame, hat_data, show_hat=True, show_box=True):
+        # 4. Estimasi sudut mata: 'full' = eye cascade di seluruh ROI setiap frame,
+        #    'tracked' = pita atas wajah, tiap K frame, dengan smoothing + fallback simetri
+        if eye_mode not in ("full", "tracked"):
+            raise ValueError(f"Unknown eye_mode: {eye_mode}")
+        self.eye_mode = eye_mode
+        self.eye_estimator = None
+        if self.eye_cascade is not None and eye_mode == "tracked":
+            self.eye_estimator = EyeAngleEstimator(self.eye_cascade, detect_every=eye_every)
+        logger.info(f"Eye angle mode: {eye_mode}" + (f" (every {eye_every} frames)" if eye_mode == "tracked" else ""))
+
+        # Waktu per tahap (ms) untuk pelaporan
+        self.timer = StageTimer()
+        self.rois_verified = 0
+        self.last_candidates = []
+        # Buffer per-frame (gray, scratch overlay) yang dipakai ulang antar frame
+        self.buffers = FrameBufferPool()
+
+        # 5. Parameter deteksi (bisa diubah oleh LatencyGovernor).
+        #    det_height=None berarti deteksi pada resolusi penuh.
+        self.detect_params = {
+            "det_height": None,
+            "scale_factor": 1.1,
+            "min_neighbors": 5,
+            "min_face": (50, 50),
+        }
+        self.governor = governor
+        if governor is not None:
+            self.apply_detect_params(governor.params)
+
+    def apply_detect_params(self, params):
+        """Terapkan parameter deteksi baru (dari governor)."""
+        self.detect_params.update({k: v for k, v in params.items() if k in self.detect_params})
+        if self.eye_estimator is not None and "eye_every" in params:
+            self.eye_estimator.detect_every = params["eye_every"]
+
+    def detect_faces(self, gray):
         """
-        Pipeline deteksi: Terima 'hat_data' sebagai argumen.
+        Proposal ROI dengan Haar Cascade. Jika 'det_height' lebih kecil dari
+        tinggi frame, deteksi dijalankan pada gambar yang diperkecil lalu
+        kotaknya dipetakan kembali ke koordinat resolusi penuh.
+        """
+        params = self.detect_params
+        frame_h = gray.shape[0]
+        det_height = params["det_height"]
+        scale = 1.0
+        det_gray = gray
+        if det_height and det_height < frame_h:
+            scale = det_height / frame_h
+            det_gray = resize_to_fixed(gray, det_height)
+
+        min_w, min_h = params["min_face"]
+        # Ukuran minimum cascade frontal adalah 24x24
+        min_size = (max(24, int(min_w * scale)), max(24, int(min_h * scale)))
+        if self.tiler is not None:
+            max_face = max(int(self.tiler.max_face * scale), min_size[0] + 1)
+            rois = self.tiler.detect(det_gray, params["scale_factor"], params["min_neighbors"],
+                                     min_size, max_face=max_face)
+        else:
+            rois = self.face_cascade.detectMultiScale(
+                det_gray,
+                scaleFactor=params["scale_factor"],
+                minNeighbors=params["min_neighbors"],
+                minSize=min_size
+            )
+        if scale == 1.0 or len(rois) == 0:
+            return rois
+        boxes = np.round(np.asarray(rois, dtype=np.float32) / scale).astype(int)
+        # Pembulatan bisa membuat kotak sedikit keluar dari frame
+        frame_w = gray.shape[1]
+        boxes[:, 0] = np.clip(boxes[:, 0], 0, frame_w - 1)
+        boxes[:, 1] = np.clip(boxes[:, 1], 0, frame_h - 1)
+        boxes[:, 2] = np.minimum(boxes[:, 2], frame_w - boxes[:, 0])
+        boxes[:, 3] = np.minimum(boxes[:, 3], frame_h - boxes[:, 1])
+        return boxes
+
+    def estimate_eye_angles(self, gray, boxes):
+        """Hitung sudut topi untuk setiap kotak wajah terverifikasi."""
+        if self.eye_cascade is None:
+            return [0.0] * len(boxes)
+        if self.eye_estimator is not None:
+            return self.eye_estimator.update(gray, boxes)
+        # Mode 'full' (perilaku lama): deteksi mata di seluruh ROI setiap frame
+        return [float(angle_from_eye_coords(detect_eye_coords(self.eye_cascade, gray, box)))
+                for box in boxes]
+
+    def verify_rois(self, frame, gray, rois):
+        """
+        Verifikasi LBP+SVM untuk semua ROI sekaligus (satu panggilan ke model).
+        ROI terlebih dulu disaring oleh rantai penolakan jika tersedia.
+        """
+        boxes, scores = self.score_rois(frame, gray, rois)
+        # Simpan semua kandidat beserta skornya (dipakai benchmark deteksi)
+        self.last_candidates = list(zip(boxes, scores))
+        return [box for box, score in self.last_candidates if score > 0]
+
+    def score_rois(self, frame, gray, rois):
+        """
+        Skor verifier untuk setiap ROI yang lolos rantai penolakan.
+        Skor > 0 berarti wajah (setara dengan model.predict == 1).
+        """
+        if self.rejection_chain is not None:
+            rois = self.rejection_chain.filter(frame, gray, rois, buffers=self.buffers)
+        if len(rois) == 0:
+            return [], np.empty(0)
+
+        boxes = [tuple(int(v) for v in box) for box in rois]
+        self.rois_verified += len(rois)
+        if self.quantized is not None:
+            counts = np.array([extract_lbp_counts(gray[y:y+h, x:x+w], **self.lbp_params)
+                               for (x, y, w, h) in rois])
+            return boxes, self.quantized.decision_function(counts)
+
+        features = np.array([extract_lbp_features(gray[y:y+h, x:x+w], **self.lbp_params)
+                             for (x, y, w, h) in rois])
+        return boxes, self._decision_scores(features)
+
+    def _decision_scores(self, features):
+        if hasattr(self.model, "decision_function"):
+            return np.asarray(self.model.decision_function(features), dtype=float)
+        if hasattr(self.model, "predict_proba"):
+            return self.model.predict_proba(features)[:, 1] - 0.5
+        # Model tanpa skor kontinu: 1 -> 0.5, 0 -> -0.5
+        return self.model.predict(features).astype(float) - 0.5
+
+    def detect(self, frame, need_angles=True):
+        """
+        Tahap 1-3 (proposal, verifikasi, sudut mata) satu kali per frame.
+        Hasilnya bisa dipakai ulang untuk beberapa render (misal topi berbeda
+        per klien). Mengembalikan dict {'boxes', 'angles', 'started'}.
         """
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        frame_out = frame.copy()
+        frame_start = time.perf_counter()
+        self.timer.new_frame()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.buffers.get("gray", frame.shape[:2]))
 
         # TAHAP 1: Proposal
-        rois = self.face_cascade.detectMultiScale(
-            gray, 
-            scaleFactor=1.1, 
-            minNeighbors=5,
-            minSize=(50, 50)
-        )
+        with self.timer.measure("detect"):
+            rois = self.detect_faces(gray)
         
-        verified_boxes = []
-
         # TAHAP 2: Verifikasi
-        for (x, y, w, h) in rois:
-            roi_gray = gray[y:y+h, x:x+w]
-            features = extract_lbp_features(roi_gray)
-            prediction = self.model.predict([features])[0]
-            
-            if prediction == 1:
-                verified_boxes.append((x, y, w, h))
-        
-        # TAHAP 3: Overlay
-        for (x, y, w, h) in verified_boxes:
-            if show_box:
-                cv2.rectangle(frame_out, (x, y), (x+w, y+h), (0, 255, 0), 2)
-            
-            eye_coords = []
-            if show_hat and hat_data is not None: # Gunakan hat_data dari argumen
-                if self.eye_cascade:
-                    face_roi_gray = gray[y:y+h, x:x+w]
-                    eyes = self.eye_cascade.detectMultiScale(
-                        face_roi_gray, 
-                        scaleFactor=1.1, 
-                        minNeighbors=4, 
-                        minSize=(int(w*0.15), int(h*0.15))
-                    )
-                    
-                    if len(eyes) >= 2:
-                        sorted_eyes = sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2]
-                        eye_coords = [((ex + ew // 2) + x, (ey + eh // 2) + y) for (ex, ey, ew, eh) in sorted_eyes]
+        with self.timer.measure("verify"):
+            verified_boxes = self.verify_rois(frame, gray, rois)
+
+        # TAHAP 3: Sudut topi dari mata (hanya jika ada topi yang ditampilkan)
+        angles = [0.0] * len(verified_boxes)
+        if need_angles:
+            with self.timer.measure("eyes"):
+                angles = self.estimate_eye_angles(gray, verified_boxes)
+
+        return {"boxes": verified_boxes, "angles": [float(a) for a in angles], "started": frame_start}
+
+    def render(self, frame, detections, hat_data, show_hat=True, show_box=True, out=None):
+        """
+        Tahap 4: gambar kotak dan/atau topi pada salinan frame. Salinan
+        ditulis ke 'out' jika diberikan (buffer milik pemanggil, dipakai ulang).
+        """
+        if out is None:
+            frame_out = frame.copy()
+        else:
+            frame_out = out
+            np.copyto(frame_out, frame)
+        with self.timer.measure("overlay"):
+            for (x, y, w, h), angle in zip(detections["boxes"], detections["angles"]):
+                if show_box:
+                    cv2.rectangle(frame_out, (x, y), (x+w, y+h), (0, 255, 0), 2)
                 
-                # Pass hat_data ke overlay_hat
-                frame_out = overlay_hat(frame_out, (x, y, w, h), hat_data, eye_coords)
+                if show_hat and hat_data is not None:
+                    # Pass hat_data ke overlay_hat
+                    frame_out = overlay_hat(frame_out, (x, y, w, h), hat_data, angle=angle,
+                                            buffers=self.buffers)
+        return frame_out
+
+    def finish_frame(self, detections):
+        """Laporkan latensi frame (deteksi + semua render) ke governor."""
+        if self.governor is not None:
+            latency_ms = (time.perf_counter() - detections["started"]) * 1000.0
+            self.apply_detect_params(self.governor.observe(latency_ms))
 
+    def process_frame(self, frame, hat_data, show_hat=True, show_box=True, out=None):
+        """
+        Pipeline deteksi: Terima 'hat_data' sebagai argumen.
+        'out' (opsional) adalah buffer hasil yang dipakai ulang antar frame.
+        """
+        detections = self.detect(frame, need_angles=show_hat and hat_data is not None)
+        frame_out = self.render(frame, detections, hat_data, show_hat, show_box, out=out)
+        self.finish_frame(detections)
         return frame_out
 
     def process_image(self, image_path: Path, out_path: Path, hat_path: Path):
@@ -104,13 +282,15 @@ class InferencePipelineLBP:
         processed_frame = self.process_frame(frame, hat_data) # Pass ke process_frame
         cv2.imwrite(str(out_path), processed_frame)
 
-    def process_webcam(self, camera_id: int, hat_path: Path):
+    def process_webcam(self, source, hat_path: Path):
         """
         Modifikasi: Muat hat_data di sini untuk webcam lokal.
+        'source' adalah device id kamera atau FrameSource (video, folder
+        gambar, sesi rekaman).
         """
-        cap = cv2.VideoCapture(camera_id)
+        cap = CameraSource(source) if isinstance(source, int) else source
         if not cap.isOpened():
-            logger.error(f"Cannot open camera {camera_id}.")
+            logger.error(f"Cannot open frame source {source}.")
             return
             
         hat_data = load_hat_data(hat_path) # Muat hat_data
@@ -121,19 +301,26 @@ class InferencePipelineLBP:
         show_hat = True
         show_box = True
         
+        capture = None
         while True:
-            ret, frame = cap.read()
+            ret, frame = cap.read(capture)
             if not ret:
-                logger.warning("Failed to grab frame.")
+                logger.warning("Failed to grab frame (or end of source).")
                 break
+            capture = frame  # Frame berikutnya ditulis ke buffer yang sama
             
-            frame = cv2.flip(frame, 1) # Mirror mode
-            frame_resized = resize_to_fixed(frame, 720) # Resize agar cepat
+            frame = cv2.flip(frame, 1, dst=self.buffers.get("mirror", frame.shape)) # Mirror mode
+            if self.governor is None:
+                frame_resized = resize_to_fixed(frame, 720) # Resize agar cepat
+            else:
+                # Governor yang mengatur resolusi deteksi; render tetap resolusi penuh
+                frame_resized = frame
             
             fps_start = cv2.getTickCount()
 
             # Proses frame
-            processed_frame = self.process_frame(frame_resized, hat_data, show_hat, show_box)
+            processed_frame = self.process_frame(frame_resized, hat_data, show_hat, show_box,
+                                                 out=self.buffers.get("output", frame_resized.shape))
             
             fps = cv2.getTickFrequency() / (cv2.getTickCount() - fps_start)
             cv2.putText(processed_frame, f"FPS: {fps:.1f}", (10, 30), 
@@ -145,6 +332,12 @@ class InferencePipelineLBP:
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
             cv2.putText(processed_frame, f"Box (b): {box_status}", (10, 90), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            eye_ms = self.timer.last.get("eyes", 0.0)
+            cv2.putText(processed_frame, f"Eye ({self.eye_mode}): {eye_ms:.1f} ms", (10, 150), 
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+            if self.governor is not None:
+                cv2.putText(processed_frame, f"Governor level: {self.governor.level}", (10, 180), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
             
             # Tampilkan nama topi
             if hat_data:
@@ -163,3 +356,17 @@ class InferencePipelineLBP:
 
         cap.release()
         cv2.destroyAllWindows()
+        self.log_stage_times()
+
+    def log_stage_times(self):
+        """Laporkan rata-rata waktu per tahap (ms/frame) sejak timer di-reset."""
+        summary = self.timer.summary()
+        if not summary:
+            return
+        stages = ", ".join(f"{stage}={ms:.2f}ms" for stage, ms in summary.items())
+        logger.info(f"Stage times over {self.timer.frames} frames ({self.eye_mode} eyes): {stages}")
+        if self.rejection_chain is not None:
+            chain_ms = sum(self.rejection_chain.time_ms.values())
+            verify_ms = self.timer.totals.get("verify", 0.0) - chain_ms
+            per_roi = verify_ms / self.rois_verified if self.rois_verified else None
+            self.rejection_chain.report(per_roi)
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+def scan_images(directory):
+    """
+    Satu kali jalan rekursif dengan os.scandir. Menghasilkan tuple
+    (path, size, mtime) untuk setiap file gambar (ekstensi case-insensitive).
+    """
+    stack = [str(directory)]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                            st = entry.stat()
+                            yield entry.path, st.st_size, st.st_mtime
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"Cannot scan {current}: {e}")
+
+def scan_image_paths(directory):
+    """Daftar Path semua gambar di 'directory' (tanpa duplikat)."""
+    if not Path(directory).exists():
+        return []
+    return [Path(path) for path, _, _ in scan_images(directory)]
+
+def file_hash(path):
+    """Hash isi file (blake2b 128-bit, hex)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def split_from_hash(content_hash, test_size):
+    """Split deterministik dari hash isi: stabil antar run dan antar mesin."""
+    u = int(content_hash[:8], 16) / float(0xFFFFFFFF + 1)
+    return "test" if u < test_size else "train"
+
+
+class DatasetManifest:
+    """
+    Indeks dataset persisten: path -> {size, mtime, hash, label, split}
+    (ditambah 'phash' dan 'group' setelah deteksi near-duplicate).
+    Diperbarui secara inkremental: file dengan size & mtime yang sama tidak
+    di-hash ulang. Dipakai bersama oleh training, cleaning dan preprocessing.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.records = {}
+        self.test_size = None
+
+    @classmethod
+    def load(cls, path):
+        """Muat manifest dari file; buat manifest kosong jika belum ada."""
+        manifest = cls(path)
+        if manifest.path and manifest.path.exists():
+            data = joblib.load(manifest.path)
+            manifest.records = data.get("records", {})
+            manifest.test_size = data.get("test_size")
+            logger.info(f"Loaded manifest {manifest.path} ({len(manifest.records)} records)")
+        return manifest
+
+    def save(self):
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        joblib.dump({"records": self.records, "test_size": self.test_size}, tmp_path)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _key(path):
+        return os.path.abspath(str(path))
+
+    def update(self, directory, label=None, n_workers=8):
+        """
+        Sinkronkan manifest dengan isi 'directory'. File baru/berubah di-hash
+        (paralel), file yang hilang dihapus dari manifest.
+        """
+        start = time.perf_counter()
+        root = self._key(directory)
+        prefix = root.rstrip(os.sep) + os.sep
+        seen = set()
+        to_hash = []
+        unchanged = 0
+
+        for path, size, mtime in scan_images(root):
+            key = self._key(path)
+            seen.add(key)
+            record = self.records.get(key)
+            if record is not None and record["size"] == size and record["mtime"] == mtime:
+                unchanged += 1
+                if label is not None:
+                    record["label"] = label
+                continue
+            to_hash.append((key, size, mtime))
+
+        hashes = []
+        if to_hash:
+            with ThreadPoolExecutor(max_workers=n_workers) as pool:
+                hashes = list(pool.map(lambda item: file_hash(item[0]), to_hash))
+
+        for (key, size, mtime), content_hash in zip(to_hash, hashes):
+            record_label = label if label is not None else self.records.get(key, {}).get("label")
+            # Record baru: turunan isi lama (misal perceptual hash) tidak dipakai lagi
+            record = {"size": size, "mtime": mtime, "hash": content_hash, "label": record_label}
+            record["split"] = split_from_hash(content_hash, self.test_size) if self.test_size else None
+            self.records[key] = record
+
+        removed = [key for key in self.records if key.startswith(prefix) and key not in seen]
+        for key in removed:
+            del self.records[key]
+
+        logger.info(f"Manifest update {directory}: {len(to_hash)} new/changed, {unchanged} unchanged, "
+                    f"{len(removed)} removed ({time.perf_counter() - start:.2f}s)")
+        return {"changed": len(to_hash), "unchanged": unchanged, "removed": len(removed)}
+
+    def assign_splits(self, test_size):
+        """
+        Tetapkan split train/test dari hash isi untuk semua record. Record
+        yang punya 'group' (near-duplicate) memakai kunci grup, sehingga
+        satu grup selalu berada di sisi split yang sama.
+        """
+        self.test_size = test_size
+        for record in self.records.values():
+            record["split"] = split_from_hash(record.get("group") or record["hash"], test_size)
+
+    def remove(self, paths):
+        """Hapus record untuk path yang sudah dihapus/dipindah (tanpa rescan)."""
+        for path in paths:
+            self.records.pop(self._key(path), None)
+
+    def entries(self, directory=None, label=None, split=None):
+        """Iterasi (path, record) dengan filter opsional."""
+        prefix = None
+        if directory is not None:
+            prefix = self._key(directory).rstrip(os.sep) + os.sep
+        for key, record in self.records.items():
+            if prefix is not None and not key.startswith(prefix):
+                continue
+            if label is not None and record.get("label") != label:
+                continue
+            if split is not None and record.get("split") != split:
+                continue
+            yield key, record
+
+    def paths(self, directory=None, label=None, split=None):
+        return [Path(key) for key, _ in self.entries(directory, label, split)]
@@ -3,62 +3,90 @@ import cv2
 import numpy as np
 from pathlib import Path
 
+from .buffers import scratch
+
 logger = logging.getLogger(__name__)
 
-def overlay_hat(background_frame, face_box, hat_data, eye_coords=None):
+MAX_HAT_ANGLE = 25
+DEFAULT_HAT_SETTINGS = {"scale_factor": 1.4, "y_offset_factor": 0.8, "x_offset_factor": 0.0}
+
+def angle_from_eye_coords(eye_coords):
+    """Hitung sudut kemiringan (derajat) dari dua titik tengah mata."""
+    if not eye_coords or len(eye_coords) != 2:
+        return 0
+    eye_left = min(eye_coords, key=lambda e: e[0])
+    eye_right = max(eye_coords, key=lambda e: e[0])
+
+    dx = eye_right[0] - eye_left[0]
+    dy = eye_right[1] - eye_left[1]
+
+    angle = 0
+    if dx != 0:
+        angle = np.degrees(np.arctan2(dy, dx))
+    return np.clip(angle, -MAX_HAT_ANGLE, MAX_HAT_ANGLE)
+
+def compute_hat_placement(face_box, hat_size, settings, angle=0.0):
     """
-    Menempelkan gambar topi ke frame background di atas kotak wajah.
+    Posisi topi untuk satu wajah dari pengaturan .json topi
+    (scale_factor, y_offset_factor, x_offset_factor).
+    'hat_size' adalah (lebar, tinggi) sprite asli. Mengembalikan
+    (hat_x1, hat_y1, hat_w, hat_h, angle) atau None jika ukurannya nol.
     """
     (x, y, w, h) = face_box
-    
-    # Ambil gambar dan pengaturan dari hat_data
-    if w == 0 or h == 0 or hat_data is None:
-        return background_frame
-
-    hat_img = hat_data["image"]
-    settings = hat_data["settings"]
+    if w == 0 or h == 0:
+        return None
 
     # --- 1. Penskalaan (Scaling) ---
-    hat_scale_factor = settings.get("scale_factor", 1.4) # Ambil dari JSON
+    hat_scale_factor = settings.get("scale_factor", DEFAULT_HAT_SETTINGS["scale_factor"]) # Ambil dari JSON
     new_hat_w = int(w * hat_scale_factor)
-    orig_hat_h, orig_hat_w = hat_img.shape[:2]
+    orig_hat_w, orig_hat_h = hat_size
     new_hat_h = int(orig_hat_h * (new_hat_w / orig_hat_w))
     
     if new_hat_w == 0 or new_hat_h == 0:
-        return background_frame
-        
-    hat_resized = cv2.resize(hat_img, (new_hat_w, new_hat_h), interpolation=cv2.INTER_AREA)
+        return None
 
-    # --- 2. Rotasi (Opsional) ---
-    angle = 0
-    if eye_coords and len(eye_coords) == 2:
-        eye_left = min(eye_coords, key=lambda e: e[0])
-        eye_right = max(eye_coords, key=lambda e: e[0])
-        
-        dx = eye_right[0] - eye_left[0]
-        dy = eye_right[1] - eye_left[1]
-        
-        if dx != 0:
-            angle = np.degrees(np.arctan2(dy, dx))
-        angle = np.clip(angle, -25, 25)
+    y_offset_factor = settings.get("y_offset_factor", DEFAULT_HAT_SETTINGS["y_offset_factor"]) 
+    
+    x_offset_factor = settings.get("x_offset_factor", DEFAULT_HAT_SETTINGS["x_offset_factor"]) 
+    
+    hat_x1 = int(x + (w // 2) - (new_hat_w // 2) + (x_offset_factor * new_hat_w))
+    
+    hat_y1 = int(y - (y_offset_factor * new_hat_h))
+    angle = float(np.clip(angle, -MAX_HAT_ANGLE, MAX_HAT_ANGLE))
+    return (hat_x1, hat_y1, new_hat_w, new_hat_h, angle)
 
+def select_mip_level(mips, target_w):
+    """Level mip terkecil yang masih >= lebar target (tidak pernah upscale dari level kecil)."""
+    for level in reversed(mips):
+        if level.shape[1] >= target_w:
+            return level
+    return mips[0]
+
+def draw_hat(background_frame, hat_img, placement, premultiplied=False, buffers=None):
+    """
+    Resize, rotasi, lalu alpha-blend sprite BGRA sesuai 'placement'.
+    Dengan 'premultiplied=True' warna sprite sudah dikali alpha (aset hasil
+    kompilasi), sehingga blending cukup frame * (1 - alpha) + warna.
+    'buffers' (FrameBufferPool, opsional) menyediakan semua array sementara
+    sehingga tidak ada alokasi per frame; hasilnya identik.
+    """
+    hat_x1, hat_y1, new_hat_w, new_hat_h, angle = placement
+    hat_resized = cv2.resize(hat_img, (new_hat_w, new_hat_h),
+                             dst=scratch(buffers, "hat_resized", (new_hat_h, new_hat_w, 4)),
+                             interpolation=cv2.INTER_AREA)
+
+    # --- 2. Rotasi (Opsional) ---
     if angle != 0:
         center = (new_hat_w // 2, new_hat_h // 2)
         M = cv2.getRotationMatrix2D(center, angle, 1.0)
         hat_rotated = cv2.warpAffine(hat_resized, M, (new_hat_w, new_hat_h),
+                                         dst=scratch(buffers, "hat_rotated", (new_hat_h, new_hat_w, 4)),
                                          flags=cv2.INTER_LINEAR, 
                                          borderMode=cv2.BORDER_CONSTANT,
                                          borderValue=(0, 0, 0, 0))
     else:
         hat_rotated = hat_resized
 
-    y_offset_factor = settings.get("y_offset_factor", 0.8) 
-    
-    x_offset_factor = settings.get("x_offset_factor", 0.0) 
-    
-    hat_x1 = int(x + (w // 2) - (new_hat_w // 2) + (x_offset_factor * new_hat_w))
-    
-    hat_y1 = int(y - (y_offset_factor * new_hat_h))
     hat_x2 = hat_x1 + new_hat_w
     hat_y2 = hat_y1 + new_hat_h
     
@@ -82,13 +110,48 @@ def overlay_hat(background_frame, face_box, hat_data, eye_coords=None):
     hat_roi = hat_rotated[hat_y1_clip:hat_y2_clip, hat_x1_clip:hat_x2_clip]
 
     hat_rgb = hat_roi[..., :3]
-    alpha = hat_roi[..., 3] / 255.0
-    alpha = np.expand_dims(alpha, axis=2)
+    roi_h, roi_w = frame_roi.shape[:2]
+    # Sama dengan (1 - a) * frame + a * topi dalam float64, tapi di buffer tetap
+    alpha = scratch(buffers, "alpha", (roi_h, roi_w, 1), np.float64)
+    inv_alpha = scratch(buffers, "inv_alpha", (roi_h, roi_w, 1), np.float64)
+    blended_roi = scratch(buffers, "blend", (roi_h, roi_w, 3), np.float64)
+    hat_term = scratch(buffers, "blend_hat", (roi_h, roi_w, 3), np.float64)
 
     try:
-        blended_roi = (1.0 - alpha) * frame_roi.astype(np.float32) + alpha * hat_rgb.astype(np.float32)
-        background_frame[frame_y1:frame_y2, frame_x1:frame_x2] = blended_roi.astype(np.uint8)
+        np.divide(hat_roi[..., 3:4], 255.0, out=alpha)
+        np.subtract(1.0, alpha, out=inv_alpha)
+        np.multiply(frame_roi, inv_alpha, out=blended_roi)
+        if premultiplied:
+            np.copyto(hat_term, hat_rgb)
+        else:
+            np.multiply(hat_rgb, alpha, out=hat_term)
+        np.add(blended_roi, hat_term, out=blended_roi)
+        np.copyto(frame_roi, blended_roi, casting='unsafe')
     except ValueError as e:
         logger.warning(f"Error blending: {e}. Shapes: frame_roi={frame_roi.shape}, hat_roi={hat_roi.shape}, alpha={alpha.shape}")
     
-    return background_frame
\ No newline at end of file
+    return background_frame
+
+def overlay_hat(background_frame, face_box, hat_data, eye_coords=None, angle=None, buffers=None):
+    """
+    Menempelkan gambar topi ke frame background di atas kotak wajah.
+    Sudut rotasi bisa diberikan langsung lewat 'angle'; jika tidak,
+    dihitung dari 'eye_coords'. Frame diubah di tempat.
+    """
+    # Ambil gambar dan pengaturan dari hat_data
+    if hat_data is None:
+        return background_frame
+
+    hat_img = hat_data["image"]
+    if angle is None:
+        angle = angle_from_eye_coords(eye_coords)
+    placement = compute_hat_placement(face_box, (hat_img.shape[1], hat_img.shape[0]),
+                                      hat_data["settings"], angle)
+    if placement is None:
+        return background_frame
+    # Aset hasil kompilasi (pipelines/hat_assets.py): resize dari level mip terdekat
+    mips = hat_data.get("mips")
+    if mips:
+        return draw_hat(background_frame, select_mip_level(mips, placement[2]), placement,
+                        premultiplied=True, buffers=buffers)
+    return draw_hat(background_frame, hat_img, placement, buffers=buffers)
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _write_collapsed(path, stacks):
+    """Format 'collapsed stack' (flamegraph.pl / speedscope): 'a;b;c <bobot>' per baris."""
+    with open(path, "w") as f:
+        for stack, weight in stacks.most_common():
+            f.write(f"{';'.join(stack)} {weight}\n")
+
+def _report_paths(out_dir, prefix):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    return out_dir / f"{prefix}_{stamp}.collapsed", out_dir / f"{prefix}_{stamp}_top.json"
+
+
+class SamplingProfiler:
+    """
+    Profiler sampling ringan berbasis sys._current_frames(): setiap
+    'interval' detik stack thread yang diminta dicatat ('threads' = nama
+    thread; None = semua kecuali thread profiler sendiri). Tidak memasang
+    hook tracing, sehingga thread yang diprofil berjalan seperti biasa;
+    biayanya hanya satu thread yang bangun tiap interval dan memegang GIL
+    sebentar.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64, threads=None):
+        self.interval = interval
+        self.threads = set(threads) if threads else None
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+
+    def run(self, duration):
+        """Sampling selama 'duration' detik (blocking, jalankan di thread sendiri)."""
+        own_id = threading.get_ident()
+        names = {}
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                name = names.get(thread_id, f"thread-{thread_id}")
+                if thread_id == own_id or (self.threads is not None and name not in self.threads):
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(name)
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+        return self
+
+    def top_functions(self, limit=30):
+        """Fungsi teratas menurut sampel 'self' (ujung stack) dan 'total' (ada di stack)."""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+        n = sum(self.stacks.values()) or 1
+        return [{"function": label, "self": own[label], "total": count,
+                 "self_pct": 100.0 * own[label] / n, "total_pct": 100.0 * count / n}
+                for label, count in total.most_common(limit)], own.most_common(limit)
+
+    def write_report(self, out_dir, prefix="profile", duration=None):
+        collapsed_path, top_path = _report_paths(out_dir, prefix)
+        _write_collapsed(collapsed_path, self.stacks)
+        by_total, by_self = self.top_functions()
+        threads = Counter()
+        for stack, count in self.stacks.items():
+            threads[stack[0]] += count
+        with open(top_path, "w") as f:
+            json.dump({"duration_s": duration, "interval_s": self.interval, "ticks": self.samples,
+                       "threads": dict(threads), "top_total": by_total,
+                       "top_self": [{"function": label, "self": count} for label, count in by_self]},
+                      f, indent=2)
+        logger.info(f"Profile: {self.samples} ticks, stacks -> {collapsed_path}, summary -> {top_path}")
+        for row in by_total[:10]:
+            logger.info(f"  {row['total_pct']:5.1f}% total {row['self_pct']:5.1f}% self  {row['function']}")
+        return collapsed_path, top_path
+
+
+class AllocationProfiler:
+    """
+    Hot spot alokasi dengan tracemalloc selama satu jendela waktu. Snapshot
+    diambil di awal dan akhir; selisihnya (per baris dan per traceback)
+    menunjukkan siapa yang mengalokasikan memori yang masih hidup.
+    tracemalloc memperlambat alokasi, jadi hanya aktif selama jendela ini.
+    """
+
+    def __init__(self, nframe=16):
+        self.nframe = nframe
+        self.before = None
+        self.after = None
+
+    def run(self, duration):
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(self.nframe)
+        try:
+            self.before = tracemalloc.take_snapshot()
+            time.sleep(duration)
+            self.after = tracemalloc.take_snapshot()
+            self.peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        return self
+
+    def write_report(self, out_dir, prefix="tracemalloc", duration=None, limit=30):
+        collapsed_path, top_path = _report_paths(out_dir, prefix)
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        before = self.before.filter_traces(filters)
+        after = self.after.filter_traces(filters)
+
+        # Stack alokasi berbobot ukuran (byte) untuk flamegraph
+        stacks = Counter()
+        for stat in after.statistics("traceback"):
+            stack = tuple(f"{os.path.basename(fr.filename)}:{fr.lineno}" for fr in stat.traceback)
+            stacks[stack] += stat.size
+        _write_collapsed(collapsed_path, stacks)
+
+        growth = after.compare_to(before, "lineno")[:limit]
+        current = after.statistics("lineno")[:limit]
+        with open(top_path, "w") as f:
+            json.dump({
+                "duration_s": duration,
+                "traced_peak_bytes": self.peak,
+                "top_growth": [{"location": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                                "size_diff": s.size_diff, "count_diff": s.count_diff, "size": s.size}
+                               for s in growth],
+                "top_live": [{"location": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                              "size": s.size, "count": s.count} for s in current],
+            }, f, indent=2)
+        logger.info(f"Tracemalloc: peak {self.peak / 1e6:.1f} MB, stacks -> {collapsed_path}, summary -> {top_path}")
+        for s in growth[:10]:
+            frame = s.traceback[0]
+            logger.info(f"  {s.size_diff / 1024:+9.1f} KiB ({s.count_diff:+d} blocks)  "
+                        f"{os.path.basename(frame.filename)}:{frame.lineno}")
+        return collapsed_path, top_path
+
+
+def run_profile(kind, duration, out_dir, interval=0.005, threads=None):
+    """Jalankan profiler 'profile' (sampling CPU) atau 'tracemalloc' lalu tulis laporannya."""
+    if kind == "profile":
+        profiler = SamplingProfiler(interval, threads=threads)
+    elif kind == "tracemalloc":
+        profiler = AllocationProfiler()
+    else:
+        raise ValueError(f"Unknown profile kind: {kind}")
+    profiler.run(duration)
+    return profiler.write_report(out_dir, prefix=kind, duration=duration)
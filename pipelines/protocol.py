@@ -0,0 +1,78 @@
+import struct
+
+import numpy as np
+
+from .overlay import compute_hat_placement
+
+# Pesan metadata per frame (mode REGISTER_META), big-endian seperti header !III:
+#   header : magic 'HTMD', sequence (uint32), lebar & tinggi frame (uint16),
+#            jumlah wajah (uint16), id topi (uint8, NO_HAT = topi mati)
+#   wajah  : kotak x, y (int16), w, h (uint16), posisi topi x1, y1 (int16),
+#            ukuran topi w, h (uint16), sudut topi * 100 (int16)
+META_MAGIC = b"HTMD"
+META_HEADER = struct.Struct("!4sIHHHB")
+META_FACE = struct.Struct("!hhHHhhHHh")
+NO_HAT = 255
+
+def pack_detections(sequence_number, frame_shape, detections, hat_index=None, hat_data=None):
+    """
+    Bangun pesan metadata biner untuk satu frame. Jika topi aktif, posisi
+    topi dihitung di server dari .json topi (compute_hat_placement) sehingga
+    klien cukup me-resize/rotasi sprite dan menempelkannya.
+    """
+    frame_h, frame_w = frame_shape[:2]
+    boxes = detections["boxes"]
+    angles = detections["angles"]
+    hat_id = NO_HAT if hat_index is None or hat_data is None else int(hat_index)
+
+    parts = [META_HEADER.pack(META_MAGIC, sequence_number, frame_w, frame_h, len(boxes), hat_id)]
+    for (x, y, w, h), angle in zip(boxes, angles):
+        placement = None
+        if hat_id != NO_HAT:
+            hat_img = hat_data["image"]
+            placement = compute_hat_placement((x, y, w, h), (hat_img.shape[1], hat_img.shape[0]),
+                                              hat_data["settings"], angle)
+        hx, hy, hw, hh, hat_angle = placement if placement is not None else (0, 0, 0, 0, angle)
+        parts.append(META_FACE.pack(int(x), int(y), int(w), int(h), int(hx), int(hy), int(hw), int(hh),
+                                    int(round(float(np.clip(hat_angle, -327, 327)) * 100))))
+    return b"".join(parts)
+
+def unpack_detections(data):
+    """
+    Kebalikan pack_detections. Mengembalikan dict {'sequence', 'frame_size',
+    'hat_id', 'faces'} dengan setiap wajah berisi 'box', 'hat' (placement
+    atau None) dan 'angle'; atau None jika bukan pesan metadata.
+    """
+    if len(data) < META_HEADER.size or data[:4] != META_MAGIC:
+        return None
+    _, seq, frame_w, frame_h, n_faces, hat_id = META_HEADER.unpack_from(data)
+    faces = []
+    for i in range(n_faces):
+        x, y, w, h, hx, hy, hw, hh, angle = META_FACE.unpack_from(data, META_HEADER.size + i * META_FACE.size)
+        angle = angle / 100.0
+        hat = (hx, hy, hw, hh, angle) if hat_id != NO_HAT and hw > 0 and hh > 0 else None
+        faces.append({"box": (x, y, w, h), "hat": hat, "angle": angle})
+    return {"sequence": seq, "frame_size": (frame_w, frame_h), "hat_id": None if hat_id == NO_HAT else hat_id,
+            "faces": faces}
+
+# Ekstensi trace (mode REGISTER_TRACE): ditempel setelah header !III pada
+# setiap paket JPEG. Waktu capture memakai jam dinding (time.time_ns) agar
+# bisa dibandingkan dengan jam penerima (satu mesin, atau jam tersinkron
+# NTP/PTP); tahap server disimpan sebagai offset mikrodetik dari capture.
+#   magic 'HTTR', capture_ns (uint64), offset detect/render/encode/send (uint32 us)
+TRACE_MAGIC = b"HTTR"
+TRACE_STAGES = ("detect", "render", "encode", "send")
+TRACE_EXT = struct.Struct("!4sQ" + "I" * len(TRACE_STAGES))
+
+def pack_trace(capture_ns, stage_ns):
+    """Ekstensi trace dari waktu capture dan dict {tahap: time_ns selesai}."""
+    offsets = [max(0, min(0xFFFFFFFF, (stage_ns[stage] - capture_ns) // 1000)) for stage in TRACE_STAGES]
+    return TRACE_EXT.pack(TRACE_MAGIC, capture_ns, *offsets)
+
+def unpack_trace(data, offset=12):
+    """Kebalikan pack_trace: {'capture_ns', 'stages': {tahap: time_ns}}, atau None jika tidak ada trace."""
+    if len(data) < offset + TRACE_EXT.size or data[offset:offset + 4] != TRACE_MAGIC:
+        return None
+    _, capture_ns, *offsets = TRACE_EXT.unpack_from(data, offset)
+    return {"capture_ns": capture_ns,
+            "stages": {stage: capture_ns + us * 1000 for stage, us in zip(TRACE_STAGES, offsets)}}
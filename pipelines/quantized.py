@@ -0,0 +1,168 @@
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .features import LBP_IMAGE_SIZE
+from .feature_map import has_feature_map
+
+logger = logging.getLogger(__name__)
+
+class QuantizedLinearVerifier:
+    """
+    Verifier linear (LinearSVC) versi integer untuk histogram LBP mentah.
+
+    Fitur float adalah counts / (N + 1e-7) dengan N = jumlah piksel window
+    (tetap, misal 64*64), sehingga skor w.x + b sama dengan (w / N).counts + b.
+    Bobot terlipat w / N diskalakan ke int16 (|w_q| <= 32767) dan bias ke
+    int32 dengan skala yang sama. Karena jumlah counts per ROI selalu N,
+    akumulator int32 tidak bisa overflow: |skor| <= N * qmax + |b_q|. Untuk
+    window besar (di atas sekitar 181x181) qmax diturunkan dari 32767 agar
+    N * qmax tetap muat di setengah rentang int32 (sisanya untuk bias).
+    Semua ROI dinilai dengan satu perkalian matriks integer.
+    """
+
+    def __init__(self, weights_q, bias_q, scale, n_pixels):
+        self.weights_q = weights_q
+        self.bias_q = bias_q
+        self.scale = scale
+        self.n_pixels = n_pixels
+
+    @classmethod
+    def from_model(cls, model, image_size=LBP_IMAGE_SIZE, weight_bits=16):
+        """Kuantisasi model linear biner (atribut coef_ dan intercept_)."""
+        if has_feature_map(model):
+            # Peta fitur (misal chi2) tidak linear terhadap counts, jadi tidak bisa dilipat ke bobot
+            raise ValueError("Quantized verifier needs a linear model on raw LBP counts, "
+                             "this model has an explicit feature map")
+        if not hasattr(model, "coef_") or np.asarray(model.coef_).shape[0] != 1:
+            raise ValueError(f"Quantized verifier needs a binary linear model, got {type(model).__name__}")
+        if not 2 <= weight_bits <= 16:
+            raise ValueError(f"weight_bits must be between 2 and 16 (int16 weights), got {weight_bits}")
+        n_pixels = int(image_size[0] * image_size[1])
+        folded = np.asarray(model.coef_, dtype=np.float64).ravel() / (n_pixels + 1e-7)
+        int32_max = int(np.iinfo(np.int32).max)
+        qmax = min(2 ** (weight_bits - 1) - 1, (int32_max // 2) // n_pixels)
+        if qmax < 127:
+            raise ValueError(f"LBP window {image_size[0]}x{image_size[1]} is too large for an int32 "
+                             f"accumulator (fewer than 8 weight bits left)")
+        if qmax < 2 ** (weight_bits - 1) - 1:
+            logger.info(f"Window {image_size[0]}x{image_size[1]}: weights limited to +/-{qmax} "
+                        f"so the int32 accumulator cannot overflow")
+        scale = qmax / max(float(np.abs(folded).max()), 1e-12)
+        bias = float(np.asarray(model.intercept_).ravel()[0])
+        # Bias harus muat di int32 bersama akumulator (headroom >= int32_max / 2 > 0)
+        headroom = int32_max - n_pixels * qmax
+        if bias != 0 and abs(bias * scale) > headroom:
+            scale = headroom / abs(bias)
+        weights_q = np.round(folded * scale).astype(np.int16)
+        bias_q = np.int32(round(bias * scale))
+        return cls(weights_q, bias_q, scale, n_pixels)
+
+    def integer_scores(self, counts):
+        """Skor int32 untuk matriks counts (n_roi, n_bins) uint16/uint32."""
+        counts = np.asarray(counts)
+        if counts.ndim == 1:
+            counts = counts[None, :]
+        return counts.astype(np.int32) @ self.weights_q.astype(np.int32) + self.bias_q
+
+    def decision_function(self, counts):
+        """Skor dalam satuan model float (ambang 0 dan threshold benchmark tetap berlaku)."""
+        return self.integer_scores(counts) / self.scale
+
+    def predict(self, counts):
+        return (self.integer_scores(counts) > 0).astype(int)
+
+    @property
+    def nbytes(self):
+        return self.weights_q.nbytes + self.bias_q.nbytes
+
+
+def counts_from_features(X, n_pixels):
+    """Pulihkan counts dari fitur ternormalisasi (misal test_data.pkl); dtype sama seperti features.py."""
+    dtype = np.uint16 if n_pixels <= np.iinfo(np.uint16).max else np.uint32
+    return np.rint(np.asarray(X, dtype=np.float64) * (n_pixels + 1e-7)).astype(dtype)
+
+def _best_ms(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000.0)
+    return float(np.min(times)), float(np.median(times))
+
+def run_quantization_check(model, X, y, image_size=LBP_IMAGE_SIZE, batch_sizes=(1, 8, 64, 512),
+                           repeats=200, report_path=None):
+    """
+    Bandingkan verifier integer dengan model float pada set uji:
+    kesepakatan prediksi, selisih skor, akurasi, latensi skoring per batch
+    ROI dan memori fitur + bobot. Hasil ditulis ke JSON jika 'report_path'.
+    """
+    quantized = QuantizedLinearVerifier.from_model(model, image_size)
+    counts = counts_from_features(X, quantized.n_pixels)
+    y = np.asarray(y)
+
+    float_scores = np.asarray(model.decision_function(X), dtype=float)
+    int_scores = quantized.decision_function(counts)
+    float_pred = (float_scores > 0).astype(int)
+    int_pred = (int_scores > 0).astype(int)
+    disagree = np.flatnonzero(float_pred != int_pred)
+
+    report = {
+        "n_samples": int(len(y)),
+        "scale": quantized.scale,
+        "agreement": float(np.mean(float_pred == int_pred)),
+        "n_disagree": int(len(disagree)),
+        "disagree_float_scores": [float(s) for s in float_scores[disagree]],
+        "score_abs_err_max": float(np.abs(float_scores - int_scores).max()),
+        "score_abs_err_mean": float(np.abs(float_scores - int_scores).mean()),
+        "accuracy_float": float(np.mean(float_pred == y)),
+        "accuracy_int": float(np.mean(int_pred == y)),
+        "memory": {
+            "feature_bytes_per_roi_float": int(X.shape[1] * np.dtype(np.float64).itemsize),
+            "feature_bytes_per_roi_int": int(X.shape[1] * counts.dtype.itemsize),
+            "weight_bytes_float": int(np.asarray(model.coef_).nbytes + np.asarray(model.intercept_).nbytes),
+            "weight_bytes_int": int(quantized.nbytes),
+        },
+        "latency": [],
+    }
+
+    # Latensi: normalisasi + sklearn decision_function vs satu matmul integer
+    rng = np.random.RandomState(0)
+    for batch in batch_sizes:
+        idx = rng.randint(0, len(counts), batch)
+        batch_counts = counts[idx]
+
+        def float_path():
+            features = batch_counts.astype("float")
+            features /= (features.sum(axis=1, keepdims=True) + 1e-7)
+            model.decision_function(features)
+
+        def int_path():
+            quantized.integer_scores(batch_counts)
+
+        float_min, float_med = _best_ms(float_path, repeats)
+        int_min, int_med = _best_ms(int_path, repeats)
+        report["latency"].append({"batch": batch, "float_ms": float_med, "int_ms": int_med,
+                                  "float_min_ms": float_min, "int_min_ms": int_min,
+                                  "speedup": float_med / int_med if int_med > 0 else None})
+
+    logger.info(f"Quantized verifier: agreement {report['agreement']:.4f} ({report['n_disagree']} disagree), "
+                f"accuracy float {report['accuracy_float']:.4f} vs int {report['accuracy_int']:.4f}, "
+                f"max score error {report['score_abs_err_max']:.2e}")
+    mem = report["memory"]
+    logger.info(f"Memory per ROI: {mem['feature_bytes_per_roi_float']} B -> {mem['feature_bytes_per_roi_int']} B, "
+                f"weights {mem['weight_bytes_float']} B -> {mem['weight_bytes_int']} B")
+    for row in report["latency"]:
+        logger.info(f"  batch {row['batch']:>4}: float {row['float_ms']:.4f} ms, int {row['int_ms']:.4f} ms "
+                    f"(x{row['speedup']:.1f})")
+
+    if report_path:
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Quantization report saved to {report_path}")
+    return report
@@ -0,0 +1,304 @@
+import logging
+import time
+from pathlib import Path
+
+import cv2
+import joblib
+import numpy as np
+from skimage.feature import local_binary_pattern
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from tqdm import tqdm
+
+from .buffers import scratch
+from .eyes import box_iou
+from .manifest import file_hash
+
+logger = logging.getLogger(__name__)
+
+# Parameter LBP resolusi rendah untuk tahap penolakan murah
+LOWRES_SIZE = (24, 24)
+LOWRES_RADIUS = 1
+LOWRES_N_POINTS = 8
+SKIN_SAMPLE_SIZE = (16, 16)
+
+# Urutan tahap berdasarkan biaya (termurah dulu)
+STAGES = ("variance", "skin", "lbp_lowres")
+
+# Proposal cascade untuk kalibrasi: parameter deteksi inference, tetapi
+# minNeighbors lebih longgar agar gambar negatif menghasilkan cukup ROI
+CASCADE_PATH = Path("assets/cascades/haarcascade_frontalface_default.xml")
+PROPOSAL_PARAMS = {"scaleFactor": 1.1, "minNeighbors": 3, "minSize": (24, 24)}
+# Crop wajah diberi border agar cascade bisa menemukannya; proposal positif
+# harus menutupi crop asli dengan IoU minimal ini (sisanya ambigu, dibuang)
+POSITIVE_PAD = 0.25
+POSITIVE_MIN_IOU = 0.5
+
+def lowres_lbp_histogram(roi_gray):
+    """Histogram LBP kecil (P=8, R=1, uniform -> 10 bin) pada ROI 24x24."""
+    small = cv2.resize(roi_gray, LOWRES_SIZE, interpolation=cv2.INTER_AREA)
+    lbp = local_binary_pattern(small, LOWRES_N_POINTS, LOWRES_RADIUS, method='uniform')
+    n_bins = LOWRES_N_POINTS + 2
+    hist, _ = np.histogram(lbp.ravel(), bins=n_bins, range=(0, n_bins))
+    hist = hist.astype("float")
+    hist /= (hist.sum() + 1e-7)
+    return hist
+
+def skin_ratio(roi_bgr):
+    """Rasio piksel berwarna kulit (YCrCb) pada ROI yang diperkecil."""
+    if roi_bgr.ndim != 3:
+        return 0.0
+    small = cv2.resize(roi_bgr, SKIN_SAMPLE_SIZE, interpolation=cv2.INTER_AREA)
+    ycrcb = cv2.cvtColor(small, cv2.COLOR_BGR2YCrCb)
+    mask = cv2.inRange(ycrcb, (0, 133, 77), (255, 173, 127))
+    return cv2.countNonZero(mask) / float(mask.size)
+
+def roi_std_from_integral(sums, sqsums, box):
+    """Standar deviasi intensitas ROI dalam O(1) dari integral image."""
+    (x, y, w, h) = box
+    n = float(w * h)
+    if n <= 0:
+        return 0.0
+    s = sums[y+h, x+w] - sums[y, x+w] - sums[y+h, x] + sums[y, x]
+    sq = sqsums[y+h, x+w] - sqsums[y, x+w] - sqsums[y+h, x] + sqsums[y, x]
+    var = max(0.0, sq / n - (s / n) ** 2)
+    return float(np.sqrt(var))
+
+def crop_stage_scores(img):
+    """Skor tiap tahap untuk satu crop (dipakai saat kalibrasi)."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return {
+        "variance": float(gray.std()),
+        "skin": skin_ratio(img),
+        "lbp_lowres": lowres_lbp_histogram(gray),
+    }
+
+
+class RejectionChain:
+    """
+    Rantai penolakan bertahap (murah -> mahal) sebelum verifikasi LBP+SVM:
+      1. variance   : ROI datar (std dari integral image),
+      2. skin       : rasio warna kulit terlalu kecil,
+      3. lbp_lowres : histogram LBP 24x24 dinilai model linear kecil.
+    Threshold dikalibrasi pada proposal cascade dari gambar latih (lihat
+    calibrate_rejection_chain), yaitu distribusi yang memang disaring rantai.
+    """
+
+    def __init__(self, params):
+        self.params = params
+        self.reset_stats()
+
+    @classmethod
+    def load(cls, path):
+        return cls(joblib.load(path))
+
+    def save(self, path):
+        joblib.dump(self.params, path)
+
+    def bind_model(self, model_path):
+        """Catat hash model verifier; rantai hanya berlaku untuk model ini."""
+        self.params["model_hash"] = file_hash(model_path)
+
+    def matches_model(self, model_path):
+        """False jika rantai dikalibrasi untuk model lain (atau tanpa hash)."""
+        model_hash = self.params.get("model_hash")
+        return model_hash is not None and model_hash == file_hash(model_path)
+
+    def reset_stats(self):
+        self.seen = 0
+        self.rejected = {stage: 0 for stage in STAGES}
+        self.time_ms = {stage: 0.0 for stage in STAGES}
+
+    def filter(self, frame, gray, rois, buffers=None):
+        """
+        Kembalikan kotak yang lolos semua tahap. 'buffers' (FrameBufferPool,
+        opsional) menampung integral image agar tidak dialokasi per frame.
+        """
+        survivors = [tuple(int(v) for v in box) for box in rois]
+        self.seen += len(survivors)
+        if not survivors:
+            return survivors
+
+        def run(stage, keep_fn):
+            start = time.perf_counter()
+            kept = [box for box in survivors if keep_fn(box)]
+            self.time_ms[stage] += (time.perf_counter() - start) * 1000.0
+            self.rejected[stage] += len(survivors) - len(kept)
+            return kept
+
+        if survivors and self.params.get("min_std") is not None:
+            start = time.perf_counter()
+            # Integral image cukup dihitung pada bounding rect gabungan semua ROI
+            ux1 = min(b[0] for b in survivors)
+            uy1 = min(b[1] for b in survivors)
+            ux2 = max(b[0] + b[2] for b in survivors)
+            uy2 = max(b[1] + b[3] for b in survivors)
+            integral_shape = (uy2 - uy1 + 1, ux2 - ux1 + 1)
+            sums, sqsums = cv2.integral2(gray[uy1:uy2, ux1:ux2],
+                                         sum=scratch(buffers, "integral", integral_shape, np.float64),
+                                         sqsum=scratch(buffers, "integral_sq", integral_shape, np.float64),
+                                         sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+            self.time_ms["variance"] += (time.perf_counter() - start) * 1000.0
+            min_std = self.params["min_std"]
+            survivors = run("variance", lambda b: roi_std_from_integral(
+                sums, sqsums, (b[0] - ux1, b[1] - uy1, b[2], b[3])) >= min_std)
+
+        if survivors and frame.ndim == 3 and self.params.get("min_skin") is not None:
+            min_skin = self.params["min_skin"]
+            survivors = run("skin", lambda b: skin_ratio(
+                frame[b[1]:b[1]+b[3], b[0]:b[0]+b[2]]) >= min_skin)
+
+        if survivors and self.params.get("lbp_coef") is not None:
+            coef = self.params["lbp_coef"]
+            intercept = self.params["lbp_intercept"]
+            min_score = self.params["min_lbp_score"]
+            survivors = run("lbp_lowres", lambda b: float(np.dot(lowres_lbp_histogram(
+                gray[b[1]:b[1]+b[3], b[0]:b[0]+b[2]]), coef) + intercept) >= min_score)
+
+        return survivors
+
+    def report(self, verify_ms_per_roi=None):
+        """Ringkasan rasio penolakan per tahap dan estimasi waktu yang dihemat."""
+        if self.seen == 0:
+            return
+        chain_ms = sum(self.time_ms.values())
+        rejected_total = sum(self.rejected.values())
+        remaining = self.seen
+        for stage in STAGES:
+            rate = self.rejected[stage] / remaining if remaining else 0.0
+            logger.info(f"  Stage {stage:<10}: rejected {self.rejected[stage]}/{remaining} "
+                        f"({rate:.1%}), {self.time_ms[stage]:.1f} ms total")
+            remaining -= self.rejected[stage]
+        logger.info(f"Rejection chain: {rejected_total}/{self.seen} ROIs rejected before the verifier, "
+                    f"chain cost {chain_ms:.1f} ms")
+        if verify_ms_per_roi is not None:
+            saved = rejected_total * verify_ms_per_roi - chain_ms
+            logger.info(f"Estimated verifier time saved: {saved:.1f} ms "
+                        f"({verify_ms_per_roi:.2f} ms per verified ROI)")
+
+
+def cascade_proposals(cascade, img, label):
+    """
+    Skor tahap untuk ROI yang diusulkan cascade pada satu gambar latih.
+    Gambar negatif: semua proposal adalah negatif. Crop wajah: diberi border
+    (replicate) lalu hanya proposal yang menutupi crop asli yang dipakai.
+    """
+    target = None
+    if label == 1:
+        h, w = img.shape[:2]
+        pad_x, pad_y = int(w * POSITIVE_PAD), int(h * POSITIVE_PAD)
+        img = cv2.copyMakeBorder(img, pad_y, pad_y, pad_x, pad_x, cv2.BORDER_REPLICATE)
+        target = (pad_x, pad_y, w, h)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    scores = []
+    for (x, y, w, h) in cascade.detectMultiScale(gray, **PROPOSAL_PARAMS):
+        if target is not None and box_iou((x, y, w, h), target) < POSITIVE_MIN_IOU:
+            continue
+        scores.append(crop_stage_scores(img[y:y+h, x:x+w]))
+    return scores
+
+def _load_proposal_scores(cascade, paths, labels):
+    scores, y = [], []
+    for path, label in tqdm(zip(paths, labels), total=len(paths)):
+        img = cv2.imread(str(path))
+        if img is None:
+            continue
+        for roi_scores in cascade_proposals(cascade, img, label):
+            scores.append(roi_scores)
+            y.append(label)
+    return scores, np.asarray(y, dtype=int)
+
+def _stage_values(scores, lbp_model):
+    return {
+        "variance": np.array([s["variance"] for s in scores]),
+        "skin": np.array([s["skin"] for s in scores]),
+        "lbp_lowres": lbp_model.decision_function(np.array([s["lbp_lowres"] for s in scores])),
+    }
+
+def _chain_pass_rates(stage_values, y, thresholds):
+    alive = np.ones(len(y), dtype=bool)
+    for stage, values in stage_values.items():
+        alive &= values >= thresholds[stage]
+    pos, neg = max(1, int((y == 1).sum())), max(1, int((y == 0).sum()))
+    return float((alive & (y == 1)).sum() / pos), float((alive & (y == 0)).sum() / neg)
+
+def calibrate_rejection_chain(train_paths, train_labels, test_paths, test_labels, recall_margin=0.01,
+                              calib_size=0.3, cascade_path=CASCADE_PATH, random_state=42):
+    """
+    Kalibrasi pada proposal Haar cascade (bukan crop dataset atau gambar
+    negatif utuh). Gambar latih dibagi per gambar menjadi bagian fit (model
+    linear LBP resolusi rendah) dan bagian kalibrasi (threshold tiap tahap),
+    sehingga total proposal wajah yang ditolak tidak melebihi 'recall_margin'
+    (dibagi rata per tahap). Proposal dari test set hanya dilaporkan.
+    """
+    cascade = cv2.CascadeClassifier(str(cascade_path))
+    if cascade.empty():
+        raise FileNotFoundError(f"Haar cascade not found at {cascade_path}")
+    fit_paths, calib_paths, fit_labels, calib_labels = train_test_split(
+        list(train_paths), list(train_labels), test_size=calib_size, stratify=train_labels,
+        random_state=random_state)
+
+    logger.info("Collecting cascade proposals from the fit images...")
+    fit_scores, y_fit = _load_proposal_scores(cascade, fit_paths, fit_labels)
+    if len(np.unique(y_fit)) < 2:
+        raise ValueError("Cascade proposals of the fit images contain only one class; cannot calibrate.")
+    lbp_model = LogisticRegression(class_weight='balanced', max_iter=2000)
+    lbp_model.fit(np.array([s["lbp_lowres"] for s in fit_scores]), y_fit)
+
+    logger.info("Calibrating stage thresholds on proposals of held-out training images...")
+    calib_scores, y_calib = _load_proposal_scores(cascade, calib_paths, calib_labels)
+    stage_values = _stage_values(calib_scores, lbp_model)
+
+    n_pos = int((y_calib == 1).sum())
+    if n_pos == 0:
+        raise ValueError("No face proposals in the calibration images to calibrate on.")
+    logger.info(f"Calibration proposals: {n_pos} faces, {int((y_calib == 0).sum())} non-faces "
+                f"(fit: {int((y_fit == 1).sum())} faces, {int((y_fit == 0).sum())} non-faces)")
+    allowed_per_stage = int(np.floor(recall_margin * n_pos / len(stage_values)))
+
+    alive = np.ones(len(y_calib), dtype=bool)
+    thresholds = {}
+    calibration = {}
+    for stage, values in stage_values.items():
+        pos_values = np.sort(values[alive & (y_calib == 1)])
+        threshold = float(pos_values[min(allowed_per_stage, len(pos_values) - 1)]) if len(pos_values) else 0.0
+        keep = values >= threshold
+        neg_alive = alive & (y_calib == 0)
+        pos_alive = alive & (y_calib == 1)
+        calibration[stage] = {
+            "threshold": threshold,
+            "neg_rejected": float((neg_alive & ~keep).sum() / max(1, neg_alive.sum())),
+            "pos_rejected": float((pos_alive & ~keep).sum() / n_pos),
+        }
+        thresholds[stage] = threshold
+        alive &= keep
+
+    recall_kept, neg_passed = _chain_pass_rates(stage_values, y_calib, thresholds)
+    for stage, info in calibration.items():
+        logger.info(f"  Stage {stage:<10}: threshold={info['threshold']:.4f}, "
+                    f"negatives rejected={info['neg_rejected']:.1%}, positives lost={info['pos_rejected']:.2%}")
+    logger.info(f"Rejection chain keeps {recall_kept:.2%} of calibration face proposals and passes "
+                f"{neg_passed:.1%} of non-face proposals to the verifier (margin {recall_margin:.2%}).")
+
+    test_report = None
+    if test_paths is not None and len(test_paths):
+        test_scores, y_test = _load_proposal_scores(cascade, test_paths, test_labels)
+        if (y_test == 1).any():
+            test_recall, test_passed = _chain_pass_rates(_stage_values(test_scores, lbp_model), y_test, thresholds)
+            test_report = {"recall_kept": test_recall, "neg_passed": test_passed,
+                           "n_pos": int((y_test == 1).sum()), "n_neg": int((y_test == 0).sum())}
+            logger.info(f"Test proposals: keeps {test_recall:.2%} of {test_report['n_pos']} faces, passes "
+                        f"{test_passed:.1%} of {test_report['n_neg']} non-faces.")
+
+    params = {
+        "min_std": thresholds["variance"],
+        "min_skin": thresholds["skin"],
+        "lbp_coef": lbp_model.coef_.ravel(),
+        "lbp_intercept": float(lbp_model.intercept_[0]),
+        "min_lbp_score": thresholds["lbp_lowres"],
+        "recall_margin": recall_margin,
+        "proposal_params": dict(PROPOSAL_PARAMS),
+        "calibration": calibration,
+        "test": test_report,
+    }
+    return RejectionChain(params)
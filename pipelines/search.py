@@ -0,0 +1,143 @@
+import logging
+import math
+import time
+from pathlib import Path
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.linear_model import SGDClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.svm import LinearSVC
+
+logger = logging.getLogger(__name__)
+
+def config_key(lbp_params):
+    """Nama pendek & stabil untuk satu kombinasi parameter LBP."""
+    if not lbp_params:
+        return "default"
+    return "_".join(f"{k}{v}" for k, v in sorted(lbp_params.items()))
+
+def memmap_features(X, cache_dir: Path, name: str):
+    """
+    Simpan matriks fitur ke .npy lalu buka kembali sebagai memmap read-only,
+    sehingga worker joblib berbagi file yang sama alih-alih menyalin array.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{name}.npy"
+    np.save(path, np.ascontiguousarray(X, dtype=np.float64))
+    return np.load(path, mmap_mode='r')
+
+def _score_c_path(X, y, train_idx, val_idx, c_values, random_state):
+    """
+    Latih SVM linear (hinge loss, SGD) sepanjang jalur C naik dengan
+    warm-start: solusi C sebelumnya menjadi titik awal C berikutnya.
+    """
+    X_tr, y_tr = X[train_idx], y[train_idx]
+    X_val, y_val = X[val_idx], y[val_idx]
+    n = len(y_tr)
+
+    model = SGDClassifier(loss='hinge', warm_start=True, class_weight='balanced',
+                          max_iter=50, tol=1e-4, random_state=random_state)
+    scores = {}
+    for C in sorted(c_values):
+        # alpha SGD setara dengan 1 / (C * n) pada formulasi SVM
+        model.set_params(alpha=1.0 / (C * n))
+        model.fit(X_tr, y_tr)
+        scores[C] = float(model.score(X_val, y_val))
+    return scores
+
+def _score_linear_svc(X, y, train_idx, val_idx, C, random_state):
+    model = LinearSVC(C=C, max_iter=20000, dual="auto", class_weight='balanced',
+                      random_state=random_state)
+    model.fit(X[train_idx], y[train_idx])
+    return float(model.score(X[val_idx], y[val_idx]))
+
+def split_by_source(y, groups, val_size=0.2, random_state=42):
+    """
+    Split pool/validasi per gambar sumber: semua salinan augmentasi satu
+    gambar jatuh di sisi yang sama. Validasi hanya memakai baris pertama
+    tiap sumber (gambar asli, augmentasi dihasilkan setelahnya).
+    """
+    y = np.asarray(y)
+    groups = np.asarray(groups)
+    sources, first_rows = np.unique(groups, return_index=True)
+    _, val_sources = train_test_split(sources, test_size=val_size, stratify=y[first_rows],
+                                      random_state=random_state)
+    is_val = np.isin(groups, val_sources)
+    pool_idx = np.flatnonzero(~is_val)
+    val_idx = first_rows[np.isin(sources, val_sources)]
+    return pool_idx, val_idx
+
+def halving_search(feature_sets, y, c_values=(0.01, 0.1, 1.0, 10.0), eta=3,
+                   val_size=0.2, min_samples=200, n_jobs=-1, random_state=42, groups=None):
+    """
+    Successive halving atas kandidat (konfigurasi fitur, C).
+
+    'feature_sets' adalah dict {key: X} (sebaiknya memmap) yang selaras dengan
+    'y'. Pada setiap rung, semua kandidat yang tersisa dinilai pada subset data
+    latih yang makin besar (dikali 'eta'), dan hanya 1/eta terbaik yang lanjut.
+    Rung awal memakai SGD hinge dengan warm-start sepanjang jalur C; rung
+    terakhir (data penuh) memakai LinearSVC seperti model akhir.
+
+    'groups' (indeks gambar sumber per baris, lihat process_paths_to_features)
+    wajib jika baris berisi salinan augmentasi: split dilakukan per sumber
+    agar flip/rotasi gambar validasi tidak ikut dilatih.
+
+    Mengembalikan (best_key, best_C, history).
+    """
+    y = np.asarray(y)
+    if groups is not None:
+        pool_idx, val_idx = split_by_source(y, groups, val_size, random_state)
+    else:
+        pool_idx, val_idx = train_test_split(np.arange(len(y)), test_size=val_size, stratify=y,
+                                             random_state=random_state)
+    # Urutan acak tetap -> subset tiap rung bersarang (nested)
+    rng = np.random.RandomState(random_state)
+    pool_idx = rng.permutation(pool_idx)
+
+    candidates = [(key, C) for key in feature_sets for C in c_values]
+    # Rung terakhir (data penuh) masih membandingkan beberapa kandidat dengan LinearSVC
+    n_rungs = max(1, int(math.ceil(math.log(len(candidates), eta))))
+    n_full = len(pool_idx)
+    history = []
+
+    for rung in range(n_rungs):
+        is_last = rung == n_rungs - 1 or len(candidates) <= 1
+        n_samples = n_full if is_last else max(min_samples, int(n_full / eta ** (n_rungs - 1 - rung)))
+        n_samples = min(n_samples, n_full)
+        train_idx = pool_idx[:n_samples]
+        start = time.perf_counter()
+
+        if is_last:
+            results = Parallel(n_jobs=n_jobs)(
+                delayed(_score_linear_svc)(feature_sets[key], y, train_idx, val_idx, C, random_state)
+                for key, C in candidates
+            )
+            scores = dict(zip(candidates, results))
+        else:
+            by_key = {}
+            for key, C in candidates:
+                by_key.setdefault(key, []).append(C)
+            results = Parallel(n_jobs=n_jobs)(
+                delayed(_score_c_path)(feature_sets[key], y, train_idx, val_idx, cs, random_state)
+                for key, cs in by_key.items()
+            )
+            scores = {}
+            for key, path_scores in zip(by_key, results):
+                for C, score in path_scores.items():
+                    scores[(key, C)] = score
+
+        elapsed = time.perf_counter() - start
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+        history.append({"rung": rung, "n_samples": int(n_samples), "seconds": elapsed,
+                        "scores": {f"{k}|C={c}": s for (k, c), s in ranked}})
+        logger.info(f"Halving rung {rung}: {len(candidates)} candidates on {n_samples} samples "
+                    f"({elapsed:.2f}s), best {ranked[0][0]} acc={ranked[0][1]:.4f}")
+
+        if is_last:
+            break
+        n_keep = max(1, int(math.ceil(len(candidates) / eta)))
+        candidates = [cand for cand, _ in ranked[:n_keep]]
+
+    best_key, best_C = ranked[0][0]
+    return best_key, best_C, history
@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .augment import iter_crop_batches
+from .features import LBP_IMAGE_SIZE
+from .manifest import scan_image_paths
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "index.json"
+
+def sample_key(path):
+    """Kunci sampel di indeks: path absolut ternormalisasi (tanpa syscall)."""
+    return os.path.abspath(str(path))
+
+def _decode_crop(path, size):
+    img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        return None
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+
+def pack_dataset(pos_dir: Path, neg_dir: Path, out_dir: Path, size=LBP_IMAGE_SIZE, shard_size=16384, workers=None):
+    """
+    Dekode semua gambar sekali: grayscale, resize ke 'size', lalu tulis ke
+    shard .npy uint8 (n, h, w) yang bisa dibuka sebagai memmap. 'index.json'
+    menyimpan ukuran crop, daftar shard dan (path, label, shard, offset)
+    per sampel. Shard tidak bergantung pada parameter LBP; jika window LBP
+    berbeda dari 'size', crop di-resize lagi saat dibaca.
+    """
+    size = tuple(size)
+    w, h = size
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    items = [(p, 1) for p in scan_image_paths(pos_dir)] + [(p, 0) for p in scan_image_paths(neg_dir)]
+    logger.info(f"Packing {len(items)} images into {w}x{h} uint8 shards of {shard_size} in {out_dir}...")
+
+    samples, shards, failed = [], [], 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for first in range(0, len(items), shard_size):
+            chunk = items[first:first + shard_size]
+            shard_id = len(shards)
+            name = f"shard_{shard_id:05d}.npy"
+            shard = np.lib.format.open_memmap(out_dir / name, mode="w+", dtype=np.uint8, shape=(len(chunk), h, w))
+            n = 0
+            # imread/resize melepas GIL -> dekode paralel di thread pool
+            for (path, label), crop in zip(chunk, executor.map(lambda item: _decode_crop(item[0], size), chunk)):
+                if crop is None:
+                    logger.warning(f"Could not read image {path}, skipping.")
+                    failed += 1
+                    continue
+                shard[n] = crop
+                samples.append([sample_key(path), label, shard_id, n])
+                n += 1
+            shard.flush()
+            del shard
+            if n < len(chunk):
+                # Potong baris kosong dari gambar yang gagal dibaca
+                trimmed = np.array(np.load(out_dir / name, mmap_mode="r")[:n])
+                np.save(out_dir / name, trimmed)
+            shards.append({"file": name, "count": n})
+            logger.info(f"  {name}: {n} crops")
+
+    index = {"size": [w, h], "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+             "sources": {"pos_dir": sample_key(pos_dir), "neg_dir": sample_key(neg_dir)},
+             "shards": shards, "samples": samples}
+    with open(out_dir / INDEX_NAME, "w") as f:
+        json.dump(index, f)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Packed {len(samples)} crops ({failed} unreadable) in {elapsed:.1f}s "
+                f"({sum(s['count'] for s in shards) * w * h / 1e6:.1f} MB)")
+    return out_dir / INDEX_NAME
+
+
+class PackedDataset:
+    """
+    Shard crop grayscale hasil 'app.py pack', dibuka sebagai memmap
+    read-only. Batch dibaca dengan slicing/fancy indexing per shard, tanpa
+    membuka JPEG. Path yang tidak ada di indeks (gambar baru setelah pack)
+    tetap dibaca dari JPEG.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        with open(self.root / INDEX_NAME) as f:
+            index = json.load(f)
+        self.size = tuple(index["size"])
+        self.files = [self.root / s["file"] for s in index["shards"]]
+        self.shards = [np.load(path, mmap_mode="r") for path in self.files]
+        self.locations = {key: (label, shard, offset) for key, label, shard, offset in index["samples"]}
+        logger.info(f"Packed dataset {self.root}: {len(self.locations)} crops of "
+                    f"{self.size[0]}x{self.size[1]} in {len(self.shards)} shards")
+
+    def __len__(self):
+        return len(self.locations)
+
+    def iter_batches(self, paths, labels, size, batch_size=256):
+        """
+        Pengganti iter_crop_batches: batch (crop, label) untuk 'paths'.
+        Urutan dalam batch mengikuti urutan shard agar pembacaan memmap
+        berurutan; label ikut di setiap batch sehingga urutan tidak penting.
+        """
+        size = tuple(size)
+        if size[0] > self.size[0] or size[1] > self.size[1]:
+            logger.warning(f"LBP window {size} is larger than the packed crops {self.size}; crops are upscaled "
+                           f"(pack with a larger --size)")
+        found, missing = [], []
+        for path, label in zip(paths, labels):
+            loc = self.locations.get(sample_key(path))
+            if loc is None:
+                missing.append((path, label))
+            else:
+                found.append((loc[1], loc[2], label))
+        found.sort()
+
+        for first in range(0, len(found), batch_size):
+            chunk = found[first:first + batch_size]
+            batch = np.empty((len(chunk), size[1], size[0]), dtype=np.uint8)
+            batch_labels = np.array([label for _, _, label in chunk], dtype=int)
+            n = 0
+            for shard_id in sorted({s for s, _, _ in chunk}):
+                offsets = [o for s, o, _ in chunk if s == shard_id]
+                crops = self.shards[shard_id][offsets]
+                if size == self.size:
+                    batch[n:n + len(crops)] = crops
+                else:
+                    for i, crop in enumerate(crops):
+                        cv2.resize(crop, size, dst=batch[n + i], interpolation=cv2.INTER_AREA)
+                n += len(crops)
+            yield batch, batch_labels
+
+        if missing:
+            logger.warning(f"{len(missing)} images are not in the packed dataset, reading them from disk")
+            miss_paths, miss_labels = zip(*missing)
+            yield from iter_crop_batches(miss_paths, miss_labels, size, batch_size)
+
+
+def drop_file_cache(paths):
+    """Minta kernel membuang page cache file (best effort, hanya Linux) agar pembacaan berikutnya dingin."""
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    for path in paths:
+        try:
+            fd = os.open(str(path), os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+def _time_batches(batches):
+    start = time.perf_counter()
+    n = sum(len(batch) for batch, _ in batches)
+    return time.perf_counter() - start, n
+
+def run_io_comparison(packed_dir: Path, batch_size=256, report_path=None):
+    """
+    Waktu baca seluruh dataset sebagai crop: JPEG (imread + resize) vs shard
+    memmap, masing-masing dingin (page cache dibuang jika bisa) dan hangat.
+    """
+    packed = PackedDataset(packed_dir)
+    paths = list(packed.locations)
+    labels = [packed.locations[p][0] for p in paths]
+    report = {"n_samples": len(paths), "size": list(packed.size), "batch_size": batch_size}
+
+    for name, files, batches in (
+        ("jpeg", paths, lambda: iter_crop_batches(paths, labels, packed.size, batch_size)),
+        ("packed", packed.files, lambda: packed.iter_batches(paths, labels, packed.size, batch_size)),
+    ):
+        cold = drop_file_cache(files)
+        cold_s, n = _time_batches(batches())
+        warm_s, _ = _time_batches(batches())
+        report[name] = {"cold_s": cold_s if cold else None, "warm_s": warm_s,
+                        "bytes": int(sum(os.path.getsize(f) for f in files)),
+                        "crops_per_s_warm": n / warm_s if warm_s > 0 else None}
+        logger.info(f"  {name:>6}: cold {cold_s:.2f}s{'' if cold else ' (cache not dropped)'}, "
+                    f"warm {warm_s:.2f}s, {report[name]['bytes'] / 1e6:.1f} MB on disk")
+
+    jpeg, pack = report["jpeg"], report["packed"]
+    report["speedup_warm"] = jpeg["warm_s"] / pack["warm_s"] if pack["warm_s"] > 0 else None
+    report["speedup_cold"] = jpeg["cold_s"] / pack["cold_s"] if jpeg["cold_s"] and pack["cold_s"] else None
+    logger.info(f"Packed shards vs JPEG: x{report['speedup_warm']:.1f} warm"
+                + (f", x{report['speedup_cold']:.1f} cold" if report["speedup_cold"] else ""))
+
+    if report_path:
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"I/O report saved to {report_path}")
+    return report
@@ -0,0 +1,211 @@
+import logging
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Layout shared memory (semua field little-endian, selaras 8 byte):
+#   header : uint64[8] = magic, versi, width, height, channels, slots, frame_bytes, latest_seq
+#   slot i : uint64 seq, float64 timestamp, lalu frame_bytes byte frame (dibulatkan ke 8)
+RING_MAGIC = 0x48545348_4D52494E   # "HTSHMRIN"
+RING_VERSION = 1
+HEADER_FIELDS = 8
+SLOT_HEADER_BYTES = 16
+LATEST = 7
+
+def _slot_stride(frame_bytes):
+    return SLOT_HEADER_BYTES + ((frame_bytes + 7) // 8) * 8
+
+
+class ShmFramePublisher:
+    """
+    Publikasikan frame hasil render ke ring buffer multiprocessing.shared_memory
+    untuk konsumen di host yang sama (tanpa JPEG/UDP).
+
+    Protokol seqlock per slot: sebelum menulis, seq slot diisi 2n+1 (ganjil =
+    sedang ditulis); setelah frame dan timestamp tertulis, seq menjadi 2n+2.
+    Terakhir 'latest_seq' di header diisi n+1. Pembaca tidak pernah mengunci:
+    ia menyalin slot lalu memastikan seq sebelum dan sesudah salinan sama dan
+    genap. Dengan beberapa slot, penulis tidak menimpa slot yang baru saja
+    dipublikasikan sehingga pembaca yang sedikit terlambat tetap berhasil.
+
+    Ukuran ring tetap; jika ukuran frame berubah, server menutup ring lalu
+    membuat yang baru dengan nama sama. close() mengosongkan magic di header
+    sehingga pembaca tahu harus membuka ulang (lihat ShmFrameReader.read).
+    """
+
+    def __init__(self, name, width, height, channels=3, slots=4):
+        self.name = name
+        self.shape = (height, width, channels) if channels > 1 else (height, width)
+        self.frame_bytes = width * height * channels
+        self.slots = slots
+        self.stride = _slot_stride(self.frame_bytes)
+        size = HEADER_FIELDS * 8 + slots * self.stride
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Sisa run sebelumnya yang tidak ditutup dengan benar
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.uint64, buffer=self.shm.buf)
+        self.slot_seq, self.slot_ts, self.slot_frames = [], [], []
+        for i in range(slots):
+            offset = HEADER_FIELDS * 8 + i * self.stride
+            self.slot_seq.append(np.ndarray((1,), dtype=np.uint64, buffer=self.shm.buf, offset=offset))
+            self.slot_ts.append(np.ndarray((1,), dtype=np.float64, buffer=self.shm.buf, offset=offset + 8))
+            self.slot_frames.append(np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf,
+                                               offset=offset + SLOT_HEADER_BYTES))
+            self.slot_seq[i][0] = 0
+        # Magic ditulis terakhir: pembaca baru tidak melihat header setengah jadi
+        self.header[1:] = [RING_VERSION, width, height, channels, slots, self.frame_bytes, 0]
+        self.header[0] = RING_MAGIC
+        self.published = 0
+        logger.debug(f"Shared-memory ring '{name}' created: {slots} slots of {width}x{height}x{channels}")
+
+    def publish(self, frame, timestamp=None):
+        """Tulis satu frame (harus berukuran sama dengan ring). Mengembalikan nomor frame."""
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match ring shape {self.shape}")
+        n = self.published
+        slot = n % self.slots
+        self.slot_seq[slot][0] = 2 * n + 1
+        np.copyto(self.slot_frames[slot], frame)
+        self.slot_ts[slot][0] = time.monotonic() if timestamp is None else timestamp
+        self.slot_seq[slot][0] = 2 * n + 2
+        self.header[LATEST] = n + 1
+        self.published = n + 1
+        return n + 1
+
+    def close(self):
+        # Tandai ring sudah pensiun agar pembaca yang masih terpasang membuka ulang
+        self.header[0] = 0
+        # Lepas view numpy dulu agar buffer shared memory bisa ditutup
+        self.header = self.slot_seq = self.slot_ts = self.slot_frames = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _attach(name):
+    """Buka shared memory milik proses lain tanpa ikut 'memiliki'-nya."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        # Python lama: resource_tracker akan meng-unlink segmen saat pembaca keluar
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class ShmFrameReader:
+    """
+    Pembaca referensi untuk ShmFramePublisher (proses lain, host yang sama).
+    read() mengembalikan frame terbaru yang belum pernah dibaca, tanpa kunci.
+    Jika server membuat ulang ring (ukuran frame berubah), read() membuka
+    ring baru dengan nama yang sama; 'shape' ikut berubah.
+    """
+
+    def __init__(self, name, max_retries=3):
+        self.name = name
+        self.max_retries = max_retries
+        self.frames_read = 0
+        self.frames_skipped = 0
+        self.torn_reads = 0
+        self.reattached = 0
+        self._open()
+
+    def _open(self):
+        shm = _attach(self.name)
+        header = np.ndarray((HEADER_FIELDS,), dtype=np.uint64, buffer=shm.buf)
+        magic, version, width, height, channels, slots, frame_bytes, _ = (int(v) for v in header)
+        if magic != RING_MAGIC or version != RING_VERSION:
+            del header
+            shm.close()
+            raise ValueError(f"Shared memory '{self.name}' is not a frame ring (v{RING_VERSION})")
+        self.shm = shm
+        self.header = header
+        self.shape = (height, width, channels) if channels > 1 else (height, width)
+        self.slots = slots
+        self.stride = _slot_stride(frame_bytes)
+        self._slots = [self._slot_view(i) for i in range(slots)]
+        self.last_seq = 0
+
+    def _reopen(self):
+        """Lepas ring lama yang sudah pensiun lalu coba buka ring baru (False jika belum ada)."""
+        if self.shm is not None:
+            self.header = self._slots = None
+            self.shm.close()
+            self.shm = None
+        try:
+            self._open()
+        except (FileNotFoundError, ValueError):
+            # Server belum selesai membuat ring baru; coba lagi pada read() berikutnya
+            return False
+        self.reattached += 1
+        logger.debug(f"Shared-memory ring '{self.name}' re-attached: shape {self.shape}")
+        return True
+
+    def _slot_view(self, slot):
+        offset = HEADER_FIELDS * 8 + slot * self.stride
+        seq = np.ndarray((1,), dtype=np.uint64, buffer=self.shm.buf, offset=offset)
+        ts = np.ndarray((1,), dtype=np.float64, buffer=self.shm.buf, offset=offset + 8)
+        frame = np.ndarray(self.shape, dtype=np.uint8, buffer=self.shm.buf, offset=offset + SLOT_HEADER_BYTES)
+        return seq, ts, frame
+
+    def read(self, out=None):
+        """
+        Kembalikan (nomor_frame, timestamp, frame) untuk frame terbaru, atau
+        None jika belum ada frame baru. 'out' (opsional) dipakai ulang sebagai
+        buffer tujuan agar tidak ada alokasi per frame.
+        """
+        if (self.shm is None or int(self.header[0]) != RING_MAGIC) and not self._reopen():
+            return None
+        if out is not None and out.shape != self.shape:
+            out = None
+        for _ in range(self.max_retries):
+            latest = int(self.header[LATEST])
+            if latest == 0 or latest == self.last_seq:
+                return None
+            n = latest - 1
+            seq, ts, frame = self._slots[n % self.slots]
+            before = int(seq[0])
+            if before != 2 * n + 2:
+                self.torn_reads += 1
+                continue
+            if out is None:
+                out = np.empty(self.shape, dtype=np.uint8)
+            np.copyto(out, frame)
+            timestamp = float(ts[0])
+            if int(seq[0]) != before:
+                # Penulis menimpa slot saat kita menyalin: coba frame terbaru lagi
+                self.torn_reads += 1
+                continue
+            if self.last_seq:
+                self.frames_skipped += latest - self.last_seq - 1
+            self.last_seq = latest
+            self.frames_read += 1
+            return latest, timestamp, out
+        return None
+
+    def wait(self, timeout=1.0, poll=0.0005, out=None):
+        """Tunggu frame baru (polling) sampai 'timeout' detik."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            result = self.read(out)
+            if result is not None:
+                return result
+            time.sleep(poll)
+        return None
+
+    def close(self):
+        self.header = self._slots = None
+        if self.shm is not None:
+            self.shm.close()
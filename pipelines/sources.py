@@ -0,0 +1,298 @@
+import logging
+import struct
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .manifest import scan_image_paths
+
+logger = logging.getLogger(__name__)
+
+# Format sesi rekaman: header lalu frame mentah BGR berukuran tetap,
+# masing-masing diawali timestamp (detik sejak frame pertama).
+SESSION_MAGIC = b"HTSESS01"
+SESSION_HEADER = struct.Struct("<8sIII")   # magic, width, height, channels
+FRAME_HEADER = struct.Struct("<d")         # timestamp
+SESSION_SUFFIXES = {".session", ".htsess"}
+
+
+class FrameSource(ABC):
+    """
+    Sumber frame dengan antarmuka mirip cv2.VideoCapture: read() mengembalikan
+    (ret, frame). Timestamp frame terakhir (detik, relatif terhadap frame
+    pertama) tersedia di 'last_timestamp'.
+
+    'realtime=True' menahan read() sesuai timestamp sumber (replay seperti
+    aslinya), 'realtime=False' membaca secepat mungkin. 'loop=True' mengulang
+    sumber berbasis file dari awal saat habis.
+
+    read(out) menerima buffer tujuan opsional (bentuk sama dengan frame)
+    agar capture tidak mengalokasi frame baru; folder gambar menyalin hasil
+    decode ke buffer itu jika ukurannya sama.
+    """
+
+    def __init__(self, realtime=True, loop=False):
+        self.realtime = realtime
+        self.loop = loop
+        self.last_timestamp = None
+        self._wall_start = None
+        self._ts_offset = 0.0
+
+    def isOpened(self):
+        return True
+
+    @abstractmethod
+    def _read_raw(self, out=None):
+        """Kembalikan (frame, timestamp) atau (None, None) jika habis."""
+
+    def _rewind(self):
+        return False
+
+    def read(self, out=None):
+        frame, ts = self._read_raw(out)
+        if frame is None and self.loop and self._rewind():
+            # Timestamp tetap naik monoton antar putaran
+            self._ts_offset = (self.last_timestamp or 0.0) + 1e-3
+            frame, ts = self._read_raw(out)
+        if frame is None:
+            return False, None
+        ts += self._ts_offset
+        if self.realtime:
+            if self._wall_start is None:
+                self._wall_start = time.perf_counter() - ts
+            delay = self._wall_start + ts - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        self.last_timestamp = ts
+        return True, frame
+
+    def release(self):
+        pass
+
+    def set(self, prop, value):
+        # Kompatibel dengan cv2.VideoCapture.set; sumber file mengabaikannya
+        return False
+
+    def __iter__(self):
+        while True:
+            ret, frame = self.read()
+            if not ret:
+                return
+            yield frame
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class CameraSource(FrameSource):
+    """Kamera fisik (cv2.VideoCapture dengan device id). Selalu real-time."""
+
+    def __init__(self, camera_id=0, width=None, height=None, fps=None):
+        super().__init__(realtime=False, loop=False)
+        self.cap = cv2.VideoCapture(camera_id)
+        self._start = time.perf_counter()
+        if width:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def _read_raw(self, out=None):
+        ret, frame = self.cap.read(out)
+        if not ret:
+            return None, None
+        return frame, time.perf_counter() - self._start
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """File video; timestamp dari posisi frame (CAP_PROP_POS_MSEC)."""
+
+    def __init__(self, path, realtime=True, loop=False):
+        super().__init__(realtime, loop)
+        self.path = Path(path)
+        self.cap = cv2.VideoCapture(str(self.path))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self._index = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def _read_raw(self, out=None):
+        ret, frame = self.cap.read(out)
+        if not ret:
+            return None, None
+        ts = self._index / self.fps
+        self._index += 1
+        return frame, ts
+
+    def _rewind(self):
+        self._index = 0
+        return self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirSource(FrameSource):
+    """Folder gambar (urut nama) diputar dengan FPS tetap."""
+
+    def __init__(self, directory, fps=30.0, realtime=True, loop=False):
+        super().__init__(realtime, loop)
+        self.paths = sorted(scan_image_paths(directory))
+        self.fps = fps
+        self._index = 0
+        self._ts_index = 0
+        if not self.paths:
+            logger.warning(f"No images found in {directory}")
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def _read_raw(self, out=None):
+        while self._index < len(self.paths):
+            path = self.paths[self._index]
+            self._index += 1
+            frame = cv2.imread(str(path))
+            if frame is None:
+                logger.warning(f"Could not read image {path}, skipping.")
+                continue
+            if out is not None and out.shape == frame.shape:
+                # Hasil decode hanya sementara; frame yang dipakai hilir tetap buffer pemanggil
+                np.copyto(out, frame)
+                frame = out
+            ts = self._ts_index / self.fps
+            self._ts_index += 1
+            return frame, ts
+        return None, None
+
+    def _rewind(self):
+        self._index = 0
+        self._ts_index = 0
+        return bool(self.paths)
+
+
+class RecordedSessionSource(FrameSource):
+    """Replay sesi rekaman (lihat SessionRecorder) dengan timestamp aslinya."""
+
+    def __init__(self, path, realtime=True, loop=False):
+        super().__init__(realtime, loop)
+        self.path = Path(path)
+        self.file = open(self.path, "rb")
+        magic, width, height, channels = SESSION_HEADER.unpack(self.file.read(SESSION_HEADER.size))
+        if magic != SESSION_MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a recorded session file")
+        self.shape = (height, width, channels) if channels > 1 else (height, width)
+        self.frame_bytes = width * height * channels
+        self.frame_count = (self.path.stat().st_size - SESSION_HEADER.size) // (FRAME_HEADER.size + self.frame_bytes)
+
+    def _read_raw(self, out=None):
+        head = self.file.read(FRAME_HEADER.size)
+        if len(head) < FRAME_HEADER.size:
+            return None, None
+        (ts,) = FRAME_HEADER.unpack(head)
+        frame = out if out is not None and out.shape == self.shape else np.empty(self.shape, dtype=np.uint8)
+        if self.file.readinto(memoryview(frame).cast("B")) < self.frame_bytes:
+            return None, None  # frame terakhir terpotong (rekaman terhenti)
+        return frame, ts
+
+    def _rewind(self):
+        self.file.seek(SESSION_HEADER.size)
+        return True
+
+    def release(self):
+        self.file.close()
+
+
+class SessionRecorder:
+    """
+    Tulis frame mentah + timestamp ke file sesi. Ukuran frame ditetapkan dari
+    frame pertama; frame berikutnya dengan ukuran lain di-resize.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "wb")
+        self.shape = None
+        self.frames = 0
+        self._start = None
+
+    def write(self, frame, timestamp=None):
+        if self.shape is None:
+            self.shape = frame.shape
+            height, width = frame.shape[:2]
+            channels = frame.shape[2] if frame.ndim == 3 else 1
+            self.file.write(SESSION_HEADER.pack(SESSION_MAGIC, width, height, channels))
+        elif frame.shape != self.shape:
+            frame = cv2.resize(frame, (self.shape[1], self.shape[0]))
+        if timestamp is None:
+            now = time.perf_counter()
+            if self._start is None:
+                self._start = now
+            timestamp = now - self._start
+        self.file.write(FRAME_HEADER.pack(timestamp))
+        self.file.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+        self.frames += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_source(spec, realtime=True, loop=False, fps=30.0, width=None, height=None):
+    """
+    Buat FrameSource dari string:
+      - '0', '1', ... atau 'camera:0'  -> kamera,
+      - 'images:DIR' atau folder        -> ImageDirSource,
+      - 'session:FILE' atau *.session   -> RecordedSessionSource,
+      - 'video:FILE' atau file lain     -> VideoFileSource.
+    """
+    spec = str(spec)
+    kind, _, value = spec.partition(":")
+    if kind not in ("camera", "images", "session", "video") or not value:
+        kind, value = None, spec
+
+    if kind == "camera" or (kind is None and value.isdigit()):
+        return CameraSource(int(value), width, height, fps)
+    path = Path(value)
+    if kind == "images" or (kind is None and path.is_dir()):
+        return ImageDirSource(path, fps=fps, realtime=realtime, loop=loop)
+    if kind == "session" or (kind is None and path.suffix.lower() in SESSION_SUFFIXES):
+        return RecordedSessionSource(path, realtime=realtime, loop=loop)
+    if not path.exists():
+        raise FileNotFoundError(f"Frame source not found: {spec}")
+    return VideoFileSource(path, realtime=realtime, loop=loop)
+
+def record_session(source, out_path, max_frames=None, duration=None):
+    """Rekam frame dari 'source' ke file sesi sampai habis/batas tercapai."""
+    with SessionRecorder(out_path) as recorder:
+        for frame in source:
+            recorder.write(frame, source.last_timestamp)
+            if max_frames and recorder.frames >= max_frames:
+                break
+            if duration and source.last_timestamp >= duration:
+                break
+    logger.info(f"Recorded {recorder.frames} frames to {out_path}")
+    return recorder.frames
@@ -0,0 +1,192 @@
+import itertools
+import json
+import logging
+import time
+
+import cv2
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.model_selection import train_test_split
+from sklearn.svm import LinearSVC
+from sklearn.metrics import classification_report
+
+from .dataset import load_dataset_from_dirs
+from .features import extract_lbp_features, lbp_n_bins
+from .rejection import RejectionChain
+from .shards import PackedDataset
+from .train import process_paths_to_features
+from .utils import test_data_path
+
+logger = logging.getLogger(__name__)
+
+def sweep_configs(image_sizes=(32, 48, 64), radii=(1, 2, 3), n_points=(8, 16, 24),
+                  methods=('uniform', 'nri_uniform')):
+    """Grid parameter LBP (window persegi) dalam bentuk kwargs extract_lbp_features."""
+    return [{"image_size": (size, size), "radius": r, "n_points": p, "method": m}
+            for size, r, p, m in itertools.product(image_sizes, radii, n_points, methods)]
+
+def sweep_key(lbp_params):
+    """Nama pendek satu konfigurasi, misal '48x48_r2_p16_uniform'."""
+    w, h = lbp_params["image_size"]
+    return f"{w}x{h}_r{lbp_params['radius']}_p{lbp_params['n_points']}_{lbp_params['method']}"
+
+def _fit_best_c(X_fit, y_fit, X_val, y_val, c_values, random_state=42):
+    """LinearSVC untuk tiap C; kembalikan (C, akurasi validasi) terbaik."""
+    best = (None, -1.0)
+    for C in c_values:
+        model = LinearSVC(C=C, max_iter=20000, dual="auto", class_weight='balanced', random_state=random_state)
+        model.fit(X_fit, y_fit)
+        score = float(model.score(X_val, y_val))
+        if score > best[1]:
+            best = (C, score)
+    return best
+
+def _evaluate_config(lbp_params, fit_paths, fit_labels, val_paths, val_labels, c_values, augment, packed=None):
+    """Ekstrak fitur untuk satu konfigurasi lalu ukur akurasi validasi (dijalankan di worker)."""
+    start = time.perf_counter()
+    X_fit, y_fit = process_paths_to_features(fit_paths, fit_labels, augment, lbp_params, packed=packed)
+    X_val, y_val = process_paths_to_features(val_paths, val_labels, False, lbp_params, packed=packed)
+    best_C, accuracy = _fit_best_c(X_fit, y_fit, X_val, y_val, c_values)
+    return {"C": best_C, "val_accuracy": accuracy, "train_seconds": time.perf_counter() - start}
+
+def load_latency_rois(paths, n_rois=32, random_state=0):
+    """ROI grayscale berukuran asli (belum di-resize), seperti potongan frame saat inference."""
+    rng = np.random.RandomState(random_state)
+    rois = []
+    for path in rng.permutation(paths)[:n_rois]:
+        img = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            rois.append(img)
+    return rois
+
+def measure_roi_latency(lbp_params, rois, repeats=5):
+    """Median ms per ROI untuk extract_lbp_features (resize + equalize + LBP + histogram)."""
+    extract_lbp_features(rois[0], **lbp_params)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for roi in rois:
+            extract_lbp_features(roi, **lbp_params)
+        times.append((time.perf_counter() - start) * 1000.0 / len(rois))
+    return float(np.median(times))
+
+def pareto_frontier(results):
+    """
+    Konfigurasi yang tidak didominasi: tidak ada konfigurasi lain yang
+    sekaligus lebih akurat (atau sama) dan lebih cepat (atau sama), dengan
+    setidaknya satu yang lebih baik. Diurutkan dari yang tercepat.
+    """
+    frontier = []
+    for r in sorted(results, key=lambda r: (r["roi_ms"], -r["val_accuracy"])):
+        if not frontier or r["val_accuracy"] > frontier[-1]["val_accuracy"]:
+            frontier.append(r)
+    return frontier
+
+def choose_config(frontier, max_roi_ms=None, tolerance=0.0):
+    """
+    Pilih dari frontier: yang paling akurat dalam anggaran latensi, lalu yang
+    tercepat di antara yang akurasinya dalam 'tolerance' dari akurasi itu.
+    Jika tidak ada yang masuk anggaran, pakai yang tercepat.
+    """
+    within = [r for r in frontier if max_roi_ms is None or r["roi_ms"] <= max_roi_ms]
+    if not within:
+        logger.warning(f"No configuration meets the {max_roi_ms} ms/ROI budget, using the fastest one")
+        return frontier[0]
+    best_acc = max(r["val_accuracy"] for r in within)
+    return min((r for r in within if r["val_accuracy"] >= best_acc - tolerance), key=lambda r: r["roi_ms"])
+
+def run_lbp_sweep(args):
+    """
+    Sweep akurasi vs latensi atas parameter LBP (ukuran window, radius,
+    jumlah titik, metode). Data latih dibagi fit/validasi; tiap konfigurasi
+    dilatih paralel (joblib) dan dinilai pada validasi. Latensi per ROI
+    diukur berurutan di proses utama agar tidak terganggu worker lain.
+    Konfigurasi terpilih dari frontier Pareto dilatih ulang pada seluruh
+    data latih, dievaluasi pada test set, dan disimpan sebagai 'lbp_params_'
+    di model sehingga inference memakainya otomatis. Model ditulis ke
+    '--model_name' (default terpisah dari svm_lbp.pkl hasil 'train').
+    """
+    train_paths, test_paths, train_labels, test_labels = load_dataset_from_dirs(
+        args.pos_dir, args.neg_dir, args.test_size, getattr(args, "manifest", None)
+    )
+    fit_paths, val_paths, fit_labels, val_labels = train_test_split(
+        train_paths, train_labels, test_size=args.val_size, stratify=train_labels, random_state=42
+    )
+    packed = PackedDataset(args.packed) if getattr(args, "packed", None) else None
+    configs = sweep_configs(args.image_sizes, args.radii, args.n_points, args.methods)
+    c_values = [0.01, 0.1, 1.0, 10.0]
+    logger.info(f"Sweeping {len(configs)} LBP configurations on {len(fit_paths)} fit / "
+                f"{len(val_paths)} validation samples (n_jobs={args.n_jobs})...")
+
+    # 1. Akurasi validasi per konfigurasi (paralel)
+    start = time.perf_counter()
+    scores = Parallel(n_jobs=args.n_jobs)(
+        delayed(_evaluate_config)(cfg, fit_paths, fit_labels, val_paths, val_labels, c_values, args.augment, packed)
+        for cfg in configs
+    )
+    logger.info(f"Training sweep took {time.perf_counter() - start:.1f}s")
+
+    # 2. Latensi ekstraksi per ROI (berurutan)
+    rois = load_latency_rois(val_paths, args.latency_rois)
+    results = []
+    for cfg, score in zip(configs, scores):
+        result = {"key": sweep_key(cfg), "lbp_params": cfg,
+                  "n_bins": lbp_n_bins(cfg["n_points"], cfg["method"]),
+                  "roi_ms": measure_roi_latency(cfg, rois), **score}
+        results.append(result)
+        logger.info(f"  {result['key']:<28} acc={result['val_accuracy']:.4f} (C={result['C']}) "
+                    f"{result['roi_ms']:.3f} ms/ROI, {result['n_bins']} bins")
+
+    frontier = pareto_frontier(results)
+    logger.info("Pareto frontier (accuracy vs ms/ROI):")
+    for r in frontier:
+        logger.info(f"  {r['key']:<28} acc={r['val_accuracy']:.4f} {r['roi_ms']:.3f} ms/ROI")
+    chosen = choose_config(frontier, args.max_roi_ms, args.tolerance)
+    logger.info(f"Chosen LBP setting: {chosen['key']} (C={chosen['C']})")
+
+    # 3. Latih ulang konfigurasi terpilih pada seluruh data latih lalu uji
+    lbp_params = chosen["lbp_params"]
+    X_train, y_train = process_paths_to_features(train_paths, train_labels, args.augment, lbp_params,
+                                                 packed=packed)
+    model = LinearSVC(C=chosen["C"], max_iter=20000, dual="auto", class_weight='balanced', random_state=42)
+    model.fit(X_train, y_train)
+    model.lbp_params_ = lbp_params
+    X_test, y_test = process_paths_to_features(test_paths, test_labels, augment=False, lbp_params=lbp_params,
+                                               packed=packed)
+    test_accuracy = float(model.score(X_test, y_test))
+    print("\n" + "="*30 + " TEST SET REPORT " + "="*30)
+    print(classification_report(y_test, model.predict(X_test), target_names=['Non-Face', 'Face']))
+    print("="*80)
+
+    args.model_dir.mkdir(parents=True, exist_ok=True)
+    model_path = args.model_dir / args.model_name
+    # Rantai penolakan milik model yang akan ditimpa tidak lagi berlaku
+    chain_path = args.model_dir / "rejection_chain.pkl"
+    stale_chain = (model_path.exists() and chain_path.exists()
+                   and RejectionChain.load(chain_path).matches_model(model_path))
+    joblib.dump(model, model_path)
+    data_path = test_data_path(args.model_dir, args.model_name)
+    joblib.dump({"X": X_test, "y": y_test}, data_path)
+    logger.info(f"Model with lbp_params_={lbp_params} saved to: {model_path} (test data: {data_path})")
+    if stale_chain:
+        chain_path.unlink()
+        logger.info(f"Removed rejection chain calibrated for the replaced model: {chain_path}")
+
+    report = {
+        "model_path": str(model_path),
+        "n_configs": len(configs),
+        "n_fit": int(len(fit_paths)), "n_val": int(len(val_paths)), "n_test": int(len(test_paths)),
+        "latency_rois": len(rois),
+        "results": results,
+        "pareto": [r["key"] for r in frontier],
+        "chosen": {"key": chosen["key"], "C": chosen["C"], "lbp_params": lbp_params,
+                   "val_accuracy": chosen["val_accuracy"], "roi_ms": chosen["roi_ms"],
+                   "test_accuracy": test_accuracy},
+    }
+    if args.report:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Sweep report saved to {args.report}")
+    return report
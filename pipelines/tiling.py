@@ -0,0 +1,214 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from .eyes import box_iou
+from .manifest import scan_image_paths
+
+logger = logging.getLogger(__name__)
+
+def plan_tiles(frame_w, frame_h, tile_w, tile_h, overlap):
+    """
+    Kotak tile (x, y, w, h) yang saling tumpang tindih sebesar 'overlap'.
+    Dengan overlap >= ukuran wajah terbesar, setiap wajah berada utuh di
+    dalam setidaknya satu tile (langkah tile = ukuran tile - overlap).
+    """
+    if min(tile_w, tile_h) <= overlap:
+        raise ValueError(f"tile ({tile_w}x{tile_h}) must be larger than overlap ({overlap})")
+
+    def starts(length, size):
+        if length <= size:
+            return [0]
+        positions = list(range(0, length - size, size - overlap))
+        return positions + [length - size]
+
+    return [(x, y, min(tile_w, frame_w - x), min(tile_h, frame_h - y))
+            for y in starts(frame_h, tile_h) for x in starts(frame_w, tile_w)]
+
+def grid_tile_size(frame_w, frame_h, n_tiles, overlap):
+    """
+    Ukuran tile untuk grid nx * ny >= n_tiles dengan total piksel (termasuk
+    tumpang tindih) paling kecil, sehingga setiap worker mendapat satu tile.
+    """
+    best = None
+    for nx in range(1, n_tiles + 1):
+        ny = -(-n_tiles // nx)
+        tile_w = -(-(frame_w + (nx - 1) * overlap) // nx)
+        tile_h = -(-(frame_h + (ny - 1) * overlap) // ny)
+        if (nx > 1 and tile_w <= overlap) or (ny > 1 and tile_h <= overlap):
+            continue
+        cost = nx * tile_w * ny * tile_h
+        if best is None or cost < best[0]:
+            best = (cost, tile_w, tile_h)
+    if best is None:
+        return frame_w, frame_h
+    return best[1], best[2]
+
+def nms_boxes(boxes, scores, iou_threshold=0.3):
+    """NMS greedy (skor tertinggi dulu) untuk kotak (x, y, w, h); mengembalikan indeks yang dipertahankan."""
+    keep = []
+    for idx in np.argsort(-np.asarray(scores), kind="stable"):
+        if all(box_iou(boxes[idx], boxes[k]) <= iou_threshold for k in keep):
+            keep.append(int(idx))
+    return keep
+
+
+class TiledCascadeDetector:
+    """
+    Haar cascade per tile secara paralel. Gray frame dipotong menjadi tile
+    yang tumpang tindih sebesar 'max_face' (default satu tile per worker,
+    lihat grid_tile_size; atau tile persegi 'tile_size'). Setiap tile
+    diproses di thread pool (detectMultiScale melepas GIL), masing-masing
+    dengan salinan CascadeClassifier sendiri. Kotak dipetakan kembali ke koordinat frame
+    dan duplikat di sambungan tile digabung dengan NMS berbobot jumlah
+    tetangga (detectMultiScale2). Wajah lebih besar dari 'max_face' tidak
+    dicari.
+    """
+
+    def __init__(self, cascade_path, workers=None, max_face=400, tile_size=None, nms_iou=0.3):
+        self.cascade_path = str(cascade_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_face = int(max_face)
+        self.tile_size = tile_size
+        self.nms_iou = nms_iou
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tile")
+
+    def _cascade(self):
+        cascade = getattr(self.local, "cascade", None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(self.cascade_path)
+            if cascade.empty():
+                raise FileNotFoundError(f"Haar cascade not found: {self.cascade_path}")
+            self.local.cascade = cascade
+        return cascade
+
+    def _detect_tile(self, gray, tile, scale_factor, min_neighbors, min_size, max_size):
+        x, y, w, h = tile
+        rects, neighbors = self._cascade().detectMultiScale2(
+            gray[y:y+h, x:x+w], scaleFactor=scale_factor, minNeighbors=min_neighbors,
+            minSize=min_size, maxSize=max_size
+        )
+        if len(rects) == 0:
+            return []
+        return [((int(rx) + x, int(ry) + y, int(rw), int(rh)), int(n))
+                for (rx, ry, rw, rh), n in zip(rects, neighbors)]
+
+    def detect(self, gray, scale_factor=1.1, min_neighbors=5, min_size=(24, 24), max_face=None):
+        """Setara detectMultiScale pada seluruh frame (untuk wajah <= max_face); hasil array (n, 4)."""
+        max_face = int(max_face or self.max_face)
+        frame_h, frame_w = gray.shape[:2]
+        if self.tile_size:
+            tile_w = tile_h = max(self.tile_size * max_face // self.max_face, max_face + 1)
+        else:
+            tile_w, tile_h = grid_tile_size(frame_w, frame_h, self.workers, max_face)
+        tiles = plan_tiles(frame_w, frame_h, tile_w, tile_h, max_face)
+        max_size = (max_face, max_face)
+        futures = [self.executor.submit(self._detect_tile, gray, tile, scale_factor, min_neighbors,
+                                        tuple(min_size), max_size)
+                   for tile in tiles]
+        found = [d for future in futures for d in future.result()]
+        if not found:
+            return np.empty((0, 4), dtype=int)
+        boxes, scores = zip(*found)
+        keep = nms_boxes(boxes, scores, self.nms_iou)
+        return np.array([boxes[i] for i in keep], dtype=int)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def compare_detections(reference, candidate, iou_threshold=0.5):
+    """Pencocokan satu-satu berdasarkan IoU: (cocok, hilang, tambahan, IoU rata-rata yang cocok)."""
+    matched, ious = set(), []
+    for box in candidate:
+        best_iou, best_idx = 0.0, None
+        for idx, ref in enumerate(reference):
+            if idx in matched:
+                continue
+            iou = box_iou(box, ref)
+            if iou > best_iou:
+                best_iou, best_idx = iou, idx
+        if best_idx is not None and best_iou >= iou_threshold:
+            matched.add(best_idx)
+            ious.append(best_iou)
+    n_match = len(matched)
+    return n_match, len(reference) - n_match, len(candidate) - n_match, float(np.mean(ious)) if ious else None
+
+def _median_ms(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000.0)
+    return float(np.median(times)), result
+
+def run_tiling_benchmark(cascade_path, image_dir, workers_list, max_face=400, tile_size=None,
+                         scale_factor=1.1, min_neighbors=5, min_face=(50, 50), repeats=3, report_path=None):
+    """
+    Bandingkan detectMultiScale satu kali pada seluruh frame dengan deteksi
+    ber-tile untuk setiap jumlah worker: latensi median, speedup, dan
+    kecocokan kotak (IoU >= 0.5) terhadap hasil satu kali jalan.
+    """
+    paths = sorted(scan_image_paths(Path(image_dir)))
+    cascade = cv2.CascadeClassifier(str(cascade_path))
+    min_size = (max(24, min_face[0]), max(24, min_face[1]))
+    report = {"cpu_count": os.cpu_count(), "opencv_threads": cv2.getNumThreads(), "max_face": max_face,
+              "images": [], "workers": []}
+
+    grays, references, single_ms = [], [], []
+    for path in paths:
+        gray = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            logger.warning(f"Could not read image {path}, skipping.")
+            continue
+        ms, rois = _median_ms(lambda: cascade.detectMultiScale(
+            gray, scaleFactor=scale_factor, minNeighbors=min_neighbors,
+            minSize=min_size, maxSize=(max_face, max_face)), repeats)
+        grays.append((path, gray))
+        references.append(np.asarray(rois).reshape(-1, 4))
+        single_ms.append(ms)
+    total_single = float(np.sum(single_ms))
+
+    for workers in workers_list:
+        detector = TiledCascadeDetector(cascade_path, workers, max_face, tile_size)
+        try:
+            tiled_ms, totals = [], {"matched": 0, "missed": 0, "extra": 0}
+            for (path, gray), reference, ms_single in zip(grays, references, single_ms):
+                ms, boxes = _median_ms(lambda: detector.detect(gray, scale_factor, min_neighbors, min_size),
+                                       repeats)
+                n_match, n_missed, n_extra, mean_iou = compare_detections(reference, boxes)
+                tiled_ms.append(ms)
+                totals["matched"] += n_match
+                totals["missed"] += n_missed
+                totals["extra"] += n_extra
+                report["images"].append({"image": path.name, "workers": workers,
+                                         "size": [gray.shape[1], gray.shape[0]],
+                                         "single_ms": ms_single, "tiled_ms": ms,
+                                         "single_faces": len(reference), "tiled_faces": len(boxes),
+                                         "matched": n_match, "missed": n_missed, "extra": n_extra,
+                                         "mean_iou": mean_iou})
+        finally:
+            detector.close()
+        total_tiled = float(np.sum(tiled_ms))
+        row = {"workers": workers, "single_ms_total": total_single, "tiled_ms_total": total_tiled,
+               "speedup": total_single / total_tiled if total_tiled > 0 else None, **totals}
+        report["workers"].append(row)
+        logger.info(f"  {workers:>2} workers: single {total_single:.1f} ms, tiled {total_tiled:.1f} ms "
+                    f"(x{row['speedup']:.2f}), matched {totals['matched']}, "
+                    f"missed {totals['missed']}, extra {totals['extra']}")
+
+    if report_path:
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Tiling report saved to {report_path}")
+    return report
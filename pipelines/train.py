@@ -1,52 +1,65 @@
 import logging
+import time
 import joblib
 import numpy as np
-import cv2
 from tqdm import tqdm
 from sklearn.model_selection import GridSearchCV
 from sklearn.svm import LinearSVC
 from sklearn.metrics import classification_report
 
 from .dataset import load_dataset_from_dirs
-from .features import extract_lbp_features
+from .augment import BatchAugmenter, DEFAULT_AUGMENTATIONS, iter_crop_batches
+from .features import extract_lbp_features, LBP_IMAGE_SIZE
+from .rejection import calibrate_rejection_chain
+from .search import config_key, halving_search, memmap_features
+from .shards import PackedDataset
+from .feature_map import build_feature_map, with_feature_map, run_feature_map_report
+from .utils import test_data_path
 
 logger = logging.getLogger(__name__)
 
-def augment_image(image):
-    """Membuat versi gambar yang diaugmentasi."""
-    augmented = [image]
-    augmented.append(cv2.flip(image, 1)) # Flip
-    
-    for angle in [-10, 5, 10]: # Rotasi
-        h, w = image.shape[:2]
-        center = (w // 2, h // 2)
-        M = cv2.getRotationMatrix2D(center, angle, 1.0)
-        rotated = cv2.warpAffine(image, M, (w, h), borderMode=cv2.BORDER_REPLICATE)
-        augmented.append(rotated)
-    return augmented
-
-def process_paths_to_features(paths, labels, augment=False):
-    """Mengekstrak fitur LBP dari daftar path gambar."""
-    features_list = []
-    labels_list = []
-    
-    for path, label in tqdm(zip(paths, labels), total=len(paths)):
-        img = cv2.imread(str(path))
-        if img is None:
-            logger.warning(f"Could not read image {path}, skipping.")
-            continue
-            
-        if augment:
-            augmented_imgs = augment_image(img)
-        else:
-            augmented_imgs = [img]
-            
-        for aug_img in augmented_imgs:
-            features = extract_lbp_features(aug_img)
-            features_list.append(features)
-            labels_list.append(label)
-            
-    return np.array(features_list), np.array(labels_list)
+def process_paths_to_features(paths, labels, augment=False, lbp_params=None,
+                              augmentations=DEFAULT_AUGMENTATIONS, aug_per_sample=None, batch_size=256,
+                              packed=None, return_groups=False):
+    """
+    Mengekstrak fitur LBP dari daftar path gambar.
+    Gambar dibaca sebagai crop grayscale seukuran jendela LBP dalam batch
+    (dari shard 'packed' jika diberikan, lihat shards.py), lalu (opsional)
+    diaugmentasi secara lazy per batch. Fitur ditulis langsung ke array
+    yang dialokasikan di awal. Dengan 'return_groups=True' juga dikembalikan
+    indeks path sumber tiap baris, sehingga salinan augmentasi dari gambar
+    yang sama bisa dijaga di sisi split yang sama.
+    """
+    lbp_params = lbp_params or {}
+    size = tuple(lbp_params.get("image_size", LBP_IMAGE_SIZE))
+    augmenter = BatchAugmenter(size, augmentations, aug_per_sample) if augment else None
+    copies = augmenter.copies_per_sample if augmenter else 1
+    n_bins = len(extract_lbp_features(np.zeros(size[::-1], dtype=np.uint8), **lbp_params))
+
+    features = np.empty((len(paths) * copies, n_bins), dtype=np.float64)
+    out_labels = np.empty(len(paths) * copies, dtype=int)
+    groups = np.empty(len(paths) * copies, dtype=int)
+    labels = np.asarray(labels)
+    n = 0
+
+    with tqdm(total=len(paths)) as progress:
+        # Yang dibawa batch adalah indeks sumber; label diambil dari indeks itu
+        source_ids = np.arange(len(paths))
+        batches = (packed.iter_batches(paths, source_ids, size, batch_size) if packed is not None
+                   else iter_crop_batches(paths, source_ids, size, batch_size))
+        for batch, batch_ids in batches:
+            stream = augmenter.augment(batch, batch_ids) if augmenter else [(batch, batch_ids)]
+            for images, image_ids in stream:
+                for img, source_id in zip(images, image_ids):
+                    features[n] = extract_lbp_features(img, **lbp_params)
+                    out_labels[n] = labels[source_id]
+                    groups[n] = source_id
+                    n += 1
+            progress.update(len(batch))
+
+    if return_groups:
+        return features[:n], out_labels[:n], groups[:n]
+    return features[:n], out_labels[:n]
 
 def train_pipeline_lbp(args):
     """
@@ -55,38 +68,104 @@ def train_pipeline_lbp(args):
     
     # 1. Muat Path Dataset
     X_train_paths, X_test_paths, y_train_labels, y_test_labels = load_dataset_from_dirs(
-        args.pos_dir, args.neg_dir, args.test_size
+        args.pos_dir, args.neg_dir, args.test_size, getattr(args, "manifest", None)
     )
 
-    # 2. Ekstrak Fitur LBP untuk data Training
-    logger.info("Extracting LBP features for training data...")
-    X_train_data, y_train_data = process_paths_to_features(
-        X_train_paths, y_train_labels, args.augment
-    )
-    logger.info(f"Training data shape: {X_train_data.shape}")
+    # Shard crop hasil 'app.py pack' (opsional) menggantikan pembacaan JPEG
+    packed = PackedDataset(args.packed) if getattr(args, "packed", None) else None
+    aug_options = {
+        "augmentations": getattr(args, "augmentations", None) or DEFAULT_AUGMENTATIONS,
+        "aug_per_sample": getattr(args, "aug_per_sample", None),
+        "packed": packed,
+    }
+    # Peta fitur eksplisit opsional (misal chi2 aditif) sebelum SVM linear;
+    # histogram mentah disimpan untuk baseline pembanding
+    feature_map = build_feature_map(getattr(args, "feature_map", "none"), getattr(args, "chi2_steps", 2))
+    raw_train = {}
+    search = getattr(args, "search", "grid")
+    c_values = [0.01, 0.1, 1.0, 10.0]
+    search_start = time.perf_counter()
+
+    if search == "halving":
+        # Kandidat konfigurasi LBP tambahan (misal radius) ikut dicari
+        radii = getattr(args, "lbp_radii", None) or [None]
+        lbp_configs = [({"radius": r} if r is not None else {}) for r in radii]
+        cache_dir = args.model_dir / "search_cache"
+
+        # 2. Ekstrak fitur training per konfigurasi, simpan sebagai memmap bersama
+        feature_sets, y_train_data, groups, configs_by_key = {}, None, None, {}
+        for lbp_params in lbp_configs:
+            key = config_key(lbp_params)
+            logger.info(f"Extracting LBP features for training data ({key})...")
+            X_cfg, y_cfg, groups = process_paths_to_features(
+                X_train_paths, y_train_labels, args.augment, lbp_params, return_groups=True, **aug_options
+            )
+            if len(X_cfg) == 0:
+                logger.error("No training features extracted. Check your dataset.")
+                return
+            if feature_map is not None:
+                raw_train[key] = X_cfg
+                X_cfg = feature_map.fit_transform(X_cfg)
+            feature_sets[key] = memmap_features(X_cfg, cache_dir, f"train_{key}")
+            configs_by_key[key] = lbp_params
+            y_train_data = y_cfg
 
-    # 3. Ekstrak Fitur LBP untuk data Test
+        # 4. Successive halving dengan warm-start sepanjang jalur C
+        logger.info(f"Training {args.classifier.upper()} classifier (successive halving search)...")
+        best_key, best_C, _ = halving_search(feature_sets, y_train_data, groups=groups, c_values=c_values)
+        best_lbp_params = configs_by_key[best_key]
+        X_train_data = feature_sets[best_key]
+        X_train_raw = raw_train.get(best_key)
+        best_model = LinearSVC(C=best_C, max_iter=20000, dual="auto", class_weight='balanced', random_state=42)
+        best_model.fit(X_train_data, y_train_data)
+        logger.info(f"Best params found: {{'C': {best_C}, 'lbp': {best_lbp_params or 'default'}}}")
+        logger.info(f"Training data shape: {X_train_data.shape}")
+    else:
+        best_lbp_params = {}
+
+        # 2. Ekstrak Fitur LBP untuk data Training
+        logger.info("Extracting LBP features for training data...")
+        X_train_data, y_train_data = process_paths_to_features(
+            X_train_paths, y_train_labels, args.augment, **aug_options
+        )
+        logger.info(f"Training data shape: {X_train_data.shape}")
+
+        if len(X_train_data) == 0:
+            logger.error("No training features extracted. Check your dataset.")
+            return
+        X_train_raw = None
+        if feature_map is not None:
+            X_train_raw = X_train_data
+            X_train_data = feature_map.fit_transform(X_train_data)
+            logger.info(f"Feature map {args.feature_map}: {X_train_raw.shape[1]} -> {X_train_data.shape[1]} features")
+
+        # 4. Latih Classifier
+        logger.info(f"Training {args.classifier.upper()} classifier...")
+        param_grid = {'C': c_values}
+        base_model = LinearSVC(max_iter=20000, dual="auto", class_weight='balanced', random_state=42)
+     
+
+        grid_search = GridSearchCV(base_model, param_grid, cv=3, scoring='accuracy', n_jobs=-1, verbose=2)
+        grid_search.fit(X_train_data, y_train_data)
+        
+        best_model = grid_search.best_estimator_
+        logger.info(f"Best params found: {grid_search.best_params_}")
+
+    logger.info(f"Model search ({search}) took {time.perf_counter() - search_start:.1f}s (incl. feature extraction)")
+    # Peta fitur + SVM menjadi satu Pipeline: inference memberi histogram mentah
+    linear_model = best_model
+    if feature_map is not None:
+        feature_map.fit(X_train_raw)
+    best_model = with_feature_map(linear_model, feature_map)
+    # Simpan parameter LBP di model agar inference memakai setelan yang sama
+    best_model.lbp_params_ = best_lbp_params
+
+    # 3. Ekstrak Fitur LBP untuk data Test (dengan parameter LBP terpilih)
     logger.info("Extracting LBP features for test data...")
     X_test_data, y_test_data = process_paths_to_features(
-        X_test_paths, y_test_labels, augment=False
+        X_test_paths, y_test_labels, augment=False, lbp_params=best_lbp_params, packed=packed
     )
     logger.info(f"Test data shape: {X_test_data.shape}")
-    
-    if len(X_train_data) == 0:
-        logger.error("No training features extracted. Check your dataset.")
-        return
-
-    # 4. Latih Classifier
-    logger.info(f"Training {args.classifier.upper()} classifier...")
-    param_grid = {'C': [0.01, 0.1, 1.0, 10.0]}
-    base_model = LinearSVC(max_iter=20000, dual="auto", class_weight='balanced', random_state=42)
- 
-
-    grid_search = GridSearchCV(base_model, param_grid, cv=3, scoring='accuracy', n_jobs=-1, verbose=2)
-    grid_search.fit(X_train_data, y_train_data)
-    
-    best_model = grid_search.best_estimator_
-    logger.info(f"Best params found: {grid_search.best_params_}")
 
     # 5. Evaluasi pada Test Set
     logger.info("Evaluating on test set...")
@@ -95,6 +174,13 @@ def train_pipeline_lbp(args):
     print(classification_report(y_test_data, y_pred, target_names=['Non-Face', 'Face']))
     print("="*80)
 
+    if feature_map is not None:
+        # Baseline: SVM linear dengan C yang sama pada histogram mentah
+        baseline = LinearSVC(C=linear_model.C, max_iter=20000, dual="auto", class_weight='balanced', random_state=42)
+        baseline.fit(X_train_raw, y_train_data)
+        run_feature_map_report(best_model, baseline, X_test_data, y_test_data,
+                               report_path=getattr(args, "feature_map_report", None))
+
     # 6. Simpan Model dan Data Tes
     model_path = args.model_dir / "svm_lbp.pkl"
     joblib.dump(best_model, model_path)
@@ -102,5 +188,22 @@ def train_pipeline_lbp(args):
     
     # Simpan data tes untuk 'app.py eval'
     test_data = {"X": X_test_data, "y": y_test_data}
-    joblib.dump(test_data, args.model_dir / "test_data.pkl")
-    logger.info(f"Test data saved to {args.model_dir / 'test_data.pkl'}")
\ No newline at end of file
+    data_path = test_data_path(args.model_dir, model_path.name)
+    joblib.dump(test_data, data_path)
+    logger.info(f"Test data saved to {data_path}")
+
+    # 7. (Opsional) Kalibrasi rantai penolakan murah sebelum verifier
+    chain_path = args.model_dir / "rejection_chain.pkl"
+    if getattr(args, "rejection_chain", False):
+        logger.info("Calibrating cost-ordered rejection chain...")
+        chain = calibrate_rejection_chain(
+            X_train_paths, y_train_labels, X_test_paths, y_test_labels,
+            recall_margin=args.recall_margin
+        )
+        chain.bind_model(model_path)
+        chain.save(chain_path)
+        logger.info(f"Rejection chain saved to: {chain_path}")
+    elif chain_path.exists():
+        # Rantai lama dikalibrasi untuk model sebelumnya
+        chain_path.unlink()
+        logger.info(f"Removed stale rejection chain: {chain_path}")
\ No newline at end of file
@@ -1,5 +1,6 @@
 import logging
 import sys
+import time
 import cv2
 import numpy as np
 import json
@@ -7,6 +8,9 @@ from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Piramida mip premultiplied hasil 'app.py compilehats', disimpan di samping .png
+MIP_SUFFIX = ".mips.npz"
+
 def setup_logging():
     """Konfigurasi logging standar."""
     logging.basicConfig(
@@ -18,6 +22,61 @@ def setup_logging():
         ]
     )
 
+class StageTimer:
+    """
+    Mengakumulasi waktu per tahap pipeline (dalam ms) agar bisa dilaporkan.
+    Panggil new_frame() sekali per frame, lalu bungkus tiap tahap dengan measure().
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.totals = {}
+        self.last = {}
+
+    def new_frame(self):
+        self.frames += 1
+        self.last = {}
+
+    def measure(self, stage):
+        return _StageContext(self, stage)
+
+    def add(self, stage, elapsed_ms):
+        self.totals[stage] = self.totals.get(stage, 0.0) + elapsed_ms
+        self.last[stage] = self.last.get(stage, 0.0) + elapsed_ms
+
+    def summary(self):
+        """Rata-rata waktu (ms) per frame untuk setiap tahap."""
+        if self.frames == 0:
+            return {}
+        return {stage: total / self.frames for stage, total in self.totals.items()}
+
+    def reset(self):
+        self.frames = 0
+        self.totals = {}
+        self.last = {}
+
+
+class _StageContext:
+    def __init__(self, timer, stage):
+        self.timer = timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.add(self.stage, (time.perf_counter() - self.start) * 1000.0)
+        return False
+
+
+def test_data_path(model_dir: Path, model_name: str):
+    """Data tes milik satu model: 'test_data.pkl' untuk svm_lbp.pkl, '<nama>_test_data.pkl' untuk lainnya."""
+    if model_name == "svm_lbp.pkl":
+        return model_dir / "test_data.pkl"
+    return model_dir / f"{Path(model_name).stem}_test_data.pkl"
+
+
 def resize_to_fixed(image, target_height):
     """Resize gambar sambil mempertahankan rasio aspek."""
     try:
@@ -67,8 +126,14 @@ def load_hat_data(hat_path: Path):
         logger.warning(f"Tidak ada file metadata {meta_path}. Menggunakan nilai default.")
         meta = {"scale_factor": 1.4, "y_offset_factor": 0.8}
     
-    return {
+    hat_data = {
         "image": hat_image,
         "settings": meta,
         "name": hat_path.stem 
-    }
\ No newline at end of file
+    }
+
+    mip_path = hat_path.with_name(hat_path.stem + MIP_SUFFIX)
+    if mip_path.exists():
+        with np.load(mip_path) as mips:
+            hat_data["mips"] = [mips[f"level_{i}"] for i in range(len(mips.files))]
+    return hat_data
\ No newline at end of file
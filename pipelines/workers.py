@@ -0,0 +1,263 @@
+import logging
+import multiprocessing as mp
+import queue
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from .utils import setup_logging, StageTimer
+
+logger = logging.getLogger(__name__)
+
+def _worker_main(worker_id, model_dir, model_name, pipeline_kwargs, hats, in_name, out_name,
+                 shape, slots, task_queue, result_queue, detect_only=False):
+    """
+    Proses worker: memegang InferencePipelineLBP sendiri dan memproses frame
+    yang ditulis parent ke slot shared memory 'in', hasilnya ke slot 'out'.
+    Hanya metadata kecil (seq, slot, topi) yang lewat antrean. Pada mode
+    'detect_only' worker hanya menjalankan detect() dan mengirim kotak+sudut.
+    """
+    setup_logging()
+    # Impor di sini: proses 'spawn' tidak mewarisi modul parent
+    from .infer import InferencePipelineLBP
+
+    shm_in = shared_memory.SharedMemory(name=in_name)
+    shm_out = shared_memory.SharedMemory(name=out_name)
+    inputs = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=shm_in.buf)
+    outputs = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=shm_out.buf)
+    try:
+        pipeline = InferencePipelineLBP(model_dir, model_name, **pipeline_kwargs)
+    except Exception as e:
+        result_queue.put(("error", worker_id, str(e)))
+        return
+    result_queue.put(("ready", worker_id, None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        seq, slot, hat_index, show_hat, show_box = task
+        hat_data = hats[hat_index] if hat_index is not None and hat_index < len(hats) else None
+        try:
+            if detect_only:
+                detections = pipeline.detect(inputs[slot], need_angles=show_hat)
+                detections.pop("started", None)
+                result_queue.put((seq, worker_id, slot, dict(pipeline.timer.last), detections))
+                continue
+            outputs[slot] = pipeline.process_frame(inputs[slot], hat_data, show_hat, show_box)
+            result_queue.put((seq, worker_id, slot, dict(pipeline.timer.last), None))
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Worker {worker_id} failed on frame {seq}: {e}")
+            result_queue.put((seq, worker_id, slot, None, None))
+
+    del inputs, outputs
+    shm_in.close()
+    shm_out.close()
+
+
+class FrameWorkerPool:
+    """
+    Pool proses untuk process_frame agar tidak dibatasi GIL satu thread.
+
+    Frame dibagikan round-robin ke N worker; setiap worker punya
+    'slots_per_worker' slot input/output di shared memory sehingga frame tidak
+    di-pickle. Hasil yang datang tidak berurutan ditahan di reorder buffer dan
+    dikeluarkan sesuai urutan sequence. Jumlah frame yang sedang diproses
+    dibatasi (workers * slots_per_worker), sehingga tambahan latensi juga
+    terbatas: submit() menunggu jika slot worker tujuan masih penuh.
+
+    Dengan 'detect_only=True' worker hanya menjalankan detect() dan hasil yang
+    dikeluarkan adalah dict deteksi (kotak + sudut), bukan frame; render
+    dilakukan pemanggil (misal sekali per kombinasi topi klien).
+
+    Ukuran slot ditetapkan oleh frame pertama. Frame berukuran lain di-resize
+    dengan rasio aspek tetap ke pojok kiri atas slot (sisanya hitam), lalu
+    hasilnya dikembalikan ke ukuran aslinya: kotak dibagi skala yang sama,
+    frame hasil render dipotong lalu di-resize balik.
+
+    Catatan: tiap worker hanya melihat setiap frame ke-N, sehingga smoothing
+    sudut mata (mode 'tracked') bekerja pada frame yang lebih jarang.
+    """
+
+    def __init__(self, n_workers, model_dir, model_name, hats=None, pipeline_kwargs=None,
+                 slots_per_worker=2, start_method=None, detect_only=False):
+        self.detect_only = detect_only
+        self.n_workers = n_workers
+        self.model_dir = model_dir
+        self.model_name = model_name
+        self.hats = hats or []
+        self.pipeline_kwargs = pipeline_kwargs or {}
+        self.slots = slots_per_worker
+        self.ctx = mp.get_context(start_method) if start_method else mp.get_context()
+        self.shape = None
+        self.workers = []
+        self.timer = StageTimer()
+        self.latency_ms = []
+
+    def start(self, frame_shape, timeout=60.0):
+        """Buat shared memory untuk ukuran frame ini lalu jalankan semua worker."""
+        self.shape = tuple(frame_shape)
+        slot_bytes = int(np.prod(self.shape))
+        self.result_queue = self.ctx.Queue()
+        self.next_seq = 1
+        self.next_emit = 1
+        self.next_worker = 0
+        self.pending = {}     # seq -> (worker, waktu submit, tag, ukuran frame asli)
+        self.reorder = {}     # seq -> (frame atau None, tag, waktu submit)
+
+        for worker_id in range(self.n_workers):
+            shm_in = shared_memory.SharedMemory(create=True, size=self.slots * slot_bytes)
+            shm_out = shared_memory.SharedMemory(create=True, size=self.slots * slot_bytes)
+            task_queue = self.ctx.Queue()
+            process = self.ctx.Process(
+                target=_worker_main, daemon=True,
+                args=(worker_id, self.model_dir, self.model_name, self.pipeline_kwargs, self.hats,
+                      shm_in.name, shm_out.name, self.shape, self.slots, task_queue, self.result_queue,
+                      self.detect_only))
+            process.start()
+            self.workers.append({
+                "process": process, "tasks": task_queue, "shm_in": shm_in, "shm_out": shm_out,
+                "inputs": np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=shm_in.buf),
+                "outputs": np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=shm_out.buf),
+                "free": list(range(self.slots)),
+            })
+
+        ready = 0
+        deadline = time.monotonic() + timeout
+        while ready < self.n_workers:
+            try:
+                kind, worker_id, message = self.result_queue.get(timeout=max(0.1, deadline - time.monotonic()))
+            except queue.Empty:
+                self.close()
+                raise RuntimeError("Frame workers did not start in time")
+            if kind == "error":
+                self.close()
+                raise RuntimeError(f"Frame worker {worker_id} failed to start: {message}")
+            ready += 1
+        logger.info(f"Started {self.n_workers} frame workers ({self.slots} slots each, frame {self.shape})")
+
+    def submit(self, frame, hat_index=None, show_hat=True, show_box=True, tag=None):
+        """Kirim frame ke worker berikutnya (round-robin). Mengembalikan nomor sequence."""
+        source_shape = frame.shape
+        worker_id = self.next_worker
+        self.next_worker = (self.next_worker + 1) % self.n_workers
+        worker = self.workers[worker_id]
+        while not worker["free"]:
+            self._collect(block=True)
+
+        slot = worker["free"].pop()
+        if frame.shape == self.shape:
+            np.copyto(worker["inputs"][slot], frame)
+        else:
+            # Letterbox: skala seragam agar kotak dan sudut mata tetap benar setelah dikembalikan
+            scale = min(self.shape[0] / frame.shape[0], self.shape[1] / frame.shape[1])
+            h, w = self._scaled_size(source_shape, scale)
+            target = worker["inputs"][slot]
+            target.fill(0)
+            cv2.resize(frame, (w, h), dst=target[:h, :w], interpolation=cv2.INTER_AREA)
+        seq = self.next_seq
+        self.next_seq += 1
+        self.pending[seq] = (worker_id, time.perf_counter(), tag, source_shape)
+        worker["tasks"].put((seq, slot, hat_index, show_hat, show_box))
+        return seq
+
+    def _collect(self, block=False, timeout=5.0):
+        """Ambil hasil dari worker ke reorder buffer dan bebaskan slotnya."""
+        while True:
+            try:
+                item = self.result_queue.get(timeout=timeout) if block else self.result_queue.get_nowait()
+            except queue.Empty:
+                if block:
+                    raise RuntimeError("Timed out waiting for frame workers")
+                return
+            seq, worker_id, slot, stage_ms, detections = item
+            worker = self.workers[worker_id]
+            _, submitted, tag, source_shape = self.pending.pop(seq)
+            if stage_ms is None:
+                frame = None
+            elif self.detect_only:
+                frame = self._rescale_detections(detections, source_shape)
+            elif source_shape != self.shape:
+                h, w = self._scaled_size(source_shape, self._letterbox_scale(source_shape))
+                frame = cv2.resize(worker["outputs"][slot][:h, :w], (source_shape[1], source_shape[0]))
+            else:
+                frame = worker["outputs"][slot].copy()
+            worker["free"].append(slot)
+            self.reorder[seq] = (frame, tag, submitted)
+            if stage_ms is not None:
+                self.timer.new_frame()
+                for stage, ms in stage_ms.items():
+                    self.timer.add(stage, ms)
+            block = False
+
+    def _letterbox_scale(self, source_shape):
+        return min(self.shape[0] / source_shape[0], self.shape[1] / source_shape[1])
+
+    @staticmethod
+    def _scaled_size(source_shape, scale):
+        return max(1, int(round(source_shape[0] * scale))), max(1, int(round(source_shape[1] * scale)))
+
+    def _rescale_detections(self, detections, source_shape):
+        """Kotak dari koordinat slot (letterbox) kembali ke ukuran frame asli; sudut tidak berubah."""
+        if source_shape == self.shape:
+            return detections
+        scale = self._letterbox_scale(source_shape)
+        detections["boxes"] = [tuple(int(round(v / scale)) for v in box) for box in detections["boxes"]]
+        return detections
+
+    def ready(self):
+        """
+        Generator non-blocking: (seq, frame, tag) untuk hasil yang sudah
+        berurutan (frame = dict deteksi pada mode detect_only). Frame yang
+        gagal diproses dilewati.
+        """
+        self._collect()
+        yield from self._emit()
+
+    def drain(self):
+        """Tunggu semua frame yang masih diproses lalu keluarkan berurutan."""
+        while self.pending:
+            self._collect(block=True)
+        yield from self._emit()
+
+    def _emit(self):
+        while self.next_emit in self.reorder:
+            seq = self.next_emit
+            frame, tag, submitted = self.reorder.pop(seq)
+            self.next_emit += 1
+            # Latensi tambahan pool: submit -> keluar dari reorder buffer
+            self.latency_ms.append((time.perf_counter() - submitted) * 1000.0)
+            if frame is not None:
+                yield seq, frame, tag
+
+    def close(self):
+        for worker in self.workers:
+            try:
+                worker["tasks"].put(None)
+            except Exception:
+                pass
+        for worker in self.workers:
+            worker["process"].join(timeout=5)
+            if worker["process"].is_alive():
+                worker["process"].terminate()
+            worker["inputs"] = worker["outputs"] = None
+            for shm in (worker["shm_in"], worker["shm_out"]):
+                shm.close()
+                shm.unlink()
+        self.workers = []
+
+    def log_stats(self, elapsed=None):
+        """Laporkan waktu per tahap rata-rata dari semua worker."""
+        summary = self.timer.summary()
+        if not summary:
+            return
+        stages = ", ".join(f"{stage}={ms:.2f}ms" for stage, ms in summary.items())
+        message = f"Worker pool ({self.n_workers} workers): {self.timer.frames} frames, {stages}"
+        if elapsed:
+            message += f", throughput {self.timer.frames / elapsed:.1f} FPS"
+        if self.latency_ms:
+            message += (f", pool latency p50 {np.percentile(self.latency_ms, 50):.1f} ms "
+                        f"p95 {np.percentile(self.latency_ms, 95):.1f} ms")
+        logger.info(message)
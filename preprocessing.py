@@ -1,9 +1,30 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
 import os
+import queue
 import random
+import sys
+import threading
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import cv2  
 import numpy as np 
 
+from pipelines.manifest import DatasetManifest, scan_image_paths, scan_images
+
+# Manifest dataset bersama (lihat 'app.py index'); dipakai jika file ini ada
+DEFAULT_MANIFEST = Path("data/manifest.pkl")
+
+def load_default_manifest():
+    """Muat manifest default jika sudah pernah dibuat."""
+    if DEFAULT_MANIFEST.exists():
+        return DatasetManifest.load(DEFAULT_MANIFEST)
+    return None
+
 # ==============================================================================
 # KELAS 1: Untuk Pre-processing (Cropping) Wajah
 # ==============================================================================
@@ -14,7 +35,8 @@ class DatasetPreprocessor:
     Menggunakan Haar Cascade untuk mendeteksi, memotong, dan menyimpan wajah.
     """
     
-    def __init__(self):
+    def __init__(self, manifest=None):
+        self.manifest = manifest
         # Muat Haar Cascade classifier
         try:
             self.face_cascade = cv2.CascadeClassifier(
@@ -31,10 +53,11 @@ class DatasetPreprocessor:
         if not dir_path.exists(): 
             return []
         
-        image_paths = set()
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.JPG', '*.JPEG', '*.PNG']:
-            image_paths.update(list(dir_path.rglob(ext)))
-        return list(image_paths)
+        if self.manifest is not None:
+            self.manifest.update(dir_path)
+            self.manifest.save()
+            return self.manifest.paths(dir_path)
+        return scan_image_paths(dir_path)
 
     def preprocess_faces(self, input_dir, output_dir, max_faces=10000):
         """
@@ -116,6 +139,169 @@ class DatasetPreprocessor:
         print(f"Disimpan di: {output_dir}")
         print("=" * 60)
 
+    def preprocess_faces_parallel(self, input_dir, output_dir, max_faces=None, workers=None,
+                                  journal_path=None, queue_size=256):
+        """
+        Versi non-interaktif, paralel dan bisa dilanjutkan (resumable):
+          - deteksi wajah di process pool (satu cascade per worker),
+          - nama crop deterministik dari path sumber + kotak wajah,
+          - journal checkpoint (JSON Lines) per gambar sumber yang selesai,
+          - penulisan file oleh satu thread writer; jumlah gambar yang sedang
+            diproses atau menunggu ditulis dibatasi 'queue_size' (semaphore
+            dilepas writer), sehingga memori crop tetap terbatas.
+        """
+        in_path = Path(input_dir)
+        out_path = Path(output_dir)
+        if not in_path.exists():
+            print(f"❌ Error: Direktori input '{in_path}' tidak ditemukan!")
+            return
+        out_path.mkdir(parents=True, exist_ok=True)
+        journal_path = Path(journal_path) if journal_path else out_path / ".crop_journal.jsonl"
+        workers = workers or os.cpu_count() or 1
+
+        # Muat journal: sumber yang sudah selesai dilewati
+        done = set()
+        saved_count = 0
+        if journal_path.exists():
+            with open(journal_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # baris terakhir bisa terpotong saat crash
+                    done.add(entry["src"])
+                    saved_count += entry["crops"]
+            print(f"♻️  Melanjutkan dari journal: {len(done)} gambar selesai, {saved_count} wajah tersimpan.")
+
+        image_files = sorted(self.get_all_images(in_path))
+        # Urutan acak tapi tetap (seed) agar resume konsisten
+        random.Random(42).shuffle(image_files)
+        tasks = []
+        in_root = os.path.abspath(in_path)
+        for img_path in image_files:
+            # Path manifest absolut, --input biasanya relatif: bandingkan sebagai path absolut
+            rel = Path(os.path.relpath(os.path.abspath(img_path), in_root)).as_posix()
+            if rel not in done:
+                tasks.append((str(img_path), rel))
+
+        print(f"ℹ️  {len(image_files)} gambar sumber, {len(tasks)} belum diproses, {workers} worker.")
+        if not tasks or (max_faces is not None and saved_count >= max_faces):
+            print("✅ Tidak ada yang perlu diproses.")
+            return
+
+        queue_size = max(1, queue_size)
+        write_queue = queue.Queue()
+        in_flight = threading.Semaphore(queue_size)
+        stop = threading.Event()
+        writer = threading.Thread(target=_crop_writer, args=(write_queue, out_path, journal_path, in_flight),
+                                  daemon=True)
+        writer.start()
+
+        def bounded_tasks():
+            # Dipanggil thread task-handler pool: tahan tugas baru sampai writer mengejar
+            for task in tasks:
+                while not in_flight.acquire(timeout=0.1):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                yield task
+
+        start = time.perf_counter()
+        processed = 0
+        errors = 0
+        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        pool = multiprocessing.Pool(workers, initializer=_init_crop_worker, initargs=(cascade_path,))
+        # Chunk tidak boleh lebih besar dari batas in-flight (chunk harus penuh sebelum dikirim)
+        chunksize = max(1, min(8, queue_size // workers))
+        try:
+            for rel, crops, error in pool.imap_unordered(_crop_faces_worker, bounded_tasks(), chunksize=chunksize):
+                processed += 1
+                if error is not None:
+                    errors += 1
+                    if errors <= 5:
+                        print(f"⚠️  Warning: {rel}: {error}")
+                    crops = []
+                if max_faces is not None:
+                    crops = crops[:max(0, max_faces - saved_count)]
+                saved_count += len(crops)
+                write_queue.put((rel, crops))
+
+                if processed % 500 == 0:
+                    rate = processed / (time.perf_counter() - start)
+                    print(f"  ...{processed}/{len(tasks)} gambar ({rate:.1f} img/s), {saved_count} wajah")
+                if max_faces is not None and saved_count >= max_faces:
+                    print(f"\n✅ Telah mencapai batas {max_faces} wajah. Berhenti.")
+                    break
+        finally:
+            stop.set()
+            pool.terminate()
+            pool.join()
+            write_queue.put(None)
+            writer.join()
+
+        elapsed = time.perf_counter() - start
+        print("\n" + "=" * 60)
+        print("✅ Pre-processing Paralel Selesai!")
+        print(f"Gambar diproses (run ini): {processed} dalam {elapsed:.1f}s "
+              f"({processed / max(elapsed, 1e-9):.1f} img/s, {workers} worker)")
+        print(f"Total wajah tersimpan: {saved_count}")
+        print(f"Journal: {journal_path}")
+        print("=" * 60)
+
+
+def crop_file_name(rel_source, box):
+    """Nama crop deterministik dari path sumber (relatif) dan kotak wajah."""
+    (x, y, w, h) = box
+    digest = hashlib.sha1(rel_source.encode("utf-8")).hexdigest()[:10]
+    stem = Path(rel_source).stem[:40]
+    return f"face_{stem}_{digest}_{x}_{y}_{w}_{h}.jpg"
+
+_CROP_CASCADE = None
+
+def _init_crop_worker(cascade_path):
+    """Initializer process pool: muat cascade sekali per worker."""
+    global _CROP_CASCADE
+    cv2.setNumThreads(1)
+    _CROP_CASCADE = cv2.CascadeClassifier(cascade_path)
+
+def _crop_faces_worker(task):
+    """Deteksi + encode crop di worker. Mengembalikan (rel, crops, error)."""
+    src, rel = task
+    try:
+        img = cv2.imread(src)
+        if img is None:
+            return rel, None, "tidak bisa dibaca"
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        faces = _CROP_CASCADE.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(40, 40))
+        crops = []
+        for (x, y, w, h) in faces:
+            ok, buf = cv2.imencode(".jpg", img[y:y+h, x:x+w])
+            if ok:
+                crops.append(((int(x), int(y), int(w), int(h)), buf.tobytes()))
+        return rel, crops, None
+    except Exception as e:
+        return rel, None, str(e)
+
+def _crop_writer(write_queue, out_path, journal_path, in_flight=None):
+    """
+    Thread writer: tulis crop lalu catat sumbernya di journal (setelah file
+    ditulis), kemudian lepas satu slot 'in_flight' untuk tugas berikutnya.
+    """
+    with open(journal_path, "a") as journal:
+        while True:
+            item = write_queue.get()
+            if item is None:
+                break
+            rel, crops = item
+            for box, data in crops:
+                with open(out_path / crop_file_name(rel, box), "wb") as f:
+                    f.write(data)
+            journal.write(json.dumps({"src": rel, "crops": len(crops)}) + "\n")
+            journal.flush()
+            if in_flight is not None:
+                in_flight.release()
+
 # ==============================================================================
 # KELAS 2: Untuk Cleaning (Cutting) Dataset
 # ==============================================================================
@@ -123,9 +309,10 @@ class DatasetPreprocessor:
 class DatasetCleaner:
     """Membersihkan dataset dengan menghapus gambar berlebih"""
     
-    def __init__(self):
+    def __init__(self, manifest=None):
         self.deleted_count = 0
         self.kept_count = 0
+        self.manifest = manifest
     
     def delete_empty_folders(self, directory):
         """Secara rekursif menghapus folder kosong"""
@@ -147,20 +334,22 @@ class DatasetCleaner:
         
         return deleted_count
     
-    def get_all_images(self, directory):
-        """Mendapatkan semua file gambar tanpa duplikat (case-insensitive)"""
+    def get_all_images(self, directory, refresh=True):
+        """
+        Mendapatkan semua file gambar tanpa duplikat (case-insensitive).
+        Dengan manifest, 'refresh=False' memakai isi manifest tanpa scan ulang.
+        """
         dir_path = Path(directory)
         
         if not dir_path.exists():
             return []
         
-        image_paths = set()
-        for ext in ['*.jpg', '*.jpeg', '*.png', '*.JPG', '*.JPEG', '*.PNG']:
-            found = list(dir_path.rglob(ext))
-            for img in found:
-                image_paths.add(img)
-        
-        return list(image_paths)
+        if self.manifest is not None:
+            if refresh:
+                self.manifest.update(dir_path)
+                self.manifest.save()
+            return self.manifest.paths(dir_path)
+        return scan_image_paths(dir_path)
     
     def count_images(self, directory):
         """Menghitung total gambar di direktori (termasuk subdirektori)"""
@@ -239,7 +428,11 @@ class DatasetCleaner:
         print(f"   ✅ Berhasil menghapus: {deleted} gambar")
         print(f"   ⚠️  Errors: {errors}")
         
-        remaining_images = self.get_all_images(directory)
+        if self.manifest is not None:
+            # Perbarui manifest di tempat, tanpa memindai ulang direktori
+            self.manifest.remove(images_to_delete)
+            self.manifest.save()
+        remaining_images = self.get_all_images(directory, refresh=self.manifest is None)
         print(f"   ✅ Verifikasi tersisa: {len(remaining_images)} gambar UNIK")
         
         print(f"   🗑️  Membersihkan folder kosong...")
@@ -253,6 +446,141 @@ class DatasetCleaner:
         self.deleted_count += deleted
         self.kept_count += len(remaining_images)
     
+    def group_by_subfolder(self, directory):
+        """
+        Satu kali scan: kelompokkan path gambar per subfolder tingkat pertama
+        (misal folder synset ImageNet di data/non_faces).
+        """
+        dir_path = Path(directory)
+        strata = {}
+        if self.manifest is not None:
+            self.manifest.update(dir_path)
+            paths = (str(p) for p in self.manifest.paths(dir_path))
+        else:
+            paths = (path for path, _, _ in scan_images(dir_path))
+        root = os.path.abspath(dir_path)
+        for path in paths:
+            rel = os.path.relpath(path, root)
+            stratum = rel.split(os.sep, 1)[0] if os.sep in rel else "."
+            strata.setdefault(stratum, []).append(path)
+        return strata
+
+    @staticmethod
+    def stratified_quotas(strata_sizes, max_samples):
+        """Bagi kuota 'max_samples' sebanding ukuran tiap strata (largest remainder)."""
+        total = sum(strata_sizes.values())
+        if total <= max_samples:
+            return dict(strata_sizes)
+        exact = {k: n * max_samples / total for k, n in strata_sizes.items()}
+        quotas = {k: int(v) for k, v in exact.items()}
+        leftover = max_samples - sum(quotas.values())
+        for k in sorted(exact, key=lambda k: exact[k] - quotas[k], reverse=True)[:leftover]:
+            quotas[k] += 1
+        return quotas
+
+    def _remove_batch(self, batch, root, quarantine_dir):
+        """Hapus (atau pindahkan ke karantina) satu batch file. Mengembalikan (berhasil, error)."""
+        done, failed = [], 0
+        for path in batch:
+            try:
+                if quarantine_dir is None:
+                    os.unlink(path)
+                else:
+                    dest = Path(quarantine_dir) / os.path.relpath(path, root)
+                    dest.parent.mkdir(parents=True, exist_ok=True)
+                    shutil.move(path, dest)
+                done.append(path)
+            except OSError:
+                failed += 1
+        return done, failed
+
+    def cleanup_directory_scripted(self, directory, max_samples, stratify=True, quarantine_dir=None,
+                                   dry_run=False, workers=8, batch_size=1000, seed=42):
+        """
+        Versi non-interaktif cleanup_directory untuk tree sangat besar:
+        sampling bertingkat per subfolder, hapus/karantina paralel per batch,
+        jumlah diperbarui di tempat (tanpa scan ulang), dan hanya folder yang
+        tersentuh yang dicek kosong/tidaknya.
+        """
+        dir_path = Path(directory)
+        if not dir_path.exists():
+            print(f"❌ Error: {directory} tidak ditemukan!")
+            return
+
+        start = time.perf_counter()
+        strata = self.group_by_subfolder(dir_path)
+        total_images = sum(len(v) for v in strata.values())
+        print(f"\n📂 Direktori: {directory}")
+        print(f"   Total gambar: {total_images} dalam {len(strata)} subfolder "
+              f"(scan {time.perf_counter() - start:.1f}s)")
+
+        if total_images <= max_samples:
+            print(f"   ✅ Tidak perlu pembersihan (di bawah batas {max_samples})")
+            self.kept_count += total_images
+            return
+
+        rng = random.Random(seed)
+        to_remove = []
+        if stratify:
+            quotas = self.stratified_quotas({k: len(v) for k, v in strata.items()}, max_samples)
+            for stratum, paths in strata.items():
+                keep = set(rng.sample(range(len(paths)), quotas[stratum]))
+                to_remove.extend(p for i, p in enumerate(paths) if i not in keep)
+        else:
+            all_paths = [p for paths in strata.values() for p in paths]
+            keep = set(rng.sample(range(len(all_paths)), max_samples))
+            to_remove = [p for i, p in enumerate(all_paths) if i not in keep]
+
+        action = "memindahkan ke karantina" if quarantine_dir else "menghapus"
+        print(f"   📊 Akan menyimpan: {total_images - len(to_remove)} | akan {action}: {len(to_remove)}")
+        if dry_run:
+            print(f"   🔍 DRY RUN: tidak ada file yang diubah")
+            return
+
+        root = os.path.abspath(dir_path)
+        batches = [to_remove[i:i + batch_size] for i in range(0, len(to_remove), batch_size)]
+        removed, errors = [], 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i, (done, failed) in enumerate(pool.map(
+                    lambda b: self._remove_batch(b, root, quarantine_dir), batches)):
+                removed.extend(done)
+                errors += failed
+                if (i + 1) % 10 == 0:
+                    print(f"       Progres: {len(removed)}/{len(to_remove)}...")
+
+        # Perbarui jumlah & manifest di tempat, tanpa scan ulang
+        remaining = total_images - len(removed)
+        if self.manifest is not None:
+            self.manifest.remove(removed)
+            self.manifest.save()
+
+        # Hanya folder yang kehilangan file yang perlu dicek
+        touched = {os.path.dirname(p) for p in removed}
+        empty_deleted = self.delete_empty_parents(touched, root)
+
+        print(f"   ✅ Berhasil {action}: {len(removed)} gambar, errors: {errors}")
+        print(f"   ✅ Tersisa: {remaining} gambar, {empty_deleted} folder kosong dihapus "
+              f"({time.perf_counter() - start:.1f}s)")
+        self.deleted_count += len(removed)
+        self.kept_count += remaining
+
+    def delete_empty_parents(self, directories, root):
+        """Hapus folder kosong di antara 'directories' (dan induknya) sampai 'root'."""
+        deleted = 0
+        # Urutkan dari yang terdalam agar induk diperiksa setelah anaknya
+        pending = sorted(directories, key=lambda d: d.count(os.sep), reverse=True)
+        checked = set()
+        for current in pending:
+            while current != root and current.startswith(root) and current not in checked:
+                checked.add(current)
+                try:
+                    os.rmdir(current)  # hanya berhasil jika kosong
+                    deleted += 1
+                except OSError:
+                    break
+                current = os.path.dirname(current)
+        return deleted
+    
     def cleanup_dataset(self, faces_dir, non_faces_dir, max_samples_per_class, 
                         dry_run=False):
         """
@@ -365,7 +693,7 @@ def _execute_cleaner_logic(faces_dir, non_faces_dir, max_samples):
         print("🔍 MENJALANKAN DRY RUN...")
         print("=" * 60)
         
-        cleaner_dry = DatasetCleaner()
+        cleaner_dry = DatasetCleaner(load_default_manifest())
         cleaner_dry.cleanup_dataset(faces_dir, non_faces_dir, max_samples, dry_run=True)
         
         print("\n" + "=" * 60)
@@ -379,7 +707,7 @@ def _execute_cleaner_logic(faces_dir, non_faces_dir, max_samples):
     print("💀 MENJALANKAN PEMBERSIHAN AKTUAL...")
     print("=" * 60)
     
-    cleaner = DatasetCleaner()
+    cleaner = DatasetCleaner(load_default_manifest())
     cleaner.cleanup_dataset(faces_dir, non_faces_dir, max_samples, dry_run=False)
     
     print("\n" + "=" * 60)
@@ -410,7 +738,7 @@ def run_full_workflow():
     max_extract = 20000  # Ekstrak sebanyak mungkin, kita cut nanti
     
     try:
-        preprocessor = DatasetPreprocessor()
+        preprocessor = DatasetPreprocessor(load_default_manifest())
         preprocessor.preprocess_faces(input_dir, faces_output_dir, max_faces=max_extract)
     except Exception as e:
         print(f"\n❌ Terjadi error saat pre-processing: {e}")
@@ -477,7 +805,7 @@ def run_preprocessor_only():
     max_faces = int(max_faces) if max_faces else 10000
     
     try:
-        preprocessor = DatasetPreprocessor()
+        preprocessor = DatasetPreprocessor(load_default_manifest())
         preprocessor.preprocess_faces(input_dir, output_dir, max_faces)
     except Exception as e:
         print(f"\n❌ Terjadi error saat pre-processing: {e}")
@@ -515,8 +843,52 @@ def run_cleaner_only():
     _execute_cleaner_logic(faces_dir, non_faces_dir, max_samples)
 
 
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Tool persiapan dataset (tanpa argumen = mode interaktif).")
+    subparsers = parser.add_subparsers(dest="command")
+
+    p_crop = subparsers.add_parser("crop", help="Crop wajah secara paralel & bisa dilanjutkan (non-interaktif).")
+    p_crop.add_argument("--input", type=Path, required=True, help="Direktori gambar sumber un-cropped.")
+    p_crop.add_argument("--output", type=Path, required=True, help="Direktori output crop wajah.")
+    p_crop.add_argument("--max_faces", type=int, default=None, help="Batas total wajah (default: tanpa batas).")
+    p_crop.add_argument("--workers", type=int, default=None, help="Jumlah proses (default: semua core).")
+    p_crop.add_argument("--journal", type=Path, default=None,
+                        help="File journal checkpoint (default: <output>/.crop_journal.jsonl).")
+    p_crop.add_argument("--queue_size", type=int, default=256, help="Maksimum gambar yang diproses atau menunggu ditulis sekaligus.")
+
+    p_clean = subparsers.add_parser("clean", help="Batasi jumlah gambar per direktori (non-interaktif).")
+    p_clean.add_argument("--dirs", type=Path, nargs='+', required=True, help="Direktori yang akan dibersihkan.")
+    p_clean.add_argument("--max_samples", type=int, required=True, help="Maksimum gambar per direktori.")
+    p_clean.add_argument("--yes", action='store_true', help="Konfirmasi penghapusan/pemindahan (wajib kecuali --dry_run).")
+    p_clean.add_argument("--dry_run", action='store_true', help="Hanya tampilkan apa yang akan dilakukan.")
+    p_clean.add_argument("--no_stratify", action='store_true', help="Sampling acak global, bukan per subfolder.")
+    p_clean.add_argument("--quarantine", type=Path, default=None, help="Pindahkan ke folder ini alih-alih menghapus.")
+    p_clean.add_argument("--workers", type=int, default=8, help="Jumlah thread hapus/pindah.")
+    p_clean.add_argument("--seed", type=int, default=42, help="Seed sampling.")
+    return parser
+
 def main():
-    """Fungsi main dengan mode interaktif"""
+    """Fungsi main: mode CLI jika ada argumen, selain itu mode interaktif"""
+    if len(sys.argv) > 1:
+        args = build_arg_parser().parse_args()
+        if args.command == "crop":
+            preprocessor = DatasetPreprocessor(load_default_manifest())
+            preprocessor.preprocess_faces_parallel(args.input, args.output, args.max_faces,
+                                                   args.workers, args.journal, args.queue_size)
+        elif args.command == "clean":
+            if not args.yes and not args.dry_run:
+                print("❌ Mode skrip butuh --yes untuk benar-benar menghapus (atau gunakan --dry_run).")
+                sys.exit(1)
+            cleaner = DatasetCleaner(load_default_manifest())
+            for directory in args.dirs:
+                quarantine = args.quarantine / directory.name if args.quarantine else None
+                cleaner.cleanup_directory_scripted(directory, args.max_samples,
+                                                   stratify=not args.no_stratify,
+                                                   quarantine_dir=quarantine,
+                                                   dry_run=args.dry_run, workers=args.workers,
+                                                   seed=args.seed)
+            print(f"\n✅ Total dihapus/dipindah: {cleaner.deleted_count}, total disimpan: {cleaner.kept_count}")
+        return
     
     while True:
         print("\n" + "=" * 60)
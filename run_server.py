@@ -1,3 +1,5 @@
+import argparse
+import json
 import cv2
 import numpy as np
 import socket
@@ -9,6 +11,13 @@ import logging
 from pathlib import Path
 
 from pipelines.infer import InferencePipelineLBP
+from pipelines.governor import LatencyGovernor
+from pipelines.sources import open_source
+from pipelines.shm_ring import ShmFramePublisher
+from pipelines.workers import FrameWorkerPool
+from pipelines.protocol import pack_detections, pack_trace, TRACE_EXT
+from pipelines.profiler import run_profile
+from pipelines.buffers import FrameBufferPool
 from pipelines.utils import setup_logging, load_hat_data
 
 setup_logging()
@@ -16,26 +25,60 @@ logger = logging.getLogger(__name__)
 
 class HatTryOnServerUDP:
     
-    def __init__(self, pipeline: InferencePipelineLBP, hats_dir: Path, host='localhost', port=8888):
+    def __init__(self, pipeline: InferencePipelineLBP, hats_dir: Path, host='localhost', port=8888,
+                 source="0", realtime=True, loop=False, shm_name=None, shm_slots=4,
+                 worker_pool: FrameWorkerPool = None, profile_dir=Path("reports/profiles")):
         self.host = host
         self.port = port
         self.pipeline = pipeline  
+        # Sumber frame: kamera (default), file video, folder gambar, atau sesi rekaman
+        self.source_spec = source
+        self.realtime = realtime
+        self.loop = loop
+        # Transport shared memory opsional untuk konsumen di host yang sama
+        self.shm_name = shm_name
+        self.shm_slots = shm_slots
+        self.shm_publisher = None
+        self.stream_thread = None
+        # Mode multi-proses: deteksi dijalankan oleh pool worker (render tetap di sini)
+        self.worker_pool = worker_pool
+        self.pool_started_at = None
+        # Profiler on-demand (PROFILE:<detik> / TRACEMALLOC:<detik>), satu per waktu
+        self.profile_dir = profile_dir
+        self.profile_thread = None
         
         self.server_socket = None
-        self.clients = set()
+        # addr -> status klien: {"hat_index", "hat_enabled", "mode"}; mode 'jpeg'
+        # (frame ter-render), 'trace' (jpeg + ekstensi trace latensi di setiap
+        # paket) atau 'meta' (hanya deteksi + posisi topi)
+        self.clients = {}
         self.cap = None
         self.running = False
         self.sequence_number = 0
         self.max_packet_size = 60000
         self.mirror_mode = True
+        # Statistik: berapa kali render+encode per frame (per kombinasi topi, bukan per klien)
+        self.frames_emitted = 0
+        self.renders = 0
+        # Buffer capture/mirror/render yang dipakai ulang (mode satu thread) dan
+        # header paket !III yang ditulis di tempat
+        self.buffers = FrameBufferPool()
+        self.capture_buffer = None
+        self.packet_header = bytearray(12)
+        self.trace_header = bytearray(12 + TRACE_EXT.size)
+        self.use_sendmsg = hasattr(socket.socket, "sendmsg")  # Tidak ada di Windows
         
         # --- LOGIKA MULTI-TOPI ---
         self.hats_list = []
         self.current_hat_index = 0
         self.load_all_hats(hats_dir)
         
-        # Topi mati secara default
+        # Topi mati secara default. 'current_hat_index'/'hat_enabled' adalah
+        # status global (perintah terakhir), dipakai untuk ring shared memory;
+        # setiap klien UDP punya status topinya sendiri di self.clients.
         self.hat_enabled = False
+        if self.worker_pool is not None:
+            self.worker_pool.hats = self.hats_list
 
     def load_all_hats(self, hats_dir: Path):
         """Memuat semua topi dan .json-nya dari satu direktori."""
@@ -55,6 +98,7 @@ class HatTryOnServerUDP:
             if hat_data:
                 hat_name = hat_path.stem.upper().replace("-", " ").replace("_", " ")
                 hat_data["name"] = hat_name 
+                hat_data["file"] = hat_path.relative_to(hats_dir).as_posix()
                 self.hats_list.append(hat_data)
                 logger.info(f"  -> Berhasil memuat topi: {hat_data['name']}")
         
@@ -76,21 +120,23 @@ class HatTryOnServerUDP:
                 return i
         return None 
 
-    def process_frame(self, frame):
+    def hat_variants_in_use(self):
         """
-        Ambil topi saat ini dan berikan ke pipeline untuk diproses.
+        Kelompokkan klien per ((hat_index, enabled), mode). Topi mati
+        dianggap satu kombinasi apa pun topi yang terakhir dipilih.
         """
-        current_hat_data = self.get_current_hat()
-        
-        processed_frame = self.pipeline.process_frame(
-            frame, 
-            hat_data=current_hat_data,
-            show_hat=self.hat_enabled,
-            show_box=True
-        )
-        
-        
-        return processed_frame
+        groups = {}
+        for addr, state in list(self.clients.items()):
+            variant = (state["hat_index"], True) if state["hat_enabled"] else (None, False)
+            groups.setdefault((variant, state.get("mode", "jpeg")), []).append(addr)
+        return groups
+
+    def render_variant(self, frame, detections, variant):
+        hat_index, enabled = variant
+        hat_data = self.hats_list[hat_index] if enabled and hat_index < len(self.hats_list) else None
+        self.renders += 1
+        out = self.buffers.get(("render", variant), frame.shape) if self.worker_pool is None else None
+        return self.pipeline.render(frame, detections, hat_data, show_hat=enabled, show_box=True, out=out)
 
 
     def start_server(self):
@@ -100,28 +146,26 @@ class HatTryOnServerUDP:
             self.server_socket.bind((self.host, self.port))
             logger.info(f"🚀 UDP Server started at {self.host}:{self.port}")
             
-            self.cap = cv2.VideoCapture(0)
+            self.cap = open_source(self.source_spec, realtime=self.realtime, loop=self.loop,
+                                   fps=30, width=640, height=480)
             if not self.cap.isOpened():
-                logger.error("❌ Error: Cannot access webcam")
+                logger.error(f"❌ Error: Cannot open frame source {self.source_spec}")
                 return
-                
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            self.cap.set(cv2.CAP_PROP_FPS, 30)
+            logger.info(f"🎞️  Frame source: {self.source_spec}")
             
             self.running = True
             
-            listen_thread = threading.Thread(target=self.listen_for_clients, daemon=True)
+            listen_thread = threading.Thread(target=self.listen_for_clients, name="listen", daemon=True)
             listen_thread.start()
             
-            stream_thread = threading.Thread(target=self.stream_webcam, daemon=True)
-            stream_thread.start()
+            self.stream_thread = threading.Thread(target=self.stream_webcam, name="stream", daemon=True)
+            self.stream_thread.start()
             
         except Exception as e:
             logger.error(f"❌ Error starting server: {e}")
     
     def listen_for_clients(self):
-        """MODIFIED: Dengarkan perintah HAT_CATEGORY dan HAT_OFF."""
+        """MODIFIED: Dengarkan perintah HAT_CATEGORY, HAT_OFF dan PROFILE/TRACEMALLOC."""
         self.server_socket.settimeout(1.0)
         
         while self.running:
@@ -129,37 +173,54 @@ class HatTryOnServerUDP:
                 data, addr = self.server_socket.recvfrom(1024)
                 message = data.decode('utf-8')
                 
-                if message == "REGISTER":
+                if message in ("REGISTER", "REGISTER_META", "REGISTER_TRACE"):
                     if addr not in self.clients:
-                        self.clients.add(addr)
+                        mode = {"REGISTER_META": "meta", "REGISTER_TRACE": "trace"}.get(message, "jpeg")
+                        self.clients[addr] = {"hat_index": self.current_hat_index, "hat_enabled": False,
+                                              "mode": mode}
                         logger.info(f"✅ Client registered: {addr}")
                         self.server_socket.sendto("REGISTERED".encode('utf-8'), addr)
                 
                 elif message == "UNREGISTER":
                     if addr in self.clients:
-                        self.clients.remove(addr)
+                        self.clients.pop(addr, None)
                         logger.info(f"❌ Client unregistered: {addr}")
                 
                 # --- KONTROL TOPI BARU ---
                 
+                # Daftar topi (indeks = id topi pada pesan metadata)
+                elif message == "HAT_LIST":
+                    hats = [{"id": i, "name": h["name"], "file": h.get("file")}
+                            for i, h in enumerate(self.hats_list)]
+                    self.server_socket.sendto(("HATS:" + json.dumps(hats)).encode('utf-8'), addr)
+
                 # NEW: Matikan topi
                 elif message == "HAT_OFF":
-                    logger.info(f"Perintah 'HAT_OFF' diterima. Menonaktifkan topi.")
+                    logger.info(f"Perintah 'HAT_OFF' diterima dari {addr}. Menonaktifkan topi.")
                     self.hat_enabled = False
+                    if addr in self.clients:
+                        self.clients[addr]["hat_enabled"] = False
                 
                 # NEW: Ganti topi berdasarkan Kategori
                 elif message.startswith("HAT_CATEGORY:"):
                     category_name = message.split(":", 1)[1]
-                    logger.info(f"Perintah 'HAT_CATEGORY:{category_name}' diterima.")
+                    logger.info(f"Perintah 'HAT_CATEGORY:{category_name}' diterima dari {addr}.")
                     
                     found_index = self.find_hat_by_name(category_name)
                     if found_index is not None:
                         self.current_hat_index = found_index
                         self.hat_enabled = True # <-- NEW: Aktifkan topi saat dipilih
+                        if addr in self.clients:
+                            self.clients[addr].update(hat_index=found_index, hat_enabled=True)
                         logger.info(f"Topi diganti ke: {category_name}")
                     else:
                         logger.warning(f"Kategori topi tidak ditemukan: {category_name}")
                 # ---
+
+                # Profiling tanpa restart: PROFILE:<detik> atau TRACEMALLOC:<detik>
+                elif message.startswith(("PROFILE:", "TRACEMALLOC:")):
+                    kind, seconds = message.split(":", 1)
+                    self.start_profile(kind.lower(), seconds, addr)
                         
             except socket.timeout:
                 continue
@@ -167,59 +228,206 @@ class HatTryOnServerUDP:
                 if self.running:
                     logger.warning(f"⚠️  Listen Error: {e}")
     
+    def start_profile(self, kind, seconds, addr):
+        """
+        Jalankan profiler di thread terpisah agar listener dan streaming tidak
+        berhenti. Balasan ke pengirim: PROFILE_STARTED, lalu PROFILE_DONE:<file>
+        (atau PROFILE_BUSY / PROFILE_ERROR:<pesan>).
+        """
+        try:
+            duration = float(seconds)
+        except ValueError:
+            self.server_socket.sendto(f"PROFILE_ERROR:invalid duration {seconds!r}".encode('utf-8'), addr)
+            return
+        duration = min(max(duration, 0.1), 300.0)
+        if self.profile_thread is not None:
+            self.server_socket.sendto("PROFILE_BUSY".encode('utf-8'), addr)
+            return
+
+        def worker():
+            try:
+                # Capture, proses dan kirim semuanya berjalan di thread 'stream'
+                collapsed_path, top_path = run_profile(kind, duration, self.profile_dir, threads=("stream",))
+                reply = f"PROFILE_DONE:{collapsed_path},{top_path}"
+            except Exception as e:
+                logger.error(f"❌ Profiling gagal: {e}")
+                reply = f"PROFILE_ERROR:{e}"
+            self.profile_thread = None
+            if self.running:
+                self.server_socket.sendto(reply.encode('utf-8'), addr)
+
+        logger.info(f"🔬 {kind} selama {duration:.1f}s diminta oleh {addr}")
+        if self.worker_pool is not None:
+            logger.info("   (proses worker tidak ikut diprofil, hanya thread server)")
+        self.profile_thread = threading.Thread(target=worker, name="profiler", daemon=True)
+        self.profile_thread.start()
+        self.server_socket.sendto("PROFILE_STARTED".encode('utf-8'), addr)
+
     def stream_webcam(self):
         while self.running:
             try:
-                if len(self.clients) == 0:
+                if len(self.clients) == 0 and self.shm_name is None:
                     time.sleep(0.1)
                     continue
                 
-                ret, frame = self.cap.read()
+                # Mode pool menahan frame sampai hasil worker keluar, jadi buffer
+                # capture/mirror hanya dipakai ulang pada mode satu thread
+                pooled = self.worker_pool is None
+                ret, frame = self.cap.read(self.capture_buffer if pooled else None)
+                capture_ts = time.monotonic()
+                capture_ns = time.time_ns()
                 if not ret:
+                    logger.info("🎞️  Frame source selesai.")
+                    if self.worker_pool is not None and self.pool_started_at is not None:
+                        # Keluarkan frame yang masih di worker agar replay tidak kehilangan ekornya
+                        for _, detections, (ts, ts_ns, source_frame) in self.worker_pool.drain():
+                            self.emit_frame(source_frame, detections, ts, ts_ns)
+                    self.running = False
                     break
+                if pooled:
+                    self.capture_buffer = frame
                 
                 if self.mirror_mode:
-                    frame = cv2.flip(frame, 1)
+                    frame = cv2.flip(frame, 1, dst=self.buffers.get("mirror", frame.shape) if pooled else None)
                 
-                frame = self.process_frame(frame)
-                
-                encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 50]
-                result, encoded_img = cv2.imencode('.jpg', frame, encode_param)
-                
-                if result:
-                    self.send_frame_to_clients(encoded_img.tobytes())
+                # Sudut mata hanya dihitung jika ada yang menampilkan topi
+                need_angles = any(state["hat_enabled"] for state in list(self.clients.values()))
+                need_angles = need_angles or (self.shm_name is not None and self.hat_enabled)
+
+                if self.worker_pool is not None:
+                    if self.pool_started_at is None:
+                        self.worker_pool.start(frame.shape)
+                        self.pool_started_at = time.perf_counter()
+                    # Worker hanya mendeteksi; hasil keluar berurutan (reorder buffer)
+                    self.worker_pool.submit(frame, None, need_angles, True, tag=(capture_ts, capture_ns, frame))
+                    for _, detections, (ts, ts_ns, source_frame) in self.worker_pool.ready():
+                        self.emit_frame(source_frame, detections, ts, ts_ns)
+                    continue
+
+                # Deteksi sekali per frame, render per kombinasi topi
+                detections = self.pipeline.detect(frame, need_angles)
+                self.emit_frame(frame, detections, capture_ts, capture_ns)
+                self.pipeline.finish_frame(detections)
                 
             except Exception as e:
                 logger.error(f"❌ Error streaming: {e}")
                 break
     
-    def send_frame_to_clients(self, frame_data):
-        # ... (Fungsi ini tidak berubah) ...
-        if not frame_data:
+    def emit_frame(self, frame, detections, capture_ts, capture_ns=None):
+        """
+        Render + encode sekali per kombinasi topi yang dipakai, lalu kirim
+        ke klien dengan kombinasi tersebut (dan ke ring shared memory).
+        Klien 'trace' menerima waktu capture dan selesai tiap tahap server.
+        """
+        detect_ns = time.time_ns()
+        self.sequence_number = (self.sequence_number + 1) % 65536
+        self.frames_emitted += 1
+        rendered = {}
+
+        if self.shm_name is not None:
+            variant = (self.current_hat_index, True) if self.hat_enabled else (None, False)
+            rendered[variant] = self.render_variant(frame, detections, variant)
+            try:
+                self.publish_shm(rendered[variant], capture_ts)
+            except Exception as e:
+                # Ring gagal tidak boleh menghentikan stream UDP
+                logger.error(f"❌ Error publishing to shared memory: {e}")
+
+        encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 50]
+        # variant -> (jpeg, waktu selesai render, waktu selesai encode); klien jpeg & trace berbagi hasil
+        encoded = {}
+        for (variant, mode), addrs in self.hat_variants_in_use().items():
+            if mode == "meta":
+                # Tanpa render/encode: kirim kotak, sudut dan posisi topi saja
+                hat_index, enabled = variant
+                hat_data = self.hats_list[hat_index] if enabled and hat_index < len(self.hats_list) else None
+                message = pack_detections(self.sequence_number, frame.shape, detections, hat_index, hat_data)
+                self.send_metadata_to_clients(message, addrs)
+                continue
+            if variant not in encoded:
+                if variant not in rendered:
+                    rendered[variant] = self.render_variant(frame, detections, variant)
+                render_ns = time.time_ns()
+                result, encoded_img = cv2.imencode('.jpg', rendered[variant], encode_param)
+                encoded[variant] = (encoded_img if result else None, render_ns, time.time_ns())
+            encoded_img, render_ns, encode_ns = encoded[variant]
+            if encoded_img is None:
+                continue
+            trace = None
+            if mode == "trace" and capture_ns is not None:
+                trace = pack_trace(capture_ns, {"detect": detect_ns, "render": render_ns,
+                                                "encode": encode_ns, "send": time.time_ns()})
+            # Tanpa tobytes(): potongan paket adalah view ke buffer hasil encode
+            self.send_frame_to_clients(memoryview(encoded_img).cast("B"), addrs, trace)
+    
+    def publish_shm(self, frame, capture_ts):
+        """
+        Tulis frame mentah ke ring buffer shared memory (dibuat saat frame
+        pertama). Jika ukuran frame berubah (misal sumber folder gambar),
+        ring ditutup lalu dibuat ulang; pembaca membuka ulang sendiri.
+        """
+        first = self.shm_publisher is None
+        if not first and self.shm_publisher.shape != frame.shape:
+            logger.debug(f"🧠 Ukuran frame berubah {self.shm_publisher.shape} -> {frame.shape}, "
+                         f"membuat ulang ring {self.shm_name}")
+            self.shm_publisher.close()
+            self.shm_publisher = None
+        if self.shm_publisher is None:
+            h, w = frame.shape[:2]
+            channels = frame.shape[2] if frame.ndim == 3 else 1
+            self.shm_publisher = ShmFramePublisher(self.shm_name, w, h, channels, self.shm_slots)
+            if first:
+                logger.info(f"🧠 Shared memory ring aktif: {self.shm_name}")
+        self.shm_publisher.publish(frame, capture_ts)
+
+    def send_metadata_to_clients(self, message, client_addrs):
+        """Pesan metadata muat dalam satu datagram; tanpa header !III."""
+        for client_addr in client_addrs:
+            try:
+                self.server_socket.sendto(message, client_addr)
+            except Exception as e:
+                logger.error(f"❌ Error sending metadata to {client_addr}: {e}")
+
+    def send_frame_to_clients(self, frame_data, client_addrs=None, trace=None):
+        """
+        Kirim satu frame (sequence_number saat ini) ke 'client_addrs' (default: semua).
+        'frame_data' boleh bytes atau memoryview; dengan sendmsg header dan
+        potongan payload dikirim tanpa disalin menjadi satu paket dulu.
+        'trace' (opsional, pack_trace) ditempel setelah header !III di setiap paket.
+        """
+        frame_data = memoryview(frame_data).cast("B")
+        if not frame_data.nbytes:
             return
         
-        self.sequence_number = (self.sequence_number + 1) % 65536
-        frame_size = len(frame_data)
-        header_size = 12
+        if client_addrs is None:
+            client_addrs = list(self.clients)
+        frame_size = frame_data.nbytes
+        if trace is None:
+            header = self.packet_header
+        else:
+            header = self.trace_header
+            header[12:] = trace
+        header_size = len(header)
         payload_size = self.max_packet_size - header_size
         total_packets = math.ceil(frame_size / payload_size)
         
-        for client_addr in self.clients.copy():
+        for client_addr in client_addrs:
             try:
                 for packet_index in range(total_packets):
                     start_pos = packet_index * payload_size
                     end_pos = min(start_pos + payload_size, frame_size)
                     packet_data = frame_data[start_pos:end_pos]
                     
-                    header = struct.pack("!III", self.sequence_number, total_packets, packet_index)
-                    udp_packet = header + packet_data
-                    
-                    self.server_socket.sendto(udp_packet, client_addr)
+                    struct.pack_into("!III", header, 0, self.sequence_number, total_packets, packet_index)
+                    if self.use_sendmsg:
+                        self.server_socket.sendmsg([header, packet_data], [], 0, client_addr)
+                    else:
+                        self.server_socket.sendto(bytes(header) + packet_data, client_addr)
                     
             except Exception as e:
                 if hasattr(e, 'errno') and e.errno == 10054:
                     logger.warning(f"Klien {client_addr} terputus (errno 10054). Menghapus.")
-                    self.clients.remove(client_addr)
+                    self.clients.pop(client_addr, None)
                 else:
                     logger.error(f"❌ Error sending to {client_addr}: {e}")
 
@@ -228,39 +436,97 @@ class HatTryOnServerUDP:
         self.running = False
         if self.server_socket:
             self.server_socket.close()
+        if self.stream_thread is not None and self.stream_thread is not threading.current_thread():
+            # Tunggu frame yang sedang diproses agar capture/ring tidak ditutup di tengah jalan
+            self.stream_thread.join(timeout=5)
         if self.cap:
             self.cap.release()
+        if self.shm_publisher:
+            self.shm_publisher.close()
+            self.shm_publisher = None
+        if self.worker_pool is not None and self.pool_started_at is not None:
+            self.worker_pool.log_stats(time.perf_counter() - self.pool_started_at)
+            self.worker_pool.close()
+            self.pool_started_at = None
+        self.pipeline.log_stage_times()
+        if self.frames_emitted:
+            logger.info(f"🎨 Rata-rata {self.renders / self.frames_emitted:.2f} render+encode per frame "
+                        f"({self.frames_emitted} frame)")
         logger.info("✅ Server stopped")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hat Try-On UDP server (untuk client Godot).")
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="Host untuk bind server.")
+    parser.add_argument("--port", type=int, default=8888, help="Port UDP server.")
+    parser.add_argument("--target_fps", type=float, default=None,
+                        help="Aktifkan latency governor dengan target FPS ini.")
+    parser.add_argument("--governor_log", type=Path, default=None, help="File JSON Lines untuk keputusan governor.")
+    parser.add_argument("--source", type=str, default="0",
+                        help="Sumber frame: id kamera, file video, folder gambar, atau file .session rekaman.")
+    parser.add_argument("--pace", type=str, choices=['realtime', 'fast'], default='realtime',
+                        help="Replay sumber file sesuai timestamp atau secepat mungkin.")
+    parser.add_argument("--loop", action='store_true', help="Ulangi sumber file dari awal saat habis.")
+    parser.add_argument("--shm", type=str, default=None,
+                        help="Nama ring buffer shared memory untuk konsumen lokal (lihat shm_reader.py).")
+    parser.add_argument("--shm_slots", type=int, default=4, help="Jumlah slot ring buffer shared memory.")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Jumlah proses worker untuk deteksi (0 = satu thread, seperti semula).")
+    parser.add_argument("--worker_slots", type=int, default=2, help="Frame in-flight per worker.")
+    parser.add_argument("--quantized", action='store_true', help="Verifikasi ROI dengan verifier integer.")
+    parser.add_argument("--hats_dir", type=Path, default=Path("assets/hats"),
+                        help="Direktori topi (misal assets/hats_compiled hasil 'app.py compilehats').")
+    parser.add_argument("--profile_dir", type=Path, default=Path("reports/profiles"),
+                        help="Direktori hasil PROFILE:/TRACEMALLOC:.")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("🎩 HAT TRY-ON SERVER")
     print("=" * 60)
     
     MODELS_DIR = Path("models")
     MODEL_NAME = "svm_lbp.pkl"
-    HATS_DIR = Path("assets/hats") # <-- Folder baru
+    HATS_DIR = args.hats_dir # <-- Folder baru
     
+    governor = None
+    if args.target_fps:
+        governor = LatencyGovernor(args.target_fps, audit_path=args.governor_log)
+
     try:
         pipeline = InferencePipelineLBP(
             model_dir=MODELS_DIR, 
-            model_name=MODEL_NAME
+            model_name=MODEL_NAME,
+            governor=governor,
+            quantized=args.quantized
         )
     except FileNotFoundError as e:
         logger.error(f"FATAL: Gagal memuat pipeline. {e}")
         logger.error("Pastikan Anda sudah menjalankan 'app.py train' dan aset ada.")
         exit()
 
+    worker_pool = None
+    if args.workers > 0:
+        if governor is not None:
+            logger.warning("Governor tidak dipakai dalam mode --workers (tiap worker punya pipeline sendiri).")
+        worker_pool = FrameWorkerPool(args.workers, MODELS_DIR, MODEL_NAME, slots_per_worker=args.worker_slots,
+                                      pipeline_kwargs={"quantized": args.quantized}, detect_only=True)
+
     server = HatTryOnServerUDP(
         pipeline=pipeline,
         hats_dir=HATS_DIR, 
-        host='0.0.0.0', 
-        port=8888
+        host=args.host, 
+        port=args.port,
+        source=args.source,
+        realtime=args.pace == 'realtime',
+        loop=args.loop,
+        shm_name=args.shm,
+        shm_slots=args.shm_slots,
+        worker_pool=worker_pool,
+        profile_dir=args.profile_dir
     )
     
     try:
         server.start_server()
-        logger.info(f"📺 Server running! Streaming on 0.0.0.0:8888")
+        logger.info(f"📺 Server running! Streaming on {args.host}:{args.port}")
         logger.info("⌨️  Press Ctrl+C to stop")
         
         while server.running:
@@ -268,4 +534,5 @@ if __name__ == "__main__":
             
     except KeyboardInterrupt:
         logger.info("\n⏹️  Stopping server...")
+    finally:
         server.stop_server()
@@ -0,0 +1,237 @@
+import argparse
+import json
+import logging
+import math
+import socket
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from pipelines.shm_ring import ShmFramePublisher, ShmFrameReader
+from pipelines.sources import open_source
+from pipelines.utils import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("!III")
+MAX_PACKET_SIZE = 60000
+JPEG_QUALITY = 50
+
+def latency_stats(latencies_ms):
+    if not latencies_ms:
+        return {"n": 0}
+    arr = np.asarray(latencies_ms)
+    return {"n": int(arr.size), "mean_ms": float(arr.mean()), "p50_ms": float(np.percentile(arr, 50)),
+            "p95_ms": float(np.percentile(arr, 95)), "max_ms": float(arr.max())}
+
+def read_ring(name, duration=None, idle_timeout=None, show=False):
+    """
+    Pembaca referensi: ambil frame terbaru dari ring shared memory server.
+    Latensi = waktu frame tersedia di pembaca - waktu capture di server.
+    """
+    reader = ShmFrameReader(name)
+    out = np.empty(reader.shape, dtype=np.uint8)
+    latencies = []
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    last_frame = wall_start
+    print("READY", flush=True)
+    try:
+        while True:
+            now = time.monotonic()
+            if duration and now - wall_start >= duration:
+                break
+            if idle_timeout and now - last_frame >= idle_timeout:
+                break
+            result = reader.wait(timeout=0.1, out=out)
+            if result is None:
+                continue
+            _, capture_ts, frame = result
+            out = frame    # buffer baru jika ring dibuat ulang dengan ukuran lain
+            last_frame = time.monotonic()
+            latencies.append((last_frame - capture_ts) * 1000.0)
+            if show:
+                cv2.imshow("Shared memory reader (q untuk keluar)", frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+    finally:
+        elapsed = time.monotonic() - wall_start
+        stats = {
+            "frames_read": reader.frames_read,
+            "frames_skipped": reader.frames_skipped,
+            "torn_reads": reader.torn_reads,
+            "reattached": reader.reattached,
+            "fps": reader.frames_read / elapsed if elapsed > 0 else 0.0,
+            "cpu_seconds": time.process_time() - cpu_start,
+            "latency": latency_stats(latencies),
+        }
+        reader.close()
+        if show:
+            cv2.destroyAllWindows()
+    return stats
+
+def receive_udp(port, idle_timeout=2.0):
+    """Penerima UDP/JPEG minimal (seperti client Godot): susun ulang lalu decode."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 * 1024 * 1024)
+    sock.bind(("127.0.0.1", port))
+    sock.settimeout(idle_timeout)
+    buffers, done = {}, {}
+    cpu_start = time.process_time()
+    print("READY", flush=True)
+    while True:
+        try:
+            packet, _ = sock.recvfrom(65536)
+        except socket.timeout:
+            break
+        seq, total, index = HEADER.unpack_from(packet)
+        parts = buffers.setdefault(seq, {})
+        parts[index] = packet[HEADER.size:]
+        if len(parts) == total:
+            data = b"".join(parts[i] for i in range(total))
+            del buffers[seq]
+            if cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) is not None:
+                done[seq] = time.monotonic()
+    sock.close()
+    return {"done": done, "cpu_seconds": time.process_time() - cpu_start}
+
+def _spawn_receiver(args):
+    proc = subprocess.Popen([sys.executable, __file__] + args, stdout=subprocess.PIPE, text=True)
+    while True:
+        line = proc.stdout.readline()
+        if not line or line.strip() == "READY":
+            return proc
+
+def _load_bench_frames(source_spec, n_distinct, size):
+    if source_spec is None:
+        # Frame sintetis dengan tekstur agar ukuran JPEG realistis
+        rng = np.random.RandomState(0)
+        base = cv2.resize(rng.randint(0, 256, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8), size)
+        return [np.roll(base, 4 * i, axis=1) for i in range(n_distinct)]
+    frames = []
+    with open_source(source_spec, realtime=False) as source:
+        for frame in source:
+            frames.append(cv2.resize(frame, size))
+            if len(frames) >= n_distinct:
+                break
+    return frames
+
+def _paced(n_frames, fps):
+    interval = 1.0 / fps if fps else 0.0
+    start = time.monotonic()
+    for i in range(n_frames):
+        if interval:
+            delay = start + i * interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        yield i
+
+def bench_transports(n_frames=300, fps=30.0, size=(640, 480), source_spec=None, port=9990,
+                     shm_name="hat_bench_ring"):
+    """
+    Bandingkan transport frame di host yang sama:
+      - udp_jpeg : encode JPEG q50 + potong !III + UDP + susun ulang + decode,
+      - shm_ring : salin frame mentah ke ring shared memory + baca seqlock.
+    Penerima berjalan di proses terpisah. Latensi diukur dari awal pengiriman
+    sampai frame siap dipakai penerima (jam monotonic yang sama).
+    """
+    frames = _load_bench_frames(source_spec, 30, size)
+    results = {"config": {"frames": n_frames, "fps": fps, "size": list(size), "source": source_spec}}
+
+    # --- UDP + JPEG ---
+    receiver = _spawn_receiver(["udp_recv", "--port", str(port)])
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    payload_size = MAX_PACKET_SIZE - HEADER.size
+    sent, jpeg_bytes = {}, 0
+    cpu_start = time.process_time()
+    for i in _paced(n_frames, fps):
+        seq = i + 1
+        sent[seq] = time.monotonic()
+        ok, encoded = cv2.imencode('.jpg', frames[i % len(frames)], [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+        data = encoded.tobytes()
+        jpeg_bytes += len(data)
+        total = math.ceil(len(data) / payload_size)
+        for index in range(total):
+            sock.sendto(HEADER.pack(seq, total, index) + data[index * payload_size:(index + 1) * payload_size],
+                        ("127.0.0.1", port))
+    sender_cpu = time.process_time() - cpu_start
+    sock.close()
+    received = json.loads(receiver.communicate()[0])
+    latencies = [(t - sent[int(seq)]) * 1000.0 for seq, t in received["done"].items()]
+    results["udp_jpeg"] = {"frames_received": len(latencies), "sender_cpu_seconds": sender_cpu,
+                           "receiver_cpu_seconds": received["cpu_seconds"],
+                           "mean_jpeg_kb": jpeg_bytes / n_frames / 1024.0,
+                           "latency": latency_stats(latencies)}
+
+    # --- Shared memory ring ---
+    h, w = frames[0].shape[:2]
+    publisher = ShmFramePublisher(shm_name, w, h, frames[0].shape[2])
+    try:
+        receiver = _spawn_receiver(["read", "--name", shm_name, "--idle_timeout", "2", "--json"])
+        cpu_start = time.process_time()
+        for i in _paced(n_frames, fps):
+            publisher.publish(frames[i % len(frames)], time.monotonic())
+        sender_cpu = time.process_time() - cpu_start
+        received = json.loads(receiver.communicate()[0])
+    finally:
+        publisher.close()
+    results["shm_ring"] = {"frames_received": received["frames_read"], "sender_cpu_seconds": sender_cpu,
+                           "receiver_cpu_seconds": received["cpu_seconds"],
+                           "frames_skipped": received["frames_skipped"], "torn_reads": received["torn_reads"],
+                           "latency": received["latency"]}
+
+    for name in ("udp_jpeg", "shm_ring"):
+        r = results[name]
+        lat = r["latency"]
+        logger.info(f"{name:<9}: {r['frames_received']}/{n_frames} frames, latency mean "
+                    f"{lat.get('mean_ms', 0):.2f} ms p95 {lat.get('p95_ms', 0):.2f} ms, CPU sender "
+                    f"{r['sender_cpu_seconds']:.2f}s receiver {r['receiver_cpu_seconds']:.2f}s")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pembaca referensi ring buffer shared memory server.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p_read = subparsers.add_parser("read", help="Baca frame dari ring server (run_server.py --shm NAME).")
+    p_read.add_argument("--name", type=str, required=True, help="Nama ring shared memory.")
+    p_read.add_argument("--duration", type=float, default=None, help="Berhenti setelah N detik.")
+    p_read.add_argument("--idle_timeout", type=float, default=None, help="Berhenti jika tidak ada frame N detik.")
+    p_read.add_argument("--show", action='store_true', help="Tampilkan frame di jendela.")
+    p_read.add_argument("--json", action='store_true', help="Cetak hasil sebagai JSON ke stdout.")
+
+    p_bench = subparsers.add_parser("bench", help="Bandingkan latensi/CPU ring shared memory vs UDP+JPEG.")
+    p_bench.add_argument("--frames", type=int, default=300, help="Jumlah frame per transport.")
+    p_bench.add_argument("--fps", type=float, default=30.0, help="Laju kirim (0 = secepat mungkin).")
+    p_bench.add_argument("--width", type=int, default=640, help="Lebar frame.")
+    p_bench.add_argument("--height", type=int, default=480, help="Tinggi frame.")
+    p_bench.add_argument("--source", type=str, default=None, help="Sumber frame (default: sintetis).")
+    p_bench.add_argument("--port", type=int, default=9990, help="Port UDP lokal untuk benchmark.")
+    p_bench.add_argument("--out", type=Path, default=Path("reports/transport_bench.json"), help="File JSON hasil.")
+
+    p_udp = subparsers.add_parser("udp_recv", help=argparse.SUPPRESS)
+    p_udp.add_argument("--port", type=int, required=True)
+    args = parser.parse_args()
+
+    if args.command == "read":
+        stats = read_ring(args.name, args.duration, args.idle_timeout, args.show)
+        if args.json:
+            print(json.dumps(stats))
+        else:
+            lat = stats["latency"]
+            logger.info(f"📊 {stats['frames_read']} frames ({stats['fps']:.1f} FPS), skipped "
+                        f"{stats['frames_skipped']}, torn {stats['torn_reads']}, latency mean "
+                        f"{lat.get('mean_ms', 0):.2f} ms p95 {lat.get('p95_ms', 0):.2f} ms, "
+                        f"CPU {stats['cpu_seconds']:.2f}s")
+    elif args.command == "udp_recv":
+        print(json.dumps(receive_udp(args.port)))
+    elif args.command == "bench":
+        results = bench_transports(args.frames, args.fps, (args.width, args.height), args.source, args.port)
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"💾 Hasil disimpan ke {args.out}")
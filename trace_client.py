@@ -0,0 +1,167 @@
+import argparse
+import json
+import logging
+import socket
+import struct
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from pipelines.protocol import unpack_trace, TRACE_EXT, TRACE_STAGES
+from pipelines.utils import setup_logging
+
+setup_logging()
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("!III")   # sequence_number, total_packets, packet_index
+PAYLOAD_OFFSET = HEADER.size + TRACE_EXT.size
+
+# Rincian latensi: setiap tahap = selisih dua titik waktu berurutan
+#   capture -> detect -> render -> encode -> send   (server, dari ekstensi trace)
+#   send -> receive (jaringan + reassembly) -> decode -> display   (penerima)
+POINTS = ("capture",) + TRACE_STAGES + ("receive", "decode", "display")
+BREAKDOWN = [f"{a}->{b}" for a, b in zip(POINTS, POINTS[1:])]
+
+def summarize(values_ms):
+    values = np.asarray(values_ms, dtype=float)
+    if len(values) == 0:
+        return None
+    return {"mean": float(values.mean()), "p50": float(np.percentile(values, 50)),
+            "p90": float(np.percentile(values, 90)), "p99": float(np.percentile(values, 99)),
+            "max": float(values.max())}
+
+def run_receiver(host, port, duration=None, show=False, warmup=10):
+    """
+    Penerima referensi mode trace: daftar dengan REGISTER_TRACE, susun ulang
+    frame JPEG, decode (dan tampilkan jika --show), lalu hitung latensi
+    capture-ke-tampil serta rinciannya per tahap. Jam server dan penerima
+    harus sama (satu mesin) atau tersinkron; selisih negatif ditandai.
+    """
+    server_addr = (host, port)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    sock.bind(("0.0.0.0", 0))
+    sock.settimeout(0.2)
+
+    registered = False
+    for _ in range(10):
+        sock.sendto(b"REGISTER_TRACE", server_addr)
+        try:
+            data, _ = sock.recvfrom(65536)
+        except socket.timeout:
+            continue
+        if data == b"REGISTERED":
+            registered = True
+            break
+    if not registered:
+        sock.close()
+        raise RuntimeError(f"Server {host}:{port} tidak membalas REGISTER_TRACE")
+    logger.info(f"✅ Terdaftar (trace) di {host}:{port}")
+
+    partial = {}           # seq -> {"total", "chunks", "trace"}
+    samples = []           # per frame: {titik: time_ns}
+    frames_seen, incomplete, last_seq = 0, 0, None
+    start = time.monotonic()
+    try:
+        while duration is None or time.monotonic() - start < duration:
+            try:
+                packet, _ = sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            now_ns = time.time_ns()
+            trace = unpack_trace(packet, HEADER.size)
+            if trace is None:
+                continue
+            seq, total, index = HEADER.unpack_from(packet)
+            if last_seq is not None and seq != last_seq and last_seq in partial:
+                # Frame sebelumnya tidak lengkap saat frame baru datang
+                partial.pop(last_seq, None)
+                incomplete += 1
+            last_seq = seq
+            entry = partial.setdefault(seq, {"total": total, "chunks": {}, "trace": trace})
+            entry["chunks"][index] = packet[PAYLOAD_OFFSET:]
+            if len(entry["chunks"]) < entry["total"]:
+                continue
+
+            partial.pop(seq)
+            jpeg = np.frombuffer(b"".join(entry["chunks"][i] for i in range(entry["total"])), dtype=np.uint8)
+            frame = cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+            decode_ns = time.time_ns()
+            if frame is None:
+                continue
+            if show:
+                cv2.imshow("Trace client (q untuk keluar)", frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+            display_ns = time.time_ns()
+
+            frames_seen += 1
+            if frames_seen <= warmup:
+                continue
+            points = {"capture": entry["trace"]["capture_ns"], **entry["trace"]["stages"],
+                      "receive": now_ns, "decode": decode_ns, "display": display_ns}
+            samples.append(points)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.sendto(b"UNREGISTER", server_addr)
+        sock.close()
+        if show:
+            cv2.destroyAllWindows()
+
+    elapsed = time.monotonic() - start
+    total_ms = [(s["display"] - s["capture"]) / 1e6 for s in samples]
+    stages = {name: [(s[b] - s[a]) / 1e6 for s in samples] for name, a, b in zip(BREAKDOWN, POINTS, POINTS[1:])}
+    negative = sum(1 for s in samples if s["receive"] < s["send"])
+    result = {
+        "frames": len(samples),
+        "warmup_frames": min(frames_seen, warmup),
+        "incomplete_frames": incomplete,
+        "fps": frames_seen / elapsed if elapsed > 0 else 0.0,
+        "capture_to_display_ms": summarize(total_ms),
+        "stages_ms": {name: summarize(values) for name, values in stages.items()},
+        "clock_skew_suspect": negative,
+    }
+    return result
+
+def print_report(result):
+    total = result["capture_to_display_ms"]
+    if total is None:
+        print("Tidak ada frame yang diterima.")
+        return
+    print("\n" + "=" * 28 + " LATENSI CAPTURE -> TAMPIL " + "=" * 28)
+    print(f"{result['frames']} frame ({result['fps']:.1f} FPS), {result['incomplete_frames']} tidak lengkap")
+    print(f"{'tahap':<20}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, row in list(result["stages_ms"].items()) + [("TOTAL", total)]:
+        print(f"{name:<20}" + "".join(f"{row[k]:>9.2f}" for k in ("mean", "p50", "p90", "p99", "max")))
+    if result["clock_skew_suspect"]:
+        print(f"⚠️  {result['clock_skew_suspect']} frame diterima sebelum waktu kirim server: jam tidak tersinkron")
+    print("=" * 83)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Penerima referensi mode trace (latensi capture-ke-tampil).")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Alamat server.")
+    parser.add_argument("--port", type=int, default=8888, help="Port UDP server.")
+    parser.add_argument("--duration", type=float, default=None, help="Berhenti setelah N detik.")
+    parser.add_argument("--warmup", type=int, default=10, help="Frame awal yang tidak dihitung.")
+    parser.add_argument("--show", action='store_true', help="Tampilkan frame (waktu tampil = setelah imshow).")
+    parser.add_argument("--out", type=Path, default=None, help="File JSON hasil.")
+    parser.add_argument("--max_p99_ms", type=float, default=None,
+                        help="Keluar dengan kode 1 jika p99 capture-ke-tampil melebihi nilai ini (cek regresi).")
+    args = parser.parse_args()
+
+    result = run_receiver(args.host, args.port, args.duration, args.show, args.warmup)
+    print_report(result)
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        logger.info(f"💾 Hasil disimpan ke {args.out}")
+    total = result["capture_to_display_ms"]
+    if args.max_p99_ms is not None and (total is None or total["p99"] > args.max_p99_ms):
+        logger.error(f"❌ p99 capture-ke-tampil {total['p99'] if total else float('nan'):.2f} ms "
+                     f"melebihi batas {args.max_p99_ms} ms")
+        sys.exit(1)